@@ -0,0 +1,61 @@
+"""Utilidades comunes de los benchmarks.
+
+Cada benchmark se ejecuta como módulo desde la raíz del repo:
+
+    python -m benchmarks.<nombre>
+
+Usan su propia BD (BENCH_DATABASE_URL o, por defecto, un SQLite temporal)
+y nunca la DATABASE_URL de la app, porque crean y borran tablas.
+"""
+import os
+import statistics
+import tempfile
+import time
+
+
+def usar_bd_de_benchmark():
+    """Apunta config a la BD del benchmark; llamar antes de importar config."""
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        ruta = os.path.join(tempfile.mkdtemp(prefix="smartweb-bench-"), "bench.db")
+        url = f"sqlite:///{ruta}"
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    return url
+
+
+def entorno_subproceso(database_url: str | None = None) -> dict:
+    """Entorno para correr la app en un proceso nuevo: BD propia y credenciales falsas."""
+    env = dict(os.environ)
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='smartweb-bench-'), 'bench.db')}"
+    env["DATABASE_URL"] = database_url
+    env.setdefault("SECRET_KEY", "bench-secret")
+    env.setdefault("STREAM_API_KEY", "bench-key")
+    env.setdefault("STREAM_API_SECRET", "bench-secret-bench-secret-bench-secret")
+    return env
+
+
+def resumen(tiempos: list[float]) -> str:
+    """p50 / p95 / máx en milisegundos."""
+    ms = sorted(t * 1000 for t in tiempos)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"p50 {statistics.median(ms):9.3f} ms   p95 {p95:9.3f} ms   máx {ms[-1]:9.3f} ms"
+
+
+async def medir_async(fn, repeticiones: int) -> list[float]:
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        await fn(i)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def medir(fn, repeticiones: int) -> list[float]:
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        fn(i)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
@@ -0,0 +1,58 @@
+"""Throughput de cifrado AES: formato v1 (PBKDF2 por mensaje) vs v2 (HKDF).
+
+    python -m benchmarks.aes_envelope [mensajes_v2]   # por defecto 10_000
+
+No toca la BD (config solo necesita una URL para importarse). El v1 se cifra como lo hacía el código original; el v2 con
+encrypt_many/decrypt_many. El v1 se mide con menos mensajes porque cada
+uno cuesta las 100k iteraciones de PBKDF2.
+"""
+import base64
+import os
+import sys
+import time
+from benchmarks._common import usar_bd_de_benchmark
+
+usar_bd_de_benchmark()
+os.environ.setdefault("CYPHER_SECURE_KEY", "bench-secret-key")
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # noqa: E402
+from services import cifrar  # noqa: E402
+
+MENSAJES_V1 = 100
+
+
+def _encrypt_v1(message: str) -> str:
+    """Cifrado del formato original: PBKDF2 completo por mensaje."""
+    salt, nonce = os.urandom(16), os.urandom(12)
+    key = cifrar.derive_key(cifrar.CYPHER_SECURE_KEY, salt)
+    return base64.b64encode(salt + nonce + AESGCM(key).encrypt(nonce, message.encode(), None)).decode()
+
+
+def _por_segundo(fn, datos):
+    inicio = time.perf_counter()
+    salida = fn(datos)
+    segundos = time.perf_counter() - inicio
+    return salida, len(datos) / segundos
+
+
+def main(n_v2: int):
+    mensajes = [f"dato sensible {i}: 0000-1111-2222-{i:04d}" for i in range(max(n_v2, MENSAJES_V1))]
+
+    inicio = time.perf_counter()
+    cifrar._master_key()
+    print(f"derivación de la clave maestra (una vez por proceso): {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+
+    v1, cifrar_v1 = _por_segundo(lambda m: [_encrypt_v1(x) for x in m], mensajes[:MENSAJES_V1])
+    claro_v1, descifrar_v1 = _por_segundo(cifrar.decrypt_many, v1)
+    v2, cifrar_v2 = _por_segundo(cifrar.encrypt_many, mensajes[:n_v2])
+    claro_v2, descifrar_v2 = _por_segundo(cifrar.decrypt_many, v2)
+    assert claro_v1 == mensajes[:MENSAJES_V1] and claro_v2 == mensajes[:n_v2]
+
+    print(f"{'formato':<10}{'mensajes':>10}{'cifrar/s':>14}{'descifrar/s':>14}")
+    print(f"{'v1':<10}{MENSAJES_V1:>10}{cifrar_v1:>14,.0f}{descifrar_v1:>14,.0f}")
+    print(f"{'v2':<10}{n_v2:>10}{cifrar_v2:>14,.0f}{descifrar_v2:>14,.0f}")
+    print(f"\nv2 / v1: cifrar x{cifrar_v2 / cifrar_v1:,.0f}, descifrar x{descifrar_v2 / descifrar_v1:,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,116 @@
+"""Prueba de carga: sesión síncrona en handlers async vs AsyncSession.
+
+    python -m benchmarks.async_sessions [peticiones] [concurrencia] [latencia_ms]
+
+Reproduce el patrón anterior (get_db síncrono + consultas de SessionLocal
+dentro de un `async def`) y el actual (config.get_db con AsyncSession),
+con la misma consulta por id de usuario. Cada consulta llama a la función
+SQL espera_ms() para simular el viaje de red a Postgres, que en SQLite
+local no existe. Las peticiones entran por ASGI en un solo event loop,
+como en un worker de uvicorn.
+
+La concurrencia por defecto (15) es el tope del pool síncrono (5 + 10 de
+overflow). Por encima, el patrón anterior se traba: el handler que espera
+una conexión bloquea el loop y el cierre de las sesiones que la liberarían
+no llega a correr, hasta el TimeoutError del pool a los 30 s.
+"""
+import asyncio
+import sys
+import time
+from benchmarks._common import usar_bd_de_benchmark, resumen
+
+usar_bd_de_benchmark()
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from config import Base, SessionLocal, async_engine, engine, get_db  # noqa: E402
+from model.models import Roles, Usuarios  # noqa: E402
+
+USUARIOS = 100
+latencia_ms = 10
+
+
+def _espera_ms(ms):
+    time.sleep(ms / 1000)  # libera el GIL, como la espera de red del driver
+    return 0
+
+
+def _registrar_espera(dbapi_conn, _):
+    dbapi_conn.create_function("espera_ms", 1, _espera_ms)
+
+
+event.listen(engine, "connect", _registrar_espera)
+event.listen(async_engine.sync_engine, "connect", _registrar_espera)
+
+
+def get_db_sync():
+    """El get_db que tenía cada módulo de rutas antes del cambio."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app = FastAPI()
+
+
+@app.get("/sync/{user_id}")
+async def por_id_sync(user_id: int, db=Depends(get_db_sync)):
+    user, _ = db.execute(select(Usuarios, func.espera_ms(latencia_ms)).where(Usuarios.id == user_id)).one()
+    return {"id": user.id}
+
+
+@app.get("/async/{user_id}")
+async def por_id_async(user_id: int, db: AsyncSession = Depends(get_db)):
+    user, _ = (await db.execute(select(Usuarios, func.espera_ms(latencia_ms)).where(Usuarios.id == user_id))).one()
+    return {"id": user.id}
+
+
+def poblar():
+    Base.metadata.drop_all(bind=engine, tables=[Usuarios.__table__, Roles.__table__])
+    Base.metadata.create_all(bind=engine, tables=[Roles.__table__, Usuarios.__table__])
+    with SessionLocal() as db:
+        db.add(Roles(id=1, nombre_rol="Estudiante"))
+        db.add_all([
+            Usuarios(nombre=f"U{i}", apellido="B", email=f"u{i}@bench.com", password_hash="x", role=1)
+            for i in range(USUARIOS)
+        ])
+        db.commit()
+
+
+async def carga(client, prefijo: str, peticiones: int, concurrencia: int):
+    limite = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def una(i):
+        async with limite:
+            inicio = time.perf_counter()
+            r = await client.get(f"/{prefijo}/{i % USUARIOS + 1}")
+            latencias.append(time.perf_counter() - inicio)
+            assert r.status_code == 200, r.text
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(i) for i in range(peticiones)))
+    return time.perf_counter() - inicio, latencias
+
+
+async def main(peticiones: int, concurrencia: int):
+    poblar()
+    print(f"{peticiones} peticiones, concurrencia {concurrencia}, {latencia_ms} ms de BD por consulta\n")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await carga(client, "async", 20, 5)  # calentar el pool
+        for prefijo in ("sync", "async"):
+            total, latencias = await carga(client, prefijo, peticiones, concurrencia)
+            print(f"{prefijo:<6} {peticiones / total:8.1f} req/s   {resumen(latencias)}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    peticiones = args[0] if len(args) > 0 else 500
+    concurrencia = args[1] if len(args) > 1 else 15
+    latencia_ms = args[2] if len(args) > 2 else latencia_ms
+    asyncio.run(main(peticiones, concurrencia))
@@ -0,0 +1,72 @@
+"""Latencia de la búsqueda de tokens: JWT completo vs digest indexado.
+
+    python -m benchmarks.auth_token_lookup [filas]   # por defecto 1_000_000
+
+Llena auth_token con `filas` tokens y mide la consulta que hace
+verify_token antes (jwt_token = :jwt, columna sin índice) y ahora
+(token_hash = :digest, índice único).
+"""
+import asyncio
+import random
+import secrets
+import sys
+import time
+from benchmarks._common import usar_bd_de_benchmark, medir_async, resumen
+
+url = usar_bd_de_benchmark()
+
+from sqlalchemy import select, insert  # noqa: E402
+from config import Base, engine, async_engine, AsyncSessionLocal  # noqa: E402
+from model.models import AuthToken, Usuarios  # noqa: E402
+from services.jwt import hash_token  # noqa: E402
+
+LOTE = 50_000
+BUSQUEDAS = 30
+
+
+def _jwt_falso(i: int) -> str:
+    # Mismo largo aproximado que un JWT real de la app (~230 caracteres)
+    return f"eyJhbGciOiJIUzI1NiJ9.{secrets.token_urlsafe(120)}{i}.{secrets.token_urlsafe(32)}"
+
+
+def poblar(filas: int) -> list[str]:
+    Base.metadata.drop_all(bind=engine, tables=[AuthToken.__table__])
+    Base.metadata.create_all(bind=engine, tables=[Usuarios.__table__, AuthToken.__table__])
+    muestra = []
+    with engine.begin() as conn:
+        for desde in range(0, filas, LOTE):
+            lote = []
+            for i in range(desde, min(filas, desde + LOTE)):
+                token = _jwt_falso(i)
+                lote.append({"user_id": i % 5000 + 1, "jwt_token": token, "token_hash": hash_token(token), "revocado": False})
+            conn.execute(insert(AuthToken), lote)
+            muestra.extend(r["jwt_token"] for r in random.sample(lote, 3))
+    return muestra
+
+
+async def main(filas: int):
+    print(f"BD: {engine.dialect.name}   filas en auth_token: {filas:,}")
+    inicio = time.perf_counter()
+    muestra = poblar(filas)
+    print(f"carga: {time.perf_counter() - inicio:.1f}s\n")
+    random.shuffle(muestra)
+
+    async with AsyncSessionLocal() as db:
+        async def por_jwt(i):
+            token = muestra[i % len(muestra)]
+            assert await db.scalar(select(AuthToken).where(AuthToken.jwt_token == token, AuthToken.revocado == False))
+
+        async def por_digest(i):
+            token = muestra[i % len(muestra)]
+            assert await db.scalar(select(AuthToken).where(AuthToken.token_hash == hash_token(token), AuthToken.revocado == False))
+
+        antes = await medir_async(por_jwt, BUSQUEDAS)
+        ahora = await medir_async(por_digest, BUSQUEDAS)
+
+    print(f"jwt_token = :jwt       {resumen(antes)}")
+    print(f"token_hash = :digest   {resumen(ahora)}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
@@ -0,0 +1,108 @@
+"""Fan-out de createCall: ORM (add_all + 3 commits) vs bulk_insert (1 commit).
+
+    python -m benchmarks.bulk_fanout [alumnos]   # por defecto 10_000
+
+Para un curso con `alumnos` inscritos escribe la sesión, sus participantes
+(HOST + alumnos) y las notificaciones de dos formas:
+  - anterior: un objeto ORM por fila, add_all y un commit por tabla;
+  - actual: las filas de routes.NewVideoCall con utils.bulk.bulk_insert
+    en una sola transacción.
+Cuenta también las sentencias SQL que llegan al driver.
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from benchmarks._common import usar_bd_de_benchmark
+
+usar_bd_de_benchmark()
+
+from sqlalchemy import event, func, select  # noqa: E402
+from config import Base, AsyncSessionLocal, async_engine, engine  # noqa: E402
+from model.models import (  # noqa: E402
+    CalidadVideo, Notificaciones, Participantes_Sesion_V, RoleLlamada, Sesiones_Virtuales, TipoNotificacion,
+)
+from routes.NewVideoCall import _filas_notificaciones, _filas_participantes  # noqa: E402
+from utils.bulk import bulk_insert  # noqa: E402
+
+REPETICIONES = 5
+sentencias = 0
+
+
+def _contar(*_):
+    global sentencias
+    sentencias += 1
+
+
+event.listen(async_engine.sync_engine, "before_cursor_execute", _contar)
+
+
+def _sesion():
+    return {"id_curso": 1, "titulo": "Clase", "descripcion": "d", "hora_inicio": datetime(2026, 3, 2, 8),
+            "hora_fin": datetime(2026, 3, 2, 9), "enlace_llamada": "x", "calidad_video": CalidadVideo.p4K}
+
+
+async def orm_anterior(db, profesor, integrantes, solo_participantes=False):
+    sesion = Sesiones_Virtuales(**_sesion())
+    db.add(sesion)
+    await db.commit()
+    await db.refresh(sesion)
+
+    participantes = [Participantes_Sesion_V(id_sesion=sesion.id_sesion, id_usuario=profesor.id,
+                                            hora_unido=datetime.now(), role_llamada=RoleLlamada.HOST)]
+    participantes += [Participantes_Sesion_V(id_sesion=sesion.id_sesion, id_usuario=ins.id_estudiante,
+                                             hora_unido=None, role_llamada=RoleLlamada.PARTICIPANTE)
+                      for ins in integrantes]
+    db.add_all(participantes)
+    await db.commit()
+    if solo_participantes:
+        return
+
+    db.add_all([Notificaciones(usuario_id=ins.id_estudiante, titulo="Nueva sesión", mensaje="m", tipo=TipoNotificacion.EN_APP)
+                for ins in integrantes])
+    await db.commit()
+
+
+async def bulk_actual(db, profesor, integrantes, solo_participantes=False):
+    [sesion_id] = await bulk_insert(db, Sesiones_Virtuales, [_sesion()], returning=Sesiones_Virtuales.id_sesion)
+    await bulk_insert(db, Participantes_Sesion_V, _filas_participantes([sesion_id], profesor, integrantes))
+    if not solo_participantes:
+        await bulk_insert(db, Notificaciones, _filas_notificaciones(profesor, integrantes, "Nueva sesión", "m"))
+    await db.commit()
+
+
+async def correr(fn, profesor, integrantes, solo_participantes):
+    global sentencias
+    tiempos = []
+    for _ in range(REPETICIONES):
+        async with AsyncSessionLocal() as db:
+            sentencias = 0
+            inicio = time.perf_counter()
+            await fn(db, profesor, integrantes, solo_participantes)
+            tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000, sentencias
+
+
+async def main(alumnos: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine, tables=[Sesiones_Virtuales.__table__, Participantes_Sesion_V.__table__, Notificaciones.__table__])
+    profesor = SimpleNamespace(id=1)
+    integrantes = [SimpleNamespace(id_estudiante=i + 2) for i in range(alumnos)]
+    print(f"BD: {engine.dialect.name}   alumnos: {alumnos:,}   mediana de {REPETICIONES} corridas\n")
+
+    for titulo, solo in ((f"{alumnos + 1:,} participantes", True), ("createCall completo (sesión + participantes + notificaciones)", False)):
+        print(titulo)
+        for nombre, fn in (("ORM add_all", orm_anterior), ("bulk_insert", bulk_actual)):
+            ms, n = await correr(fn, profesor, integrantes, solo)
+            print(f"   {nombre:<12} {ms:9.1f} ms   {n:>5} sentencias")
+
+    async with AsyncSessionLocal() as db:
+        total = await db.scalar(select(func.count()).select_from(Participantes_Sesion_V))
+    assert total == 4 * REPETICIONES * (alumnos + 1)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000))
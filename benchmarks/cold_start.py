@@ -0,0 +1,75 @@
+"""Arranque en frío de un worker sobre una BD ya inicializada.
+
+    python -m benchmarks.cold_start [raíz_del_repo] [repeticiones] [latencia_ms]
+
+En cada proceso nuevo mide `import main` y el arranque del lifespan
+(hasta que la app queda lista para atender), contra una BD SQLite que ya
+pasó por el bootstrap: es lo que paga cada worker de uvicorn al escalar o
+reiniciar. Pasando la raíz de otro checkout (p. ej. un `git worktree` de
+un commit anterior) se comparan dos versiones.
+
+Cuenta además las sentencias SQL de cada fase. SQLite local no tiene
+viaje de red; con `latencia_ms` cada sentencia espera ese tiempo, como
+el round trip a Postgres que paga el worker en Render.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from benchmarks._common import entorno_subproceso
+
+ARRANQUE = """
+import asyncio, json, os, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+sentencias = [0]
+latencia = float(os.environ.get("BENCH_LATENCIA_MS", "0")) / 1000
+@event.listens_for(Engine, "before_cursor_execute")
+def _sentencia(*args):
+    sentencias[0] += 1
+    if latencia:
+        time.sleep(latencia)
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+n_import = sentencias[0]
+async def arrancar():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter(), sentencias[0]
+t2, n_total = asyncio.run(arrancar())
+print(json.dumps({"import": t1 - t0, "lifespan": t2 - t1, "sql_import": n_import, "sql_lifespan": n_total - n_import}))
+"""
+
+
+def _correr(raiz: str, env: dict, codigo: str) -> str:
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=raiz, env=env, capture_output=True, text=True)
+    if r.returncode != 0:
+        raise SystemExit(r.stderr[-2000:])
+    return r.stdout
+
+
+def main(raiz: str, repeticiones: int, latencia_ms: float):
+    env = entorno_subproceso(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='smartweb-bench-'), 'bench.db')}")
+    # BD ya inicializada: bootstrap completo si existe el comando, y un
+    # arranque de calentamiento (en versiones anteriores migraba al importar)
+    if os.path.exists(os.path.join(raiz, "bootstrap.py")):
+        _correr(raiz, env, "import bootstrap; bootstrap.bootstrap()")
+    _correr(raiz, env, ARRANQUE)
+
+    env["BENCH_LATENCIA_MS"] = str(latencia_ms)
+    corridas = [json.loads(_correr(raiz, env, ARRANQUE).splitlines()[-1]) for _ in range(repeticiones)]
+    importar = statistics.median(c["import"] for c in corridas) * 1000
+    lifespan = statistics.median(c["lifespan"] for c in corridas) * 1000
+    ultima = corridas[-1]
+    print(f"{raiz}   mediana de {repeticiones} procesos, {latencia_ms:g} ms por sentencia")
+    print(f"   import main        {importar:8.1f} ms   {ultima['sql_import']:>4} sentencias SQL")
+    print(f"   lifespan (inicio)  {lifespan:8.1f} ms   {ultima['sql_lifespan']:>4} sentencias SQL")
+    print(f"   total              {importar + lifespan:8.1f} ms")
+
+
+if __name__ == "__main__":
+    raiz = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    main(os.path.abspath(raiz), int(sys.argv[2]) if len(sys.argv) > 2 else 7,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 0)
@@ -0,0 +1,62 @@
+"""Costo de importar la app medido con `python -X importtime`.
+
+    python -m benchmarks.import_time [raíz_del_repo] [repeticiones]
+
+Importa `main` en un proceso nuevo (BD SQLite temporal, credenciales de
+GetStream falsas) y reporta el tiempo acumulado de main y cuánto de eso
+es el SDK de GetStream, más lo que cuesta después construir el cliente
+en la primera petición que lo usa. Pasando la raíz de otro checkout (p. ej. un
+`git worktree` de un commit anterior) se comparan dos versiones.
+"""
+import os
+import statistics
+import subprocess
+import sys
+from benchmarks._common import entorno_subproceso
+
+
+PRIMER_USO = (
+    "import time; from services.getstream import get_stream_client as g; "
+    "t = time.perf_counter(); g(); print((time.perf_counter() - t) * 1000)"
+)
+
+
+def _primer_uso(raiz: str) -> float | None:
+    """ms de get_stream_client() en un proceso nuevo (None si no existe)."""
+    r = subprocess.run([sys.executable, "-c", PRIMER_USO], cwd=raiz, env=entorno_subproceso(), capture_output=True, text=True)
+    return float(r.stdout) if r.returncode == 0 else None
+
+
+def _importtime(raiz: str) -> dict[str, int]:
+    env = entorno_subproceso()
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                       cwd=raiz, env=env, capture_output=True, text=True)
+    if r.returncode != 0:
+        raise SystemExit(r.stderr[-2000:])
+    acumulado = {}
+    for linea in r.stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea:
+            continue
+        _, cum, nombre = (p.strip() for p in linea[len("import time:"):].split("|"))
+        if cum.isdigit():
+            acumulado[nombre] = int(cum)  # microsegundos
+    return acumulado
+
+
+def main(raiz: str, repeticiones: int):
+    corridas = [_importtime(raiz) for _ in range(repeticiones)]
+    def mediana(nombre):
+        return statistics.median(c.get(nombre, 0) for c in corridas) / 1000
+    print(f"{raiz}   mediana de {repeticiones} procesos")
+    print(f"   import main            {mediana('main'):8.1f} ms")
+    print(f"   getstream (SDK)        {mediana('getstream'):8.1f} ms   cargado: {'sí' if mediana('getstream') else 'no'}")
+    for modulo in ("routes.NewVideoCall", "routes.getstreamFile"):
+        print(f"   {modulo:<22} {mediana(modulo):8.1f} ms")
+    primeros = [_primer_uso(raiz) for _ in range(repeticiones)]
+    if None not in primeros:
+        print(f"   get_stream_client()    {statistics.median(primeros):8.1f} ms   (primer uso, SDK incluido)")
+
+
+if __name__ == "__main__":
+    raiz = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    main(os.path.abspath(raiz), int(sys.argv[2]) if len(sys.argv) > 2 else 7)
@@ -0,0 +1,147 @@
+"""Detección de cruces de horario con 100k sesiones.
+
+    python -m benchmarks.schedule_conflicts [sesiones] [propuestas] [profesores]
+    # por defecto 100_000 sesiones, lote de 500 propuestas y 1000 profesores
+
+1. Chequeo de createCall para un horario: la consulta anterior
+   (IN (subconsulta), sin índices) contra find_conflict con los índices
+   ix_sesiones_curso_horario e ix_Cursos_profesor_id.
+2. Lote de propuestas de un profesor: find_conflict una por una,
+   comparación por pares en memoria y find_conflicts_batch (una consulta
+   + IntervalIndex).
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from benchmarks._common import usar_bd_de_benchmark, medir_async, resumen
+
+usar_bd_de_benchmark()
+
+from sqlalchemy import insert, select, text  # noqa: E402
+from config import Base, AsyncSessionLocal, async_engine, engine  # noqa: E402
+from model.models import Cursos, Sesiones_Virtuales, Usuarios  # noqa: E402
+from services.horarios import find_conflict, find_conflicts_batch, load_sessions_in_range  # noqa: E402
+
+PROFESORES = 1000
+CURSOS_POR_PROFESOR = 2
+INICIO = datetime(2026, 1, 5, 7, 0)
+CHEQUEOS = 50
+
+
+def _franja(k: int) -> tuple[datetime, datetime]:
+    """k-ésima franja de 1 h: 6 por día hábil, sin cruces entre sí."""
+    dia, hora = divmod(k, 6)
+    inicio = INICIO + timedelta(days=dia, hours=hora * 2)
+    return inicio, inicio + timedelta(hours=1)
+
+
+def poblar(sesiones: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine, tables=[Usuarios.__table__, Cursos.__table__, Sesiones_Virtuales.__table__])
+    por_profesor = sesiones // PROFESORES
+    with engine.begin() as conn:
+        conn.execute(insert(Cursos), [
+            {"id": p * CURSOS_POR_PROFESOR + c + 1, "titulo": "c", "profesor_id": p + 1}
+            for p in range(PROFESORES) for c in range(CURSOS_POR_PROFESOR)
+        ])
+        filas = []
+        for p in range(PROFESORES):
+            for k in range(por_profesor):
+                inicio, fin = _franja(k)
+                filas.append({"id_curso": p * CURSOS_POR_PROFESOR + k % CURSOS_POR_PROFESOR + 1,
+                              "titulo": "s", "hora_inicio": inicio, "hora_fin": fin})
+        conn.execute(insert(Sesiones_Virtuales), filas)
+    return por_profesor
+
+
+def indices(activos: bool):
+    with engine.begin() as conn:
+        if activos:
+            conn.execute(text('CREATE INDEX ix_sesiones_curso_horario ON "Sesiones_Virtuales" (id_curso, hora_inicio, hora_fin)'))
+            conn.execute(text('CREATE INDEX "ix_Cursos_profesor_id" ON "Cursos" (profesor_id)'))
+        else:
+            conn.execute(text("DROP INDEX IF EXISTS ix_sesiones_curso_horario"))
+            conn.execute(text('DROP INDEX IF EXISTS "ix_Cursos_profesor_id"'))
+        conn.execute(text("ANALYZE") if engine.dialect.name == "sqlite" else text('ANALYZE "Sesiones_Virtuales"'))
+
+
+async def consulta_anterior(db, profesor_id, inicio, fin):
+    """La consulta que tenía createCall antes del cambio."""
+    return await db.scalar(select(Sesiones_Virtuales).where(
+        Sesiones_Virtuales.id_curso.in_(select(Cursos.id).where(Cursos.profesor_id == profesor_id)),
+        Sesiones_Virtuales.hora_inicio < fin,
+        Sesiones_Virtuales.hora_fin > inicio,
+    ))
+
+
+def pares_en_memoria(propuestas, existentes):
+    """Validación ingenua: cada propuesta contra todo (O(n·m))."""
+    conflictos = []
+    for i, (inicio, fin) in enumerate(propuestas):
+        for s, e, dato in existentes:
+            if s < fin and e > inicio:
+                conflictos.append(i)
+                break
+    return conflictos
+
+
+async def main(sesiones: int, n_propuestas: int):
+    print(f"BD: {engine.dialect.name}   sesiones: {sesiones:,}   profesores: {PROFESORES}")
+    t = time.perf_counter()
+    por_profesor = poblar(sesiones)
+    print(f"carga: {time.perf_counter() - t:.1f}s\n")
+
+    # Mitad de los chequeos caen sobre una sesión existente, mitad en huecos libres
+    horarios = []
+    for i in range(CHEQUEOS):
+        inicio, fin = _franja(random.randrange(por_profesor))
+        if i % 2:
+            inicio, fin = fin, fin + timedelta(minutes=50)
+        horarios.append((random.randrange(PROFESORES) + 1, inicio, fin))
+
+    async with AsyncSessionLocal() as db:
+        print("1) chequeo de un horario en createCall")
+        indices(False)
+        antes = await medir_async(lambda i: consulta_anterior(db, *horarios[i]), CHEQUEOS)
+        print(f"   IN (subconsulta), sin índices   {resumen(antes)}")
+        indices(True)
+        ahora = await medir_async(lambda i: find_conflict(db, *horarios[i]), CHEQUEOS)
+        print(f"   find_conflict, con índices      {resumen(ahora)}")
+
+        # Lote: la mitad de las propuestas choca con sesiones existentes
+        profesor = 1
+        propuestas = []
+        for i in range(n_propuestas):
+            inicio, fin = _franja(random.randrange(por_profesor))
+            propuestas.append((inicio + timedelta(minutes=30), fin + timedelta(minutes=30)) if i % 2 else (fin, fin + timedelta(minutes=50)))
+        desde = min(p[0] for p in propuestas)
+        hasta = max(p[1] for p in propuestas)
+        print(f"\n2) lote de {n_propuestas} propuestas de un profesor con {por_profesor} sesiones")
+
+        t = time.perf_counter()
+        uno_a_uno = [i for i, (a, b) in enumerate(propuestas) if await find_conflict(db, profesor, a, b)]
+        print(f"   find_conflict por propuesta     {(time.perf_counter() - t) * 1000:9.1f} ms")
+
+        t = time.perf_counter()
+        existentes = await load_sessions_in_range(db, profesor, desde, hasta)
+        por_pares = pares_en_memoria(propuestas, existentes)
+        print(f"   una consulta + pares en memoria {(time.perf_counter() - t) * 1000:9.1f} ms")
+
+        t = time.perf_counter()
+        lote = await find_conflicts_batch(db, profesor, propuestas)
+        print(f"   find_conflicts_batch            {(time.perf_counter() - t) * 1000:9.1f} ms")
+
+        # Las tres estrategias detectan los mismos choques contra sesiones existentes
+        contra_existentes = sorted({c["indice"] for c in lote if not str(c["conflicto"]).startswith("se cruza")})
+        assert uno_a_uno == por_pares == contra_existentes, (len(uno_a_uno), len(por_pares), len(contra_existentes))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    random.seed(17)
+    args = [int(a) for a in sys.argv[1:]]
+    if len(args) > 2:
+        PROFESORES = args[2]
+    asyncio.run(main(args[0] if args else 100_000, args[1] if len(args) > 1 else 500))
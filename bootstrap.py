@@ -0,0 +1,243 @@
+"""Inicialización de la base de datos, fuera del arranque de la app.
+
+Uso:
+    python bootstrap.py            # migrate + seed
+    python bootstrap.py migrate    # tablas, columnas e índices
+    python bootstrap.py seed       # roles y administrador
+    python bootstrap.py check      # solo verifica que la BD esté lista
+
+    python bootstrap.py --skip-if-unreachable   # en el build de Render
+
+Con --skip-if-unreachable, si la BD no responde se omite sin error (el
+arranque de la app migra); si responde, cualquier fallo corta el build.
+
+Es idempotente y toma un advisory lock en Postgres, así que varias
+instancias pueden ejecutarlo a la vez sin pisarse.
+"""
+import sys
+import time
+from contextlib import contextmanager
+from sqlalchemy import and_, bindparam, exists, inspect, or_, select, text, update
+from config import SessionLocal, Base, engine
+from model.models import Roles, Usuarios, AuthToken, VersionEsquema
+from services.passwords import hash_password_sync
+from services.jwt import hash_token
+
+# Llave arbitraria del advisory lock de bootstrap (pg_advisory_lock)
+BOOTSTRAP_LOCK_KEY = 7_240_511
+
+# Versión del esquema que deja migrate(). Subirla en cada cambio de migrate()
+# (tablas, columnas o índices nuevos): check_ready compara contra ella.
+# 1: token_hash de auth_token, outbox de correos, versiones de recursos,
+#    registros de GetStream e índices de la serie de optimizaciones
+# 2: estado ENVIANDO y reclamado_hasta en email_outbox
+SCHEMA_VERSION = 2
+
+@contextmanager
+def bootstrap_lock():
+    """Serializa el bootstrap entre procesos (solo Postgres; SQLite es local)."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+
+# Insertar roles defaults si no existen
+def seed_roles():
+    db = SessionLocal(bind=engine)
+    roles_default = [
+        {"id": 1, "nombre_rol": "Estudiante"},
+        {"id": 2, "nombre_rol": "Profesor"},
+        {"id": 3, "nombre_rol": "Administrador"},
+    ]
+
+    for rol_data in roles_default:
+        existente = db.query(Roles).filter_by(id=rol_data["id"]).first()
+        if not existente:
+            # Si no existe con esa ID, verificar si existe por nombre (por si se cambió el ID)
+            mismo_nombre = db.query(Roles).filter_by(nombre_rol=rol_data["nombre_rol"]).first()
+            if mismo_nombre:
+                # Si existe con nombre pero ID diferente → ajustar ID
+                mismo_nombre.id = rol_data["id"]
+            else:
+                # Crear nuevo rol con ID fijo
+                nuevo_rol = Roles(id=rol_data["id"], nombre_rol=rol_data["nombre_rol"])
+                db.add(nuevo_rol)
+
+    db.commit()
+    db.close()
+
+# Migrar auth_token: agregar token_hash indexado y rellenarlo para filas existentes
+MIGRATE_BATCH = 1000
+
+def migrate_auth_token_hash():
+    columnas = [c["name"] for c in inspect(engine).get_columns("auth_token")]
+    if "token_hash" not in columnas:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE auth_token ADD COLUMN token_hash VARCHAR(64)"))
+
+    tokens = AuthToken.__table__
+    otro = tokens.alias("otro")
+    pendiente = and_(tokens.c.token_hash.is_(None), tokens.c.jwt_token.is_not(None))
+    # Otra fila con el mismo JWT que se queda con el digest: la que ya lo tiene
+    # o, si ninguna, la de menor token_id
+    duplicado = exists().where(
+        otro.c.jwt_token == tokens.c.jwt_token,
+        otro.c.token_id != tokens.c.token_id,
+        or_(otro.c.token_hash.is_not(None), otro.c.token_id < tokens.c.token_id),
+    )
+
+    # JWT duplicado: se deja sin digest y se revoca (el índice único lo exige).
+    # Se resuelve en SQL, sin cargar los digests en memoria
+    with engine.begin() as conn:
+        conn.execute(update(tokens).where(pendiente, duplicado).values(revocado=True))
+
+    # Rellenar por lotes (keyset por token_id), un commit por lote
+    ultimo = 0
+    while True:
+        with engine.begin() as conn:
+            lote = conn.execute(
+                select(tokens.c.token_id, tokens.c.jwt_token)
+                .where(pendiente, ~duplicado, tokens.c.token_id > ultimo)
+                .order_by(tokens.c.token_id)
+                .limit(MIGRATE_BATCH)
+            ).all()
+            if not lote:
+                break
+            conn.execute(
+                update(tokens).where(tokens.c.token_id == bindparam("b_id")).values(token_hash=bindparam("b_hash")),
+                [{"b_id": token_id, "b_hash": hash_token(jwt)} for token_id, jwt in lote],
+            )
+        ultimo = lote[-1].token_id
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_auth_token_token_hash ON auth_token (token_hash)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_auth_token_user_id ON auth_token (user_id)"))
+
+# Migrar email_outbox: estado ENVIANDO y columna del lease de envío
+def migrate_email_outbox():
+    columnas = [c["name"] for c in inspect(engine).get_columns("email_outbox")]
+    if "reclamado_hasta" not in columnas:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE email_outbox ADD COLUMN reclamado_hasta TIMESTAMP"))
+    if engine.dialect.name == "postgresql":
+        # ADD VALUE no puede usarse en la misma transacción que lo agrega
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ALTER TYPE estadocorreo ADD VALUE IF NOT EXISTS 'ENVIANDO'"))
+
+def seed_admin():
+    db = SessionLocal()
+    password = "admin123"  # O usa os.getenv("ADMIN_PASSWORD")
+    
+    existing_admin = db.query(Usuarios).filter(Usuarios.email == "admin@admin.com").first()
+    if existing_admin:
+        db.close()
+        return  # Ya existe, no se crea de nuevo
+    
+    admin_role = db.query(Roles).filter(Roles.nombre_rol == "Administrador").first()
+    if not admin_role:
+        raise Exception("El rol 'Administrador' no existe. Ejecuta seed_roles primero.")
+    
+    nuevo_admin = Usuarios(
+        nombre="Admin",
+        apellido="Principal",
+        email="admin@admin.com",
+        password_hash=hash_password_sync(password),
+        role=admin_role.id,
+        confirmado=True,
+        status="Activo"
+    )
+    
+    db.add(nuevo_admin)
+    db.commit()
+    db.close()
+
+# create_all no agrega índices nuevos a tablas que ya existen
+def ensure_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def record_schema_version():
+    """Marca el esquema como migrado; nunca baja la versión (deploys escalonados)."""
+    with SessionLocal() as db:
+        fila = db.get(VersionEsquema, 1)
+        if fila is None:
+            db.add(VersionEsquema(id=1, version=SCHEMA_VERSION))
+        elif fila.version < SCHEMA_VERSION:
+            fila.version = SCHEMA_VERSION
+        db.commit()
+
+def migrate():
+    Base.metadata.create_all(bind=engine)
+    migrate_auth_token_hash()
+    migrate_email_outbox()
+    ensure_indexes()
+    record_schema_version()
+
+def seed():
+    seed_roles()
+    seed_admin()
+
+def check_ready() -> bool:
+    """Chequeo barato: migrate() ya dejó SCHEMA_VERSION y existe el rol Administrador.
+
+    Una BD creada antes de la versión actual (sin version_esquema o con una
+    versión menor) no está lista aunque tenga todas las tablas: le faltan
+    columnas o índices que solo agrega migrate().
+    """
+    try:
+        with SessionLocal() as db:
+            version = db.scalar(select(VersionEsquema.version).where(VersionEsquema.id == 1))
+            if version is None or version < SCHEMA_VERSION:
+                return False
+            return db.scalar(select(Roles.id).where(Roles.nombre_rol == "Administrador")) is not None
+    except Exception as e:
+        print("⚠️ BD no disponible o sin migrar:", e)
+        return False
+
+def ensure_schema():
+    """Fallback del arranque: migra y siembra roles, sin el admin (bcrypt)."""
+    inicio = time.perf_counter()
+    with bootstrap_lock():
+        migrate()
+        seed_roles()
+    print(f"✅ esquema listo en {time.perf_counter() - inicio:.2f}s; "
+          "el administrador se crea con `python bootstrap.py seed`")
+
+def db_reachable() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        print("⚠️ BD no disponible:", e)
+        return False
+
+def bootstrap(comando: str = "all"):
+    inicio = time.perf_counter()
+    with bootstrap_lock():
+        if comando in ("all", "migrate"):
+            migrate()
+        if comando in ("all", "seed"):
+            seed()
+    print(f"✅ bootstrap '{comando}' completado en {time.perf_counter() - inicio:.2f}s")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--skip-if-unreachable" in args:
+        args.remove("--skip-if-unreachable")
+        if not db_reachable():
+            print("bootstrap omitido: la BD no responde; la app migra al arrancar")
+            sys.exit(0)
+    comando = args[0] if args else "all"
+    if comando == "check":
+        sys.exit(0 if check_ready() else 1)
+    if comando not in ("all", "migrate", "seed"):
+        print(__doc__)
+        sys.exit(2)
+    bootstrap(comando)
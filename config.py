@@ -1,5 +1,8 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from services.db_metrics import TimedAsyncQueuePool, pool_metrics
 from dotenv import load_dotenv
 import os
 
@@ -21,8 +24,96 @@ BREVO_API_KEY = os.getenv("BREVO_API_KEY", None)
 BREVO_SENDER_EMAIL = os.getenv("BREVO_SENDER_EMAIL", None)
 BREVO_SENDER_NAME = os.getenv("BREVO_SENDER_NAME", None)
 DOMINIO_VERIFICACION = os.getenv("DOMINIO_VERIFICACION", None)
+BREVO_API_URL = os.getenv("BREVO_API_URL", "https://api.brevo.com/v3/smtp/email")
+EMAIL_HTTP_TIMEOUT = float(os.getenv("EMAIL_HTTP_TIMEOUT", "10"))
+BREVO_BATCH_SIZE = int(os.getenv("BREVO_BATCH_SIZE", "1000"))  # messageVersions por request
+BREVO_BATCH_CONCURRENCY = int(os.getenv("BREVO_BATCH_CONCURRENCY", "4"))
+
+# Outbox de correos (worker en segundo plano)
+EMAIL_OUTBOX_BATCH = int(os.getenv("EMAIL_OUTBOX_BATCH", "50"))
+EMAIL_OUTBOX_INTERVAL = float(os.getenv("EMAIL_OUTBOX_INTERVAL", "2"))
+EMAIL_OUTBOX_MAX_INTENTOS = int(os.getenv("EMAIL_OUTBOX_MAX_INTENTOS", "6"))
+EMAIL_OUTBOX_BACKOFF = float(os.getenv("EMAIL_OUTBOX_BACKOFF", "5"))
+EMAIL_OUTBOX_BACKOFF_MAX = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX", "900"))
+# Segundos que un worker retiene un lote reclamado; si muere, otro lo retoma al vencer
+EMAIL_OUTBOX_LEASE = float(os.getenv("EMAIL_OUTBOX_LEASE", "120"))
+
+# Cache de tokens validados (segundos / entradas). La cache es local a cada
+# proceso: logout, cambio de rol o desactivación solo la limpian en el worker
+# que atendió la petición. En los demás workers de uvicorn un token revocado o
+# un rol viejo puede seguir valiendo hasta TOKEN_CACHE_TTL segundos; por eso el
+# valor por defecto es corto. Con un solo worker no hay ventana.
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "5"))
+TOKEN_CACHE_MAX = int(os.getenv("TOKEN_CACHE_MAX", "10000"))
+
+# Hashing de contraseñas (bcrypt)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "2"))
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5"))
+
+# Sincronización de usuarios con GetStream (segundos entre lotes)
+GETSTREAM_SYNC_INTERVAL = float(os.getenv("GETSTREAM_SYNC_INTERVAL", "5"))
+# Timeout HTTP (segundos) del cliente compartido de GetStream
+GETSTREAM_TIMEOUT = float(os.getenv("GETSTREAM_TIMEOUT", "6"))
+
+# Registro de llamadas activas de GetStream
+CALL_REGISTRY_BACKEND = os.getenv("CALL_REGISTRY_BACKEND", "memory")  # "memory" o "db"
+CALL_REGISTRY_TTL = int(os.getenv("CALL_REGISTRY_TTL", str(4 * 3600)))  # segundos sin actividad
+
+# Notificaciones en tiempo real (WebSocket)
+NOTIFICATIONS_BROKER = os.getenv("NOTIFICATIONS_BROKER", "memory")  # "memory" o "postgres"
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))
+WS_SLOW_CONSUMER = os.getenv("WS_SLOW_CONSUMER", "disconnect")  # "drop" o "disconnect"
+
+# Token Bearer opcional para /metrics (si está vacío el endpoint es público)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Pool de conexiones
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def pool_options(url: str) -> dict:
+    """Opciones de pool para create_engine; SQLite usa el pool por defecto del dialecto."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
 
 # Configuración de SQLAlchemy
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+def async_database_url(url: str):
+    """Traduce la URL síncrona al driver async: asyncpg (Postgres) o aiosqlite (SQLite)."""
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        query = dict(url.query)
+        # asyncpg no entiende sslmode, usa ssl
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+# Motor y sesiones async para las rutas (expire_on_commit=False evita lazy loads tras commit)
+_async_pool = pool_options(DATABASE_URL)
+if _async_pool:
+    _async_pool["poolclass"] = TimedAsyncQueuePool
+async_engine = create_async_engine(async_database_url(DATABASE_URL), **_async_pool)
+pool_metrics.attach(async_engine.sync_engine.pool)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Conexion a base de datos (dependencia compartida por todas las rutas)
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
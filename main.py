@@ -1,17 +1,43 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from config import SessionLocal, Base, engine
-from routes import NewVideoCall, auth, ejemplo, estudiante, getstreamFile, notificaciones, profesores, administrador
-from model.models import Roles, Usuarios
-from services.cifrar import hash_password
+from routes import NewVideoCall, auth, ejemplo, estudiante, getstreamFile, notificaciones, notifications, profesores, administrador
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from services.email_outbox import start_worker, stop_worker
+from services.notification_hub import hub
+from services.getstream import start_sync_worker, stop_sync_worker
+from bootstrap import check_ready, ensure_schema
+from config import AsyncSessionLocal, METRICS_TOKEN
+from services.roles import role_registry
+from services.request_metrics import MetricsMiddleware, attach_query_events, route_metrics
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Esquema y seeds los crea `python bootstrap.py`; aquí solo se verifica.
+    # Si la BD no está lista (el build no la alcanzó) se migra bajo el lock,
+    # sin el seed del administrador para no pagar bcrypt en el arranque.
+    if not await run_in_threadpool(check_ready):
+        await run_in_threadpool(ensure_schema)
+    # Registro de roles id <-> nombre en memoria
+    async with AsyncSessionLocal() as db:
+        await role_registry.refresh(db)
+    # Worker que entrega los correos del outbox
+    start_worker()
+    # Hub de WebSockets y su broker (memoria o Postgres LISTEN/NOTIFY)
+    await hub.start()
+    # Reconciliación en lote de usuarios GetStream
+    start_sync_worker()
+    yield
+    await stop_sync_worker()
+    await hub.stop()
+    await stop_worker()
 
-#app.mount("/static", StaticFiles(directory="static"), name="static")
+app = FastAPI(lifespan=lifespan)
 
-Base.metadata.create_all(bind=engine)
+#app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # CORS
 app.add_middleware(
@@ -25,67 +51,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeceras de paginación que el frontend necesita leer
+    expose_headers=["X-Next-After-Id", "X-Total-Count", "X-Page", "X-Page-Size", "Content-Disposition"],
 )
 
-# Conexion a base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Insertar roles defaults si no existen
-def seed_roles():
-    db = SessionLocal(bind=engine)
-    roles_default = [
-        {"id": 1, "nombre_rol": "Estudiante"},
-        {"id": 2, "nombre_rol": "Profesor"},
-        {"id": 3, "nombre_rol": "Administrador"},
-    ]
-
-    for rol_data in roles_default:
-        existente = db.query(Roles).filter_by(id=rol_data["id"]).first()
-        if not existente:
-            # Si no existe con esa ID, verificar si existe por nombre (por si se cambió el ID)
-            mismo_nombre = db.query(Roles).filter_by(nombre_rol=rol_data["nombre_rol"]).first()
-            if mismo_nombre:
-                # Si existe con nombre pero ID diferente → ajustar ID
-                mismo_nombre.id = rol_data["id"]
-            else:
-                # Crear nuevo rol con ID fijo
-                nuevo_rol = Roles(id=rol_data["id"], nombre_rol=rol_data["nombre_rol"])
-                db.add(nuevo_rol)
-
-    db.commit()
-    db.close()
-
-def seed_admin():
-    db = SessionLocal()
-    password = "admin123"  # O usa os.getenv("ADMIN_PASSWORD")
-    
-    existing_admin = db.query(Usuarios).filter(Usuarios.email == "admin@admin.com").first()
-    if existing_admin:
-        db.close()
-        return  # Ya existe, no se crea de nuevo
-    
-    admin_role = db.query(Roles).filter(Roles.nombre_rol == "Administrador").first()
-    if not admin_role:
-        raise Exception("El rol 'Administrador' no existe. Ejecuta seed_roles primero.")
-    
-    nuevo_admin = Usuarios(
-        nombre="Admin",
-        apellido="Principal",
-        email="admin@admin.com",
-        password_hash=hash_password(password),
-        role=admin_role.id,
-        confirmado=True,
-        status="Activo"
-    )
-    
-    db.add(nuevo_admin)
-    db.commit()
-    db.close()
+# Latencia, estado y consultas SQL por ruta (/metrics y cabecera Server-Timing)
+attach_query_events()
+app.add_middleware(MetricsMiddleware)
 
 # Ejemplo basico de ruta
 @app.get("/")
@@ -101,6 +73,13 @@ def server_time():
         "token_will_expire_at": expire.isoformat()
     }
 
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(route_metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Importar rutas
 app.include_router(ejemplo.router)
 app.include_router(auth.router)
@@ -110,6 +89,5 @@ app.include_router(administrador.router)
 app.include_router(estudiante.router)
 app.include_router(NewVideoCall.router)
 app.include_router(notificaciones.router)
+app.include_router(notifications.router)
 
-seed_roles()
-seed_admin()
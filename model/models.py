@@ -7,6 +7,7 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     Boolean,
+    Index,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -48,6 +49,12 @@ class EstadoNotificacion(enum.Enum):
     ENVIADO = "ENVIADO"
     LEIDO = "LEIDO"
 
+class EstadoCorreo(enum.Enum):
+    PENDIENTE = "PENDIENTE"
+    ENVIANDO = "ENVIANDO"  # reclamado por un worker hasta reclamado_hasta
+    ENVIADO = "ENVIADO"
+    FALLIDO = "FALLIDO"
+
 # --- TABLAS ---
 
 class Roles(Base):
@@ -89,7 +96,7 @@ class Cursos(Base):
     id = Column(Integer, primary_key=True, index=True)
     titulo = Column(String)
     descripcion = Column(String)
-    profesor_id = Column(Integer, ForeignKey("Usuarios.id"), nullable=False)
+    profesor_id = Column(Integer, ForeignKey("Usuarios.id"), nullable=False, index=True)
     creacion_curso = Column(DateTime(timezone=False), server_default=func.now())
     estado_curso = Column(Enum(EstadoCurso), default=EstadoCurso.Activo)
 
@@ -130,6 +137,11 @@ class Sesiones_Virtuales(Base):
     curso = relationship("Cursos", back_populates="sesiones")
     participantes = relationship("Participantes_Sesion_V", back_populates="sesion")
 
+    __table_args__ = (
+        # Detección de cruces de horario por curso
+        Index("ix_sesiones_curso_horario", "id_curso", "hora_inicio", "hora_fin"),
+    )
+
 
 class Participantes_Sesion_V(Base):
     __tablename__ = "Participantes_Sesion_V"
@@ -171,15 +183,82 @@ class Notificaciones(Base):
 
     usuario = relationship("Usuarios", back_populates="notificaciones")
 
+    __table_args__ = (
+        # Contador de no leídas y filtros por estado
+        Index("ix_notificaciones_usuario_status_hora", "usuario_id", "status", "hora_envio"),
+        # Feed keyset ordenado por (hora_envio, id)
+        Index("ix_notificaciones_usuario_hora_id", "usuario_id", "hora_envio", "id"),
+    )
+
 
 class AuthToken(Base):
     __tablename__ = "auth_token"
 
     token_id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("Usuarios.id"))
+    user_id = Column(Integer, ForeignKey("Usuarios.id"), index=True)
     jwt_token = Column(String)
+    token_hash = Column(String(64), unique=True, index=True)  # SHA-256 del JWT
     expiracion = Column(DateTime)
     creacion = Column(DateTime(timezone=False), server_default=func.now())
     revocado = Column(Boolean, default=False)
 
     usuario = relationship("Usuarios")
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    destinatario = Column(String, nullable=False)
+    asunto = Column(String, nullable=False)
+    html = Column(String, nullable=False)
+    estado = Column(Enum(EstadoCorreo), default=EstadoCorreo.PENDIENTE, nullable=False)
+    intentos = Column(Integer, default=0, nullable=False)
+    proximo_intento = Column(DateTime(timezone=False), server_default=func.now())
+    ultimo_error = Column(String, nullable=True)
+    creacion = Column(DateTime(timezone=False), server_default=func.now())
+    enviado_en = Column(DateTime(timezone=False), nullable=True)
+    reclamado_hasta = Column(DateTime(timezone=False), nullable=True)  # lease del envío en curso
+
+    __table_args__ = (
+        Index("ix_email_outbox_pendientes", "estado", "proximo_intento"),
+    )
+
+
+class GetStreamUserSync(Base):
+    __tablename__ = "getstream_user_sync"
+
+    user_id = Column(String, primary_key=True)
+    name_hash = Column(String(64), nullable=False)  # SHA-256 del nombre enviado a GetStream
+    synced_at = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now())
+
+
+class GetStreamCall(Base):
+    __tablename__ = "getstream_calls"
+
+    call_id = Column(String, primary_key=True)
+    created_by = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=False), nullable=False)
+    expires_at = Column(DateTime(timezone=False), nullable=False, index=True)  # se renueva con cada unión
+
+
+class GetStreamCallParticipant(Base):
+    __tablename__ = "getstream_call_participants"
+
+    call_id = Column(String, ForeignKey("getstream_calls.call_id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, primary_key=True)
+
+
+class VersionRecurso(Base):
+    __tablename__ = "versiones_recurso"
+
+    clave = Column(String, primary_key=True)  # p. ej. "usuario:5" o "cursos"
+    version = Column(Integer, nullable=False, default=0)
+
+
+class VersionEsquema(Base):
+    __tablename__ = "version_esquema"
+
+    id = Column(Integer, primary_key=True)  # una sola fila (id=1)
+    version = Column(Integer, nullable=False)  # bootstrap.SCHEMA_VERSION aplicada por migrate()
+    aplicada_en = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now())
@@ -2,22 +2,25 @@ from functools import cached_property
 from os import name
 from typing import ChainMap
 from fastapi import APIRouter, Depends, HTTPException
-from model.models import CalidadVideo, Cursos, Inscritos_Curso, Notificaciones, Participantes_Sesion_V, RoleLlamada, Roles, Sesiones_Virtuales, TipoNotificacion, Usuarios
+from model.models import CalidadVideo, Cursos, Inscritos_Curso, Notificaciones, Participantes_Sesion_V, RoleLlamada, Sesiones_Virtuales, TipoNotificacion, Usuarios
 from pydantic import BaseModel
-from getstream import Stream
-from getstream.models import UserRequest
-from getstream.models import CallRequest
-from config import STREAM_API_KEY, STREAM_API_SECRET, STREAM_BASE_URL, SessionLocal
+from config import get_db
+import asyncio
 from datetime import datetime
+from itertools import islice
 import uuid
-from sqlalchemy.orm import Session
+from dateutil.rrule import rrulestr
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.jwt import verify_token
+from services.getstream import sync_users, ensure_user_synced, get_stream_client
+from services.horarios import find_conflict, find_conflicts_batch
+from utils.bulk import bulk_insert
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/hope", tags=["hope"])
 
-client = Stream(api_key=STREAM_API_KEY, api_secret=STREAM_API_SECRET)
-
 class CallCreate(BaseModel):
     curso_id: int
     titulo: str
@@ -26,27 +29,88 @@ class CallCreate(BaseModel):
     hora_fin: datetime
     origen: str
 
+class SeriesCreate(CallCreate):
+    # Regla RRULE (RFC 5545) aplicada desde hora_inicio, p. ej. "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=32"
+    rrule: str
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Límite de ocurrencias por serie (un semestre con 2-3 clases por semana cabe de sobra)
+MAX_OCURRENCIAS = 200
+# Llamadas simultáneas al SDK de GetStream al crear una serie
+STREAM_CONCURRENCY = 8
+
+async def _cargar_miembros(db: AsyncSession, curso_id: int, current):
+    """Alumnos inscritos (con nombre) en una sola consulta + miembros para GetStream."""
+    integrantes = (await db.execute(
+        select(Inscritos_Curso.id_estudiante, Usuarios.nombre, Usuarios.apellido)
+        .join(Usuarios, Usuarios.id == Inscritos_Curso.id_estudiante)
+        .where(
+            Inscritos_Curso.id_curso == curso_id,
+            Inscritos_Curso.estado_invitacion == "Aceptada"
+        )
+        .order_by(Inscritos_Curso.id_inscripcion)
+    )).all()
+
+    nombres = {current.id: f"{current.nombre} {current.apellido}"}
+    members = [{"user_id": str(current.id), "role": "admin"}]
+    for ins in integrantes:
+        nombres[ins.id_estudiante] = f"{ins.nombre} {ins.apellido}"
+        members.append({"user_id": str(ins.id_estudiante), "role": "user"})
+
+    return integrantes, nombres, members
+
+async def _crear_llamada(client, enlace, current, members):
+    from getstream.models import CallRequest
+    call = client.video.call("default", enlace)
+    await run_in_threadpool(
+        call.create,
+        data=CallRequest(
+            created_by_id=str(current.id),
+            members=members
+        )
+    )
+
+async def _borrar_llamadas(client, enlaces):
+    """Borra llamadas de GetStream de una serie que no se pudo guardar."""
+    slots = asyncio.Semaphore(STREAM_CONCURRENCY)
+
+    async def borrar(enlace):
+        async with slots:
+            await run_in_threadpool(client.video.call("default", enlace).delete, hard=True)
+
+    resultados = await asyncio.gather(*(borrar(e) for e in enlaces), return_exceptions=True)
+    for enlace, r in zip(enlaces, resultados):
+        if isinstance(r, Exception):
+            print(f"⚠️ No se pudo borrar la llamada {enlace} de GetStream:", r)
+
+def _filas_participantes(sesion_ids, current, integrantes) -> list[dict]:
+    ahora = datetime.now().replace(tzinfo=None)
+    # Primero todos los HOST y luego los alumnos: el executemany se agrupa por
+    # filas consecutivas con la misma forma, así quedan dos INSERT por serie
+    filas = [
+        {"id_sesion": sesion_id, "id_usuario": current.id, "hora_unido": ahora, "role_llamada": RoleLlamada.HOST}
+        for sesion_id in sesion_ids
+    ]
+    filas.extend(
+        {"id_sesion": sesion_id, "id_usuario": ins.id_estudiante, "hora_unido": None, "role_llamada": RoleLlamada.PARTICIPANTE}
+        for sesion_id in sesion_ids
+        for ins in integrantes
+    )
+    return filas
+
+def _filas_notificaciones(current, integrantes, titulo: str, mensaje: str) -> list[dict]:
+    return [
+        {"usuario_id": ins.id_estudiante, "titulo": titulo, "mensaje": mensaje, "tipo": TipoNotificacion.EN_APP}
+        for ins in integrantes
+        if ins.id_estudiante != current.id  # evitamos enviar notificacion al profesor
+    ]
 
 @router.post("/createCall")
-async def create_call(Info: CallCreate, current=Depends(verify_token), db:Session = Depends(get_db)):
+async def create_call(Info: CallCreate, current=Depends(verify_token), db: AsyncSession = Depends(get_db), client=Depends(get_stream_client)):
     if current.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="No tienes permisos para crear llamadas")
 
 # 🔍 Verificar si el profesor tiene sesiones que se cruzan
-    conflicto = db.query(Sesiones_Virtuales).filter(
-        Sesiones_Virtuales.id_curso.in_(
-            db.query(Cursos.id).filter(Cursos.profesor_id == current.id)
-        ),
-        Sesiones_Virtuales.hora_inicio < Info.hora_fin,
-        Sesiones_Virtuales.hora_fin > Info.hora_inicio
-    ).first()
+    conflicto = await find_conflict(db, current.id, Info.hora_inicio, Info.hora_fin)
 
     if conflicto:
         raise HTTPException(
@@ -55,119 +119,181 @@ async def create_call(Info: CallCreate, current=Depends(verify_token), db:Sessio
                    f"({conflicto.hora_inicio} → {conflicto.hora_fin})"
         )
 
-    integrantes = db.query(Inscritos_Curso).filter(
-        Inscritos_Curso.id_curso == Info.curso_id,
-        Inscritos_Curso.estado_invitacion == "Aceptada"
-    ).all()
-
-    members = [{"user_id": str(current.id), "role": "admin"}]
-    for ins in integrantes:
-        members.append({"user_id": str(ins.id_estudiante), "role": "user"})
+    # Alumnos inscritos con su nombre en una sola consulta
+    integrantes, nombres, members = await _cargar_miembros(db, Info.curso_id, current)
 
-    # Registrar usuarios en GetStream
-    for m in members:
-        db_user = db.query(Usuarios).filter(Usuarios.id == int(m["user_id"])).first()
-        if db_user:
-            client.upsert_users(UserRequest(id=str(db_user.id), name=f"{db_user.nombre} {db_user.apellido}"))
+    # Registrar en GetStream solo usuarios nuevos o renombrados (lotes de hasta 100);
+    # el registro local se guarda con el commit de la sesión
+    await sync_users(client, nombres, db)
 
     enlace = uuid.uuid4()
+    await _crear_llamada(client, enlace, current, members)
 
-    call = client.video.call("default", enlace)
-    call.create(
-        data=CallRequest(
-            created_by_id=str(current.id),
-            members=members
-        )
-    )
+    hora_inicio_naive = Info.hora_inicio.replace(tzinfo=None) if Info.hora_inicio.tzinfo else Info.hora_inicio
+    hora_fin_naive = Info.hora_fin.replace(tzinfo=None) if Info.hora_fin.tzinfo else Info.hora_fin
+    enlace_llamada = f"{Info.origen}/call/{enlace}/{Info.curso_id}"
+
+    # 🔥 Sesión, participantes y notificaciones en una sola transacción
+    [sesion_id] = await bulk_insert(db, Sesiones_Virtuales, [{
+        "id_curso": Info.curso_id,
+        "titulo": Info.titulo,
+        "descripcion": Info.descripcion,
+        "hora_inicio": hora_inicio_naive,
+        "hora_fin": hora_fin_naive,
+        "enlace_llamada": enlace_llamada,
+        "calidad_video": CalidadVideo.p4K,
+        "grabacion_url": Info.origen,
+    }], returning=Sesiones_Virtuales.id_sesion)
+
+    # Profesor como HOST + todos los alumnos inscritos (hora_unido se llena al unirse)
+    participantes = _filas_participantes([sesion_id], current, integrantes)
+    await bulk_insert(db, Participantes_Sesion_V, participantes)
+
+    await bulk_insert(db, Notificaciones, _filas_notificaciones(
+        current, integrantes,
+        titulo="Nueva sesión",
+        mensaje=f"Tu profesor: {current.nombre} {current.apellido} ha creado una nueva sesión"
+    ))
+
+    await db.commit()
+
+    return {
+        "message": "Sesión creada exitosamente",
+        "enlace_llamada": enlace_llamada,
+        "miembros": [{"nombre": nombres[p["id_usuario"]]} for p in participantes]
+    }
+
+@router.post("/createSeries")
+async def create_series(Info: SeriesCreate, current=Depends(verify_token), db: AsyncSession = Depends(get_db), client=Depends(get_stream_client)):
+    """Crea todas las sesiones de una serie recurrente en una sola transacción."""
+    if current.role_name != "Profesor":
+        raise HTTPException(status_code=403, detail="No tienes permisos para crear llamadas")
+
+    curso = await db.get(Cursos, Info.curso_id)
+    if not curso or curso.profesor_id != current.id:
+        raise HTTPException(status_code=404, detail="Curso no encontrado")
 
     hora_inicio_naive = Info.hora_inicio.replace(tzinfo=None) if Info.hora_inicio.tzinfo else Info.hora_inicio
     hora_fin_naive = Info.hora_fin.replace(tzinfo=None) if Info.hora_fin.tzinfo else Info.hora_fin
+    duracion = hora_fin_naive - hora_inicio_naive
+    if duracion.total_seconds() <= 0:
+        raise HTTPException(status_code=400, detail="hora_fin debe ser posterior a hora_inicio")
 
-    new_session=Sesiones_Virtuales(
-        id_curso=Info.curso_id,
-        titulo=Info.titulo,
-        descripcion=Info.descripcion,
-        hora_inicio=hora_inicio_naive,
-        hora_fin=hora_fin_naive,
-        enlace_llamada=f"{Info.origen}/call/{enlace}/{Info.curso_id}",
-        calidad_video=CalidadVideo.p4K,
-        grabacion_url=Info.origen,
-    )
+    # 🗓 Expandir la regla de recurrencia
+    regla = Info.rrule.upper()
+    if "COUNT=" not in regla and "UNTIL=" not in regla:
+        raise HTTPException(status_code=400, detail="La regla debe incluir COUNT o UNTIL")
+    try:
+        # islice evita materializar reglas enormes antes de validar el límite
+        inicios = list(islice(rrulestr(Info.rrule, dtstart=hora_inicio_naive), MAX_OCURRENCIAS + 1))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Regla de recurrencia inválida: {e}")
 
-    db.add(new_session)
-    db.commit()
-    db.refresh(new_session)  # 👈 Esto actualiza el objeto con los datos reales en DB
-
-    # 🔥 Registrar a todos los participantes en la tabla Participantes_Sesion_V
-    participantes = []
-    notificaciones = []
-
-    # Agregar al profesor como HOST
-    participantes.append(
-        Participantes_Sesion_V(
-            id_sesion=new_session.id_sesion,
-            id_usuario=current.id,
-            hora_unido=datetime.now().replace(tzinfo=None),
-            role_llamada=RoleLlamada.HOST
-        )
-    )
+    if not inicios:
+        raise HTTPException(status_code=400, detail="La regla no genera ninguna sesión")
+    if len(inicios) > MAX_OCURRENCIAS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_OCURRENCIAS} sesiones por serie")
 
-    # Agregar a todos los alumnos inscritos
-    for ins in integrantes:
-        participante = Participantes_Sesion_V(
-            id_sesion=new_session.id_sesion,
-            id_usuario=ins.id_estudiante,
-            hora_unido=None,  # Se actualizará cuando realmente se unan
-            role_llamada=RoleLlamada.PARTICIPANTE
-        )
-        participantes.append(participante)
+    ocurrencias = [(inicio, inicio + duracion) for inicio in inicios]
 
-    db.add_all(participantes)
-    db.commit()
+    # 🔍 Validar cruces de todas las ocurrencias con una sola consulta
+    conflictos = await find_conflicts_batch(db, current.id, ocurrencias)
+    if conflictos:
+        raise HTTPException(status_code=400, detail={
+            "message": "La serie se cruza con otras sesiones",
+            "conflictos": [
+                {
+                    "hora_inicio": ocurrencias[c["indice"]][0].isoformat(),
+                    "hora_fin": ocurrencias[c["indice"]][1].isoformat(),
+                    "conflicto": c["conflicto"] if isinstance(c["conflicto"], str)
+                                 else f"{c['conflicto'].titulo} ({c['conflicto'].hora_inicio} → {c['conflicto'].hora_fin})"
+                }
+                for c in conflictos
+            ]
+        })
 
-    for ins in integrantes:
-        if ins.id_estudiante != current.id: #evitamos enviar notificacion al profesor
-            new_notif = Notificaciones(
-                usuario_id=ins.id_estudiante,
-                titulo="Nueva sesión",
-                mensaje=f"Tu profesor: {current.nombre} {current.apellido} ha creado una nueva sesión",
-                tipo=TipoNotificacion.EN_APP
-            )
-            notificaciones.append(new_notif)
-
-    db.add_all(notificaciones)
-    db.commit()
+    integrantes, nombres, members = await _cargar_miembros(db, Info.curso_id, current)
+    await sync_users(client, nombres, db)
+
+    # 🔥 Insertar sesiones, participantes y notificaciones en una sola transacción
+    enlaces = [uuid.uuid4() for _ in ocurrencias]
+    sesion_ids = await bulk_insert(db, Sesiones_Virtuales, [
+        {
+            "id_curso": Info.curso_id,
+            "titulo": Info.titulo,
+            "descripcion": Info.descripcion,
+            "hora_inicio": inicio,
+            "hora_fin": fin,
+            "enlace_llamada": f"{Info.origen}/call/{enlace}/{Info.curso_id}",
+            "calidad_video": CalidadVideo.p4K,
+            "grabacion_url": Info.origen,
+        }
+        for (inicio, fin), enlace in zip(ocurrencias, enlaces)
+    ], returning=Sesiones_Virtuales.id_sesion)
+
+    await bulk_insert(db, Participantes_Sesion_V, _filas_participantes(sesion_ids, current, integrantes))
+
+    # Una notificación por alumno para toda la serie
+    await bulk_insert(db, Notificaciones, _filas_notificaciones(
+        current, integrantes,
+        titulo="Nuevas sesiones",
+        mensaje=f"Tu profesor: {current.nombre} {current.apellido} ha programado {len(sesion_ids)} sesiones de {curso.titulo}"
+    ))
+
+    # Las llamadas de GetStream se crean con las filas ya insertadas: si alguna
+    # falla se deshace la transacción y se borran las que sí se crearon
+    slots = asyncio.Semaphore(STREAM_CONCURRENCY)
+
+    async def crear(enlace):
+        async with slots:
+            await _crear_llamada(client, enlace, current, members)
+
+    creadas = await asyncio.gather(*(crear(e) for e in enlaces), return_exceptions=True)
+    fallidas = [r for r in creadas if isinstance(r, Exception)]
+    if fallidas:
+        await db.rollback()
+        await _borrar_llamadas(client, [e for e, r in zip(enlaces, creadas) if not isinstance(r, Exception)])
+        raise HTTPException(status_code=502, detail=f"No se pudieron crear {len(fallidas)} de {len(enlaces)} llamadas en GetStream: {fallidas[0]}")
+
+    try:
+        await db.commit()
+    except Exception:
+        await _borrar_llamadas(client, enlaces)
+        raise
 
     return {
-        "message": "Sesión creada exitosamente",
-        "enlace_llamada": new_session.enlace_llamada,
-        "miembros": [
+        "message": "Serie creada exitosamente",
+        "total_sesiones": len(sesion_ids),
+        "sesiones": [
             {
-                "nombre": f"{db.query(Usuarios).get(p.id_usuario).nombre} {db.query(Usuarios).get(p.id_usuario).apellido}"
+                "sesion_id": sesion_id,
+                "hora_inicio": inicio,
+                "hora_fin": fin,
+                "enlace_llamada": f"{Info.origen}/call/{enlace}/{Info.curso_id}"
             }
-            for p in participantes
-        ]
+            for sesion_id, (inicio, fin), enlace in zip(sesion_ids, ocurrencias, enlaces)
+        ],
+        "miembros": [{"nombre": nombre} for nombre in nombres.values()]
     }
 
 @router.post("/joinCall")
-async def join_call(curso_id: int, current=Depends(verify_token), db:Session = Depends(get_db)):
-    miembro = db.query(Inscritos_Curso).filter(
+async def join_call(curso_id: int, current=Depends(verify_token), db: AsyncSession = Depends(get_db), client=Depends(get_stream_client)):
+    miembro = await db.scalar(select(Inscritos_Curso).where(
         Inscritos_Curso.id_curso == curso_id,
         Inscritos_Curso.id_estudiante == current.id
-    ).first()
+    ))
 
-    profesor = (
-        db.query(Usuarios)
-        .join(Roles)
-        .filter(Usuarios.id == current.id, Roles.nombre_rol == "Profesor")
-        .first()
-    )
+    profesor = current.role_name == "Profesor"
 
     if not miembro and not profesor:
         raise HTTPException(status_code=403, detail="No perteneces a este curso")
 
-     # Crear el token de GetStream
-    client.upsert_users(UserRequest(id=str(current.id), name=f"{current.nombre} {current.apellido}"))
+    # Un usuario nuevo se registra en GetStream ahora (si no, el token no le
+    # sirve); un renombre sale en el próximo lote de reconciliación
+    if await ensure_user_synced(client, current.id, f"{current.nombre} {current.apellido}", db):
+        await db.commit()
+
+    # Crear el token de GetStream
     user_token = client.create_token(user_id=str(current.id))
 
     return {
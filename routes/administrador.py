@@ -1,55 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from config import SessionLocal
-from model.models import Usuarios, Roles, Cursos, Inscritos_Curso
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_db, async_engine, AsyncSessionLocal
+from model.models import Usuarios, Cursos, Inscritos_Curso, EstadoCurso, EstadoUsuario
 from services.jwt import verify_token
-from services.email import send_email
+from services.email import queue_email
+from services.email_outbox import notify_outbox
+from services.token_cache import token_cache
+from services.db_metrics import pool_metrics
+from services.roles import role_registry
 
 router = APIRouter(prefix="/administrador", tags=["Administrador"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
-
 from services.jwt import verify_token
 
-# Obtener todos los usuarios menos los administradores
+def _usuarios_page(query, after_id: int | None, status: EstadoUsuario | None, q: str | None, limit: int | None):
+    """Aplica filtros comunes y keyset por id (sin limit devuelve todo)."""
+    if after_id is not None:
+        query = query.where(Usuarios.id > after_id)
+    if status is not None:
+        query = query.where(Usuarios.status == status)
+    if q:
+        nombre_completo = Usuarios.nombre + " " + Usuarios.apellido
+        query = query.where(
+            nombre_completo.icontains(q, autoescape=True) |
+            Usuarios.email.icontains(q, autoescape=True)
+        )
+    query = query.order_by(Usuarios.id.asc())
+    return query if limit is None else query.limit(limit + 1)
+
+def _next_after_id(response: Response, filas: list, limit: int | None) -> list:
+    """Recorta la página y publica el cursor siguiente en X-Next-After-Id."""
+    if limit is not None and len(filas) > limit:
+        filas = filas[:limit]
+        response.headers["X-Next-After-Id"] = str(filas[-1].id)
+    return filas
+
+# Obtener todos los usuarios menos los administradores (keyset por id si se pide limit)
 @router.get("/users")
-async def get_users(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_users(
+    response: Response,
+    after_id: int | None = Query(None, description="X-Next-After-Id de la página anterior"),
+    limit: int | None = Query(None, ge=1, le=200, description="Tamaño de página; sin él se devuelve la lista completa"),
+    rol: str | None = None,
+    status: EstadoUsuario | None = None,
+    confirmado: bool | None = None,
+    q: str | None = Query(None, description="Busca en nombre, apellido o email"),
+    current=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    usuarios = db.query(Usuarios).join(Roles).filter(Roles.nombre_rol != "Administrador").all()
+    # Roles resueltos en memoria: sin JOIN con Roles
+    query = select(Usuarios).where(Usuarios.role != role_registry.id_of("Administrador"))
+    if rol:
+        query = query.where(Usuarios.role == role_registry.id_of(rol))
+    if confirmado is not None:
+        query = query.where(Usuarios.confirmado == confirmado)
+
+    usuarios = (await db.scalars(_usuarios_page(query, after_id, status, q, limit))).all()
+    usuarios = _next_after_id(response, usuarios, limit)
 
     return [
         {
             "id": u.id,
             "nombre": f"{u.nombre} {u.apellido}",
             "email": u.email,
-            "rol": u.rol.nombre_rol,
+            "rol": role_registry.name_of(u.role),
             "status": u.status.value,
             "max_cursos": u.max_cursos
         }
         for u in usuarios
     ]
 
-# Obtener los profesores no aceptados
+# Obtener los profesores (por defecto los no aceptados, keyset por id si se pide limit)
 @router.get("/profesores")
-async def get_profesores(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_profesores(
+    response: Response,
+    after_id: int | None = Query(None, description="X-Next-After-Id de la página anterior"),
+    limit: int | None = Query(None, ge=1, le=200, description="Tamaño de página; sin él se devuelve la lista completa"),
+    status: EstadoUsuario | None = None,
+    confirmado: bool = False,
+    q: str | None = Query(None, description="Busca en nombre, apellido o email"),
+    current=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    profesores = db.query(Usuarios).join(Roles).filter(Roles.nombre_rol == "Profesor", Usuarios.confirmado == False).all()
+    query = select(Usuarios).where(Usuarios.role == role_registry.id_of("Profesor"), Usuarios.confirmado == confirmado)
+
+    profesores = (await db.scalars(_usuarios_page(query, after_id, status, q, limit))).all()
+    profesores = _next_after_id(response, profesores, limit)
 
     return [
         {
             "id": p.id,
             "nombre": f"{p.nombre} {p.apellido}",
             "email": p.email,
-            "rol": p.rol.nombre_rol,
+            "rol": role_registry.name_of(p.role),
             "status": p.status.value,
             "cedula": p.profesor_cedula,
             "instituto": p.profesor_institucion,
@@ -64,14 +117,14 @@ async def get_profesores(current=Depends(verify_token), db: Session = Depends(ge
 async def approve_profesor(
     user_id: int,
     current=Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Solo los administradores pueden aprobar profesores")
 
-    profesor = db.query(Usuarios).join(Roles).filter(
-        Usuarios.id == user_id, Roles.nombre_rol == "Profesor"
-    ).first()
+    profesor = await db.scalar(select(Usuarios).where(
+        Usuarios.id == user_id, Usuarios.role == role_registry.id_of("Profesor")
+    ))
 
     if not profesor:
         raise HTTPException(status_code=404, detail="Profesor no encontrado")
@@ -79,14 +132,17 @@ async def approve_profesor(
     profesor.confirmado = True
     profesor.status = "Activo"
     profesor.token_activacion = None
-    db.commit()
 
-    # Enviar correo al profesor
-    await send_email(
+    # Encolar correo al profesor (misma transacción)
+    queue_email(
+        db,
         to=profesor.email,
         subject="Cuenta aprobada",
         html_body=f"Hola {profesor.nombre}, tu cuenta de profesor ha sido aprobada."
     )
+    await db.commit()
+    token_cache.evict_user(profesor.id)
+    notify_outbox()
 
     return {"message": "Profesor aprobado y notificado"}
 
@@ -95,14 +151,14 @@ async def approve_profesor(
 async def deny_profesor(
     user_id: int,
     current=Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Solo los administradores pueden denegar profesores")
 
-    profesor = db.query(Usuarios).join(Roles).filter(
-        Usuarios.id == user_id, Roles.nombre_rol == "Profesor"
-    ).first()
+    profesor = await db.scalar(select(Usuarios).where(
+        Usuarios.id == user_id, Usuarios.role == role_registry.id_of("Profesor")
+    ))
 
     if not profesor:
         raise HTTPException(status_code=404, detail="Profesor no encontrado")
@@ -110,34 +166,38 @@ async def deny_profesor(
     profesor.confirmado = False
     profesor.status = "Inactivo"
     profesor.token_activacion = None
-    db.commit()
 
-    # Enviar correo al profesor
-    await send_email(
+    # Encolar correo al profesor (misma transacción)
+    queue_email(
+        db,
         to=profesor.email,
         subject="Cuenta denegada",
         html_body=f"Hola {profesor.nombre}, tu cuenta de profesor ha sido denegada."
-)
+    )
+    await db.commit()
+    token_cache.evict_user(profesor.id)
+    notify_outbox()
 
 # Cambiar el rol de un usuario
 @router.put("/users/{user_id}/role")
-async def change_user_role(user_id: int, new_role: str, current=Depends(verify_token), db: Session = Depends(get_db)):
+async def change_user_role(user_id: int, new_role: str, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
     if not new_role:
         raise HTTPException(status_code=400, detail="Rol requerido")
     
-    user = db.query(Usuarios).filter(Usuarios.id == user_id).first()
+    user = await db.get(Usuarios, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    role = db.query(Roles).filter(Roles.nombre_rol == new_role).first()
-    if not role:
+    role_id = role_registry.id_of(new_role)
+    if role_id is None:
         raise HTTPException(status_code=404, detail="Rol no encontrado")
     
-    user.role = role.id
-    db.commit()
+    user.role = role_id
+    await db.commit()
+    token_cache.evict_user(user.id)
     return {"message": "Rol cambiado correctamente"}
 
 # Desactivar un usuario
@@ -145,77 +205,189 @@ async def change_user_role(user_id: int, new_role: str, current=Depends(verify_t
 async def deactivate_user(
         user_id: int,
         current=Depends(verify_token),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
     ):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    user = db.query(Usuarios).filter(Usuarios.id == user_id).first()
+    user = await db.get(Usuarios, user_id)
 
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     user.status = "Inactivo"
-    db.commit()
+    await db.commit()
+    token_cache.evict_user(user.id)
     
     return {"message": "Usuario eliminado correctamente"}
 
 # Obtener todos los cursos con información detallada
+def _cursos_query(estado_curso: EstadoCurso | None, profesor_id: int | None):
+    """Cursos + nombre del profesor + inscritos aceptados, en una sola consulta."""
+    inscritos = (
+        select(Inscritos_Curso.id_curso, func.count().label("estudiantes"))
+        .where(Inscritos_Curso.estado_invitacion == "Aceptada")
+        .group_by(Inscritos_Curso.id_curso)
+        .subquery()
+    )
+    estudiantes = func.coalesce(inscritos.c.estudiantes, 0).label("estudiantes")
+
+    query = (
+        select(
+            Cursos.id,
+            Cursos.titulo,
+            Cursos.descripcion,
+            Cursos.creacion_curso,
+            Cursos.estado_curso,
+            Usuarios.nombre.label("profesor_nombre"),
+            Usuarios.apellido.label("profesor_apellido"),
+            estudiantes,
+        )
+        .outerjoin(Usuarios, Cursos.profesor_id == Usuarios.id)
+        .outerjoin(inscritos, inscritos.c.id_curso == Cursos.id)
+    )
+    if estado_curso is not None:
+        query = query.where(Cursos.estado_curso == estado_curso)
+    if profesor_id is not None:
+        query = query.where(Cursos.profesor_id == profesor_id)
+    return query, estudiantes
+
+def _curso_row(c) -> dict:
+    return {
+        "id": c.id,
+        "titulo": c.titulo,
+        "descripcion": c.descripcion,
+        "creacion_curso": c.creacion_curso,
+        "estado_curso": c.estado_curso.value if c.estado_curso else None,
+        "profesor": f"{c.profesor_nombre} {c.profesor_apellido}" if c.profesor_nombre else "—",
+        "estudiantes": c.estudiantes
+    }
+
+# Obtener los cursos con información detallada (paginado; total en X-Total-Count)
 @router.get("/all/cursos")
-async def get_courses(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_courses(
+    response: Response,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    sort: str = Query("id", pattern="^(id|titulo|creacion_curso|estado_curso|estudiantes)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    estado_curso: EstadoCurso | None = None,
+    profesor_id: int | None = None,
+    current=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    cursos = db.query(Cursos).all()
-    if not cursos:
-        return []
-
-    data = []
-    for curso in cursos:
-        profesor = db.query(Usuarios).filter(Usuarios.id == curso.profesor_id).first()
-
-        # Contar estudiantes inscritos con invitación aceptada
-        inscritos_count = (
-            db.query(Inscritos_Curso)
-            .filter(
-                Inscritos_Curso.id_curso == curso.id,
-                Inscritos_Curso.estado_invitacion == "Aceptada"
-            )
-            .count()
-        )
-
-        data.append({
-            "id": curso.id,
-            "titulo": curso.titulo,
-            "descripcion": curso.descripcion,
-            "creacion_curso": curso.creacion_curso,
-            "estado_curso": curso.estado_curso.value if curso.estado_curso else None,
-            "profesor": f"{profesor.nombre} {profesor.apellido}" if profesor else "—",
-            "estudiantes": inscritos_count
-        })
+    query, estudiantes = _cursos_query(estado_curso, profesor_id)
+
+    total_query = select(func.count()).select_from(Cursos)
+    if estado_curso is not None:
+        total_query = total_query.where(Cursos.estado_curso == estado_curso)
+    if profesor_id is not None:
+        total_query = total_query.where(Cursos.profesor_id == profesor_id)
+    total = await db.scalar(total_query)
+
+    columna = estudiantes if sort == "estudiantes" else getattr(Cursos, sort)
+    orden = columna.desc() if order == "desc" else columna.asc()
+
+    cursos = (await db.execute(
+        query
+        .order_by(orden, Cursos.id.asc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    )).all()
+
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Page"] = str(page)
+    response.headers["X-Page-Size"] = str(page_size)
+
+    return [_curso_row(c) for c in cursos]
+
+# Exportar todos los cursos a CSV sin cargar el catálogo completo en memoria
+@router.get("/all/cursos/export")
+async def export_courses(
+    estado_curso: EstadoCurso | None = None,
+    profesor_id: int | None = None,
+    current=Depends(verify_token)
+):
+    if current.role_name != "Administrador":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    return data
+    query, _ = _cursos_query(estado_curso, profesor_id)
+    columnas = ["id", "titulo", "descripcion", "creacion_curso", "estado_curso", "profesor", "estudiantes"]
+
+    async def generar():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columnas)
+        yield buffer.getvalue()
+
+        # Sesión propia: el generador corre después de que termina la dependencia
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.order_by(Cursos.id).execution_options(yield_per=500))
+            async for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                for c in partition:
+                    fila = _curso_row(c)
+                    writer.writerow([fila[k] for k in columnas])
+                yield buffer.getvalue()
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="cursos.csv"'}
+    )
 
 @router.put("/change/max-cursos/{profesor_id}")
-async def change_max_cursos(profesor_id: int, count: int, current=Depends(verify_token), db: Session = Depends(get_db)):
+async def change_max_cursos(profesor_id: int, count: int, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     # Solo administrador
     if current.role_name != "Administrador":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    profesor = db.query(Usuarios).filter(
+    profesor = await db.scalar(select(Usuarios).where(
         Usuarios.id == profesor_id,
-        Usuarios.role == 2  # Asegura que sea profesor (si 2 es Profesor)
-    ).first()
+        Usuarios.role == role_registry.id_of("Profesor")
+    ))
 
     if not profesor:
         raise HTTPException(status_code=404, detail="Profesor no encontrado")
 
     # Actualizar el límite
     profesor.max_cursos = count
-    db.commit()
+    await db.commit()
+    token_cache.evict_user(profesor.id)
 
     return {
         "message": "Límite de cursos actualizado correctamente",
         "profesor_id": profesor_id,
         "nuevo_maximo": count
     }
+
+
+# Métricas de la cache de tokens
+@router.get("/cache/tokens")
+async def token_cache_stats(current=Depends(verify_token)):
+    if current.role_name != "Administrador":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    return token_cache.stats()
+
+
+# Métricas del pool de conexiones
+@router.get("/metrics/db-pool")
+async def db_pool_metrics(current=Depends(verify_token)):
+    if current.role_name != "Administrador":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    return pool_metrics.snapshot(async_engine.sync_engine.pool)
+
+
+# Recargar el registro de roles (tras editar la tabla Roles a mano)
+@router.post("/roles/refresh")
+async def refresh_roles(current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
+    if current.role_name != "Administrador":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    return {"roles": await role_registry.refresh(db)}
@@ -1,38 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
-from model.models import Usuarios, AuthToken, Roles, EstadoUsuario
-from services.cifrar import hash_password
+from model.models import Usuarios, AuthToken, EstadoUsuario
 from schemas.s_usuarios import UsuarioLogin, UsuarioCreate
-from services.cifrar import verify_password
-from config import SessionLocal, DOMINIO_VERIFICACION
-from services.jwt import create_access_token, verify_token
-from services.email import send_email
+from services.passwords import hash_password, verify_password, needs_rehash
+from config import get_db, DOMINIO_VERIFICACION
+from services.jwt import create_access_token, verify_token, hash_token
+from services.email import queue_email
+from services.email_outbox import notify_outbox
+from services.token_cache import token_cache
+from services.roles import role_registry
 from uuid import uuid4
 from utils.time import utcnow 
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 security = HTTPBearer()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register")
-async def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(Usuarios).filter(Usuarios.email == user.email).first()
+async def register_user(user: UsuarioCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await db.scalar(select(Usuarios).where(Usuarios.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="El correo ya está registrado")
 
-    default_role = db.query(Roles).filter(Roles.nombre_rol == user.role).first()
-    if not default_role:
+    role_id = role_registry.id_of(user.role)
+    if role_id is None:
         raise HTTPException(status_code=400, detail="Rol no válido")
 
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     activation_token = str(uuid4())
 
     nuevo_usuario = Usuarios(
@@ -40,7 +36,7 @@ async def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         apellido=user.apellido,
         email=user.email,
         password_hash=hashed_password,
-        role=default_role.id,
+        role=role_id,
         token_activacion=activation_token,
         confirmado=False,
         status="Inactivo",
@@ -50,7 +46,7 @@ async def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         max_cursos=3
     )
 
-    if default_role.nombre_rol == "Estudiante":
+    if user.role == "Estudiante":
         # Enviar email directo
         activation_link = f"{DOMINIO_VERIFICACION}/activate/{activation_token}"
         
@@ -65,13 +61,14 @@ async def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         <p>Si no solicitaste esta cuenta, ignora este mensaje.</p>
         """
 
-        await send_email(
+        queue_email(
+            db,
             to=user.email,
             subject="Activa tu cuenta - Plataforma Educativa",
             html_body=html_message
         )
         
-    elif default_role.nombre_rol == "Profesor":
+    elif user.role == "Profesor":
         html_admin = f"""
         <h2>Nuevo profesor pendiente de aprobación</h2>
         <p>Nombre: {user.nombre} {user.apellido}</p>
@@ -80,27 +77,29 @@ async def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         <p>Institución: {user.profesor_institucion}</p>
         """
 
-        await send_email(
+        queue_email(
+            db,
             to="gungraveheat123@gmail.com",
             subject="Nuevo profesor esperando aprobación",
             html_body=html_admin
         )
 
     db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
+    await db.commit()
+    await db.refresh(nuevo_usuario)
+    notify_outbox()
 
     return {"message": "Registro exitoso. Verifique su correo si aplica."}
 
 # Login manual
 @router.post("/login")
-async def login_user(user_data: UsuarioLogin, db: Session = Depends(get_db)):
-    user = db.query(Usuarios).filter(Usuarios.email == user_data.email).first()
+async def login_user(user_data: UsuarioLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(Usuarios).where(Usuarios.email == user_data.email))
 
     if not user:
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
 
-    if not verify_password(user_data.password, user.password_hash):
+    if not await verify_password(user_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
     
     if not user.confirmado:
@@ -110,10 +109,10 @@ async def login_user(user_data: UsuarioLogin, db: Session = Depends(get_db)):
         raise HTTPException(status_code=403, detail="Cuenta desactivada")
 
     # Control de múltiples sesiones
-    existing_token = db.query(AuthToken).filter(
+    existing_token = await db.scalar(select(AuthToken).where(
     AuthToken.user_id == user.id,
     AuthToken.revocado == False
-    ).first()
+    ))
 
     # 🔥 Nueva lógica: si el token existe pero ya expiró, lo revocamos
     if existing_token:
@@ -126,17 +125,17 @@ async def login_user(user_data: UsuarioLogin, db: Session = Depends(get_db)):
 
         if exp < now:
             existing_token.revocado = True
-            db.commit()
+            await db.commit()
         else:
             raise HTTPException(status_code=403, detail="Ya hay una sesión activa")
 
-    role = db.query(Roles).filter(Roles.id == user.role).first()
-    if not role:
+    role_name = role_registry.name_of(user.role)
+    if not role_name:
         raise HTTPException(status_code=500, detail="Rol del usuario no encontrado")
 
     # Generar token JWT (con expiración corta, p.ej. 2 minutos para pruebas)
     access_token = create_access_token(
-        {"sub": str(user.id), "name": user.nombre, "rol": str(role.nombre_rol)},
+        {"sub": str(user.id), "name": user.nombre, "rol": role_name},
         expires_delta=timedelta(minutes=30)
     )
 
@@ -145,29 +144,34 @@ async def login_user(user_data: UsuarioLogin, db: Session = Depends(get_db)):
     new_token = AuthToken(
         user_id=user.id,
         jwt_token=access_token,
+        token_hash=hash_token(access_token),
         expiracion=expiracion,
         revocado=False,
     )
     db.add(new_token)
 
+    # Re-hashear si cambió el costo configurado de bcrypt
+    if needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(user_data.password)
+
     # Marcar usuario como activo
     user.status = "Activo"
-    db.commit()
+    await db.commit()
 
-    return {"access_token": access_token, "token_type": "bearer", "name": user.nombre, "role": role.nombre_rol}
+    return {"access_token": access_token, "token_type": "bearer", "name": user.nombre, "role": role_name}
 
 @router.post("/logout")
 async def logout_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     token_str = credentials.credentials
 
     # Buscar el token exacto
-    token_db = db.query(AuthToken).filter(
-        AuthToken.jwt_token == token_str,
+    token_db = await db.scalar(select(AuthToken).where(
+        AuthToken.token_hash == hash_token(token_str),
         AuthToken.revocado == False
-    ).first()
+    ))
     
     if not token_db:
         raise HTTPException(status_code=400, detail="No hay sesión activa")
@@ -176,22 +180,23 @@ async def logout_user(
     token_db.revocado = True
 
     # Marcar usuario como inactivo
-    user = db.query(Usuarios).filter(Usuarios.id == token_db.user_id).first()
+    user = await db.get(Usuarios, token_db.user_id)
     
-    db.commit()
+    await db.commit()
+    token_cache.evict_token(token_str)
 
     return {"message": "Sesión cerrada correctamente"}
 
 @router.get("/activate/{token}")
-async def activate_account(token: str, db: Session = Depends(get_db)):
-    user = db.query(Usuarios).filter(Usuarios.token_activacion == token).first()
+async def activate_account(token: str, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(Usuarios).where(Usuarios.token_activacion == token))
     if not user:
         raise HTTPException(status_code=404, detail="Token inválido")
 
     user.confirmado = True
     user.status = "Activo"
     user.token_activacion = None
-    db.commit()
+    await db.commit()
     return {"message": "Cuenta activada correctamente"}
 
 @router.get("/verify-token")
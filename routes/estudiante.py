@@ -1,33 +1,36 @@
 from datetime import date, datetime, timedelta
 import uuid
-from config import SessionLocal
-from fastapi import APIRouter, Depends, HTTPException
+from config import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from model.models import Inscritos_Curso, Cursos, Usuarios, Sesiones_Virtuales, Notificaciones, TipoNotificacion, EstadoNotificacion
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.jwt import verify_token
-from utils.time import remove_tz, now_naive
+from utils.time import remove_tz, now_naive, utcnow
+from services.calendario import fetch_calendar, current_week, TZ_EL_SALVADOR
+from services.versiones import CATALOGO, bump, clave_usuario, conditional
 
 router = APIRouter(prefix="/students", tags=["Student"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Obtener los cursos inscritos de un estudiante (activos e inactivos)
 @router.get("/courses/active")
 async def get_active_courses(
+    request: Request,
+    response: Response,
     current_user: Usuarios = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if current_user.role_name != "Estudiante":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
+    # 304 sin consultar los cursos si no hubo inscripciones ni cambios de estado
+    sin_cambios = await conditional(request, response, db, "estudiante:cursos", clave_usuario(current_user.id), CATALOGO)
+    if sin_cambios:
+        return sin_cambios
+
     # Cursos en los que el usuario está inscrito
-    cursos = (
-        db.query(
+    cursos = (await db.execute(
+        select(
             Cursos.id,
             Cursos.titulo,
             Cursos.descripcion,
@@ -38,9 +41,8 @@ async def get_active_courses(
         )
         .join(Inscritos_Curso, Cursos.id == Inscritos_Curso.id_curso)
         .join(Usuarios, Cursos.profesor_id == Usuarios.id)
-        .filter(Inscritos_Curso.id_estudiante == current_user.id)
-        .all()
-    )
+        .where(Inscritos_Curso.id_estudiante == current_user.id)
+    )).all()
 
     if not cursos:
         return []  # Devolvemos lista vacía en vez de error
@@ -62,22 +64,22 @@ async def get_active_courses(
 
 # Obtener los detalles de un curso
 @router.get("/courses/details/{course_id}")
-async def get_course_details(course_id: int, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def get_course_details(course_id: int, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Estudiante":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
     # Obtener los detalles del curso    
-    curso = db.query(Cursos).filter(Cursos.id == course_id).first()
+    curso = await db.get(Cursos, course_id)
     if not curso:
         raise HTTPException(status_code=404, detail="Curso no encontrado")
     
     # Obtener los estudiantes inscritos si los hay
-    inscritos = db.query(Inscritos_Curso).filter(Inscritos_Curso.id_curso == course_id).all()
+    inscritos = (await db.scalars(select(Inscritos_Curso).where(Inscritos_Curso.id_curso == course_id))).all()
     if not inscritos:
         raise HTTPException(status_code=404, detail="No se encontraron estudiantes inscritos")
 
     # Obtener el profesor del curso
-    profesor = db.query(Usuarios).filter(Usuarios.id == curso.profesor_id).first()
+    profesor = await db.get(Usuarios, curso.profesor_id)
     if not profesor:
         raise HTTPException(status_code=404, detail="Profesor no encontrado")
     
@@ -85,25 +87,25 @@ async def get_course_details(course_id: int, current_user: Usuarios = Depends(ve
 
 # Inscribirse en un curso (con código de curso)
 @router.post("/courses/enroll/{course_code}")
-async def enroll_in_course(course_code: int, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def enroll_in_course(course_code: int, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Estudiante":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
     # Verificar si el estudiante ya está inscrito en el curso
-    inscripcion_existente = db.query(Inscritos_Curso).filter(
+    inscripcion_existente = await db.scalar(select(Inscritos_Curso).where(
         Inscritos_Curso.id_curso == course_code,
         Inscritos_Curso.id_estudiante == current_user.id
-    ).first()
+    ))
     if inscripcion_existente:
         raise HTTPException(status_code=400, detail="Ya estás inscrito en este curso")
 
     # Verificar si el curso existe
-    curso = db.query(Cursos).filter(Cursos.id == course_code).first()
+    curso = await db.get(Cursos, course_code)
     if not curso:
         raise HTTPException(status_code=404, detail="Curso no encontrado")
 
     # Obtener profesor dueño del curso
-    profesor_propietario = db.query(Usuarios).filter(Usuarios.id == curso.profesor_id).first()
+    profesor_propietario = await db.get(Usuarios, curso.profesor_id)
     if not profesor_propietario:
         raise HTTPException(status_code=404, detail="Profesor no encontrado")
     
@@ -122,104 +124,66 @@ async def enroll_in_course(course_code: int, current_user: Usuarios = Depends(ve
         id_curso=course_code,
         id_estudiante=current_user.id,
         estado_invitacion="Aceptada",
-        enlace_unico=enlace 
+        enlace_unico=str(enlace)
     )
     
-    db.add(nueva_inscripcion)
-    db.commit()
-
-    db.add(notificacion)
-    db.commit()
+    # Inscripción y notificación en la misma transacción
+    db.add_all([nueva_inscripcion, notificacion])
+    await bump(db, clave_usuario(current_user.id))
+    await db.commit()
 
     return {"message": "Registro exitoso. Verifique su correo si aplica."}
 
-from datetime import datetime, timedelta, timezone
-
-# Ver el calendario de conferencias
+# Ver el calendario de conferencias (por defecto la semana actual)
 @router.get("/calendar/student/{student_id}")
-async def get_calendar(student_id: int, current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_calendar(
+    student_id: int,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    current=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
     if current.role_name != "Estudiante":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    inscripciones = db.query(Inscritos_Curso).filter(
+    cursos_ids = (await db.scalars(select(Inscritos_Curso.id_curso).where(
         Inscritos_Curso.id_estudiante == student_id,
         Inscritos_Curso.estado_invitacion == "Aceptada"
-    ).all()
+    ))).all()
 
-    if not inscripciones:
+    if not cursos_ids:
         raise HTTPException(status_code=404, detail="No está inscrito en ningún curso")
 
-    # Obtener IDs de los cursos
-    cursos_ids = [i.id_curso for i in inscripciones]
+    # 🗓 Rango en UTC para comparar con BD (por defecto la semana actual)
+    start_of_week_utc, end_of_week_utc = current_week(remove_tz(utcnow()))
+    start_of_week_utc = remove_tz(desde) if desde else start_of_week_utc
+    end_of_week_utc = remove_tz(hasta) if hasta else end_of_week_utc
 
-    # 🗓 Calcular inicio y fin de la semana actual (en UTC para comparar con BD)
-    today_utc = datetime.utcnow().replace(tzinfo=None)
-    start_of_week_utc = today_utc - timedelta(days=today_utc.weekday())
-    end_of_week_utc = start_of_week_utc + timedelta(days=6)
+    # Hora actual en El Salvador (UTC-6)
+    now_el_salvador = datetime.now(TZ_EL_SALVADOR).replace(tzinfo=None)
 
-    print(f"🗓 Semana actual (UTC): {start_of_week_utc} - {end_of_week_utc}")
-    print(f"📅 Hoy (UTC): {today_utc}")
-    
-    # Buscar todas las sesiones virtuales de esos cursos
-    sesiones = db.query(Sesiones_Virtuales).filter(
-        Sesiones_Virtuales.id_curso.in_(cursos_ids),
-        Sesiones_Virtuales.hora_inicio <= end_of_week_utc,
-        Sesiones_Virtuales.hora_fin >= start_of_week_utc
-    ).order_by(Sesiones_Virtuales.hora_inicio.asc()).all()
-
-    if not sesiones:
-        return {"message": "No hay sesiones programadas"}
+    calendario = await fetch_calendar(
+        db, cursos_ids, start_of_week_utc, end_of_week_utc,
+        now=now_el_salvador, tz=TZ_EL_SALVADOR
+    )
 
-    calendario = []
-    
-    # Hora actual en El Salvador (UTC-6)
-    now_el_salvador = datetime.now(timezone(timedelta(hours=-6))).replace(tzinfo=None)
-    print(f"⏰ Hora actual en El Salvador: {now_el_salvador}")
-
-    for sesion in sesiones:
-        curso = db.query(Cursos).filter(Cursos.id == sesion.id_curso).first()
-        profesor = db.query(Usuarios).filter(Usuarios.id == curso.profesor_id).first()
-
-        # Convertir UTC a hora de El Salvador (UTC-6)
-        if sesion.hora_inicio and sesion.hora_fin:
-            # Asumir que las fechas en BD están en UTC y convertirlas a El Salvador
-            inicio_el_salvador = sesion.hora_inicio.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-6))).replace(tzinfo=None)
-            fin_el_salvador = sesion.hora_fin.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-6))).replace(tzinfo=None)
-        else:
-            inicio_el_salvador = None
-            fin_el_salvador = None
-
-        print(f"\n📋 Sesión: {sesion.titulo}")
-        print(f"   Inicio (UTC): {sesion.hora_inicio}")
-        print(f"   Fin (UTC): {sesion.hora_fin}")
-        print(f"   Inicio (El Salvador): {inicio_el_salvador}")
-        print(f"   Fin (El Salvador): {fin_el_salvador}")
-        print(f"   Ahora (El Salvador): {now_el_salvador}")
-
-        # 🕒 Determinar estado de la llamada usando hora de El Salvador
-        if fin_el_salvador and fin_el_salvador < now_el_salvador:
-            estado = "concluida"
-            print(f"   🔴 ESTADO: CONCLUIDA")
-        elif inicio_el_salvador and inicio_el_salvador <= now_el_salvador <= fin_el_salvador:
-            estado = "en_curso"
-            print(f"   🟢 ESTADO: EN CURSO")
-        else:
-            estado = "futura"
-            print(f"   🔵 ESTADO: FUTURA")
-
-        calendario.append({
-            "curso": curso.titulo,
-            "sesion": sesion.titulo,
-            "descripcion": sesion.descripcion,
-            "hora_inicio": inicio_el_salvador,  # ← Enviar hora de El Salvador al frontend
-            "hora_fin": fin_el_salvador,        # ← Enviar hora de El Salvador al frontend
-            "enlace_llamada": sesion.enlace_llamada,
-            "profesor": f"{profesor.nombre} {profesor.apellido}",
-            "estado": estado
-        })
+    if not calendario:
+        return {"message": "No hay sesiones programadas"}
 
     return {
-        "calendario": calendario, 
+        "calendario": [
+            {
+                "curso": s["curso"],
+                "sesion": s["sesion"],
+                "descripcion": s["descripcion"],
+                "hora_inicio": s["hora_inicio"],  # ← Hora de El Salvador
+                "hora_fin": s["hora_fin"],        # ← Hora de El Salvador
+                "enlace_llamada": s["enlace_llamada"],
+                "profesor": s["profesor"],
+                "estado": s["estado"]
+            }
+            for s in calendario
+        ],
         "total": len(calendario), 
         "start_week": start_of_week_utc, 
         "end_of_week": end_of_week_utc, 
@@ -228,32 +192,37 @@ async def get_calendar(student_id: int, current=Depends(verify_token), db: Sessi
 
 @router.get("/available")
 async def get_available_courses(
+    request: Request,
+    response: Response,
     current_user: Usuarios = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    sin_cambios = await conditional(request, response, db, "estudiante:disponibles", clave_usuario(current_user.id), CATALOGO)
+    if sin_cambios:
+        return sin_cambios
+
     # Obtener IDs de cursos en los que el usuario está inscrito
-    enrolled_course_ids = (
-        db.query(Inscritos_Curso.id_curso)
-        .filter(Inscritos_Curso.id_estudiante == current_user.id)
-        .all()
-    )
+    enrolled_course_ids = (await db.execute(
+        select(Inscritos_Curso.id_curso)
+        .where(Inscritos_Curso.id_estudiante == current_user.id)
+    )).all()
 
     # Convertir resultados [(1,), (2,), ...] → [1, 2, ...]
     enrolled_course_ids = [c[0] for c in enrolled_course_ids]
 
     # Consulta base: solo cursos activos
     query = (
-        db.query(Cursos, Usuarios)
+        select(Cursos, Usuarios)
         .join(Usuarios, Cursos.profesor_id == Usuarios.id)
-        .filter(Cursos.estado_curso == "Activo")
+        .where(Cursos.estado_curso == "Activo")
     )
 
     # Si el usuario tiene cursos inscritos, los excluimos
     if enrolled_course_ids:
-        query = query.filter(~Cursos.id.in_(enrolled_course_ids))
+        query = query.where(~Cursos.id.in_(enrolled_course_ids))
 
     # Ejecutar consulta
-    available_courses = query.all()
+    available_courses = (await db.execute(query)).all()
 
     # Formatear respuesta
     cursos_response = [
@@ -1,15 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from getstream import Stream
-from getstream.models import UserRequest
-from config import STREAM_API_KEY, STREAM_API_SECRET, STREAM_BASE_URL
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_db
+from services.getstream import sync_users, ensure_user_synced, get_stream_client
+from services.call_registry import call_registry
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/getstream", tags=["getstream"])
 
-client = Stream(api_key=STREAM_API_KEY, api_secret=STREAM_API_SECRET, base_url=STREAM_BASE_URL)
-
 # Modelos Pydantic
 class CreateCallRequest(BaseModel):
     user_id: str
@@ -18,10 +17,8 @@ class JoinCallRequest(BaseModel):
     user_id: str
     call_id: str
 
-active_calls = {}
-
 @router.post("/create/call")
-async def create_call(request: CreateCallRequest):
+async def create_call(request: CreateCallRequest, client=Depends(get_stream_client), db: AsyncSession = Depends(get_db)):
     try:
         user_id = request.user_id
         print(f"Creando llamada para usuario: {user_id}")
@@ -30,8 +27,9 @@ async def create_call(request: CreateCallRequest):
         user_token = client.create_token(user_id)
         print(f"Token generado por SDK: {user_token[:50]}...")
         
-        # Crear usuario en GetStream
-        client.upsert_users(UserRequest(id=user_id, name=user_id))
+        # Crear usuario en GetStream (solo si no está registrado)
+        await sync_users(client, {user_id: user_id}, db)
+        await db.commit()
 
         # Generar ID único para la llamada
         call_id = str(uuid.uuid4())
@@ -45,11 +43,7 @@ async def create_call(request: CreateCallRequest):
         })
 
         # Guardar llamada activa
-        active_calls[call_id] = {
-            "created_by": user_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "participants": [user_id]
-        }
+        await call_registry.join(call_id, user_id, created_by=user_id)
 
         return {
             "call_id": call_id,
@@ -63,7 +57,7 @@ async def create_call(request: CreateCallRequest):
         raise HTTPException(status_code=500, detail=f"Error creando llamada: {str(e)}")
 
 @router.post("/join/call")
-async def join_call(request: JoinCallRequest):
+async def join_call(request: JoinCallRequest, client=Depends(get_stream_client), db: AsyncSession = Depends(get_db)):
     try:
         user_id = request.user_id
         call_id = request.call_id
@@ -80,19 +74,12 @@ async def join_call(request: JoinCallRequest):
         # ✅ USAR EL MÉTODO OFICIAL DEL SDK PARA GENERAR TOKENS
         user_token = client.create_token(user_id)
         
-        # Crear usuario
-        client.upsert_users(UserRequest(id=user_id, name=user_id))
+        # Crear usuario ya si es nuevo; un renombre lo sincroniza el job de reconciliación
+        if await ensure_user_synced(client, user_id, user_id, db):
+            await db.commit()
 
-        # Actualizar participantes
-        if call_id in active_calls:
-            if user_id not in active_calls[call_id]["participants"]:
-                active_calls[call_id]["participants"].append(user_id)
-        else:
-            active_calls[call_id] = {
-                "created_by": "unknown",
-                "created_at": datetime.utcnow().isoformat(),
-                "participants": [user_id]
-            }
+        # Actualizar participantes (renueva el TTL de la llamada)
+        await call_registry.join(call_id, user_id)
 
         return {
             "user_id": user_id,
@@ -109,12 +96,12 @@ async def join_call(request: JoinCallRequest):
 
 @router.get("/active/calls")
 async def get_active_calls():
-    return active_calls
+    return await call_registry.list_active()
 
 @router.get("/health")
 async def health_check():
     return {
         "status": "ok", 
         "timestamp": datetime.utcnow().isoformat(),
-        "active_calls": len(active_calls)
+        **(await call_registry.stats())
     }
\ No newline at end of file
@@ -1,59 +1,141 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
 from model.models import EstadoNotificacion, Notificaciones
-from sqlalchemy.orm import Session
-from config import SessionLocal
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_db
 from services.jwt import verify_token
+from utils.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/notifications", tags=["Notificaciones"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _serializar(n: Notificaciones) -> dict:
+    return {
+        "id": n.id,
+        "usuario_id": n.usuario_id,
+        "titulo": n.titulo,
+        "mensaje": n.mensaje,
+        "tipo": n.tipo,
+        "status": n.status,
+        "hora_envio": n.hora_envio,
+    }
 
 # ------------------------------
-#  GET: Todas las notificaciones
+#  GET: Feed paginado de notificaciones
 # ------------------------------
 @router.get("/{user_id}")
-def get_notifications(
+async def get_notifications(
     user_id: int,
+    cursor: str | None = Query(None, description="next_cursor de la página anterior"),
+    since: str | None = Query(None, description="latest_cursor del último poll: solo filas nuevas, en orden ascendente"),
+    limit: int = Query(50, ge=1, le=200),
     current_user=Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Solo permitir que el usuario vea sus propias notificaciones
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    notifs = (
-        db.query(Notificaciones)
-        .filter(Notificaciones.usuario_id == user_id)
-        .order_by(Notificaciones.hora_envio.desc())
-        .all()
+    if cursor and since:
+        raise HTTPException(status_code=400, detail="Usa cursor o since, no ambos")
+
+    query = select(Notificaciones).where(Notificaciones.usuario_id == user_id)
+
+    if since:
+        # Poll delta por id: el id se asigna al insertar (justo antes del commit),
+        # mientras que hora_envio = now() es la hora de inicio de la transacción
+        # y puede quedar detrás de un cursor ya entregado. Se pagina en orden
+        # ascendente y latest_cursor es la última fila entregada, así que si
+        # llegaron más de `limit` filas el siguiente poll continúa donde quedó.
+        _, ultimo_id = decode_cursor(since, (datetime, int))
+        notifs = (await db.scalars(
+            query
+            .where(Notificaciones.id > ultimo_id)
+            .order_by(Notificaciones.id.asc())
+            .limit(limit + 1)
+        )).all()
+
+        hay_mas = len(notifs) > limit
+        notifs = notifs[:limit]
+
+        return {
+            "notificaciones": [_serializar(n) for n in notifs],
+            "next_cursor": None,
+            "latest_cursor": encode_cursor(notifs[-1].hora_envio, notifs[-1].id) if notifs else since,
+            "has_more": hay_mas,  # true: repetir el poll con el nuevo latest_cursor
+        }
+
+    # Keyset sobre (hora_envio, id), del más reciente al más antiguo
+    if cursor:
+        hora, ultimo_id = decode_cursor(cursor, (datetime, int))
+        query = query.where(or_(
+            Notificaciones.hora_envio < hora,
+            and_(Notificaciones.hora_envio == hora, Notificaciones.id < ultimo_id)
+        ))
+
+    notifs = (await db.scalars(
+        query
+        .order_by(Notificaciones.hora_envio.desc(), Notificaciones.id.desc())
+        .limit(limit + 1)
+    )).all()
+
+    hay_mas = len(notifs) > limit
+    notifs = notifs[:limit]
+
+    # El delta se apoya en el id más alto de la primera página (no en la fila
+    # más reciente por hora, que puede no ser la de mayor id)
+    ultima = max(notifs, key=lambda n: n.id) if notifs and not cursor else None
+
+    return {
+        "notificaciones": [_serializar(n) for n in notifs],
+        "next_cursor": encode_cursor(notifs[-1].hora_envio, notifs[-1].id) if hay_mas else None,
+        "latest_cursor": encode_cursor(ultima.hora_envio, ultima.id) if ultima else None,
+        "has_more": hay_mas,
+    }
+
+
+# ------------------------------
+#  GET: Contador de no leídas
+# ------------------------------
+@router.get("/{user_id}/unread_count")
+async def get_unread_count(
+    user_id: int,
+    current_user=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
+    if current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+    total = await db.scalar(
+        select(func.count())
+        .select_from(Notificaciones)
+        .where(
+            Notificaciones.usuario_id == user_id,
+            Notificaciones.status == EstadoNotificacion.PENDIENTE
+        )
     )
 
-    return {"notificaciones": notifs}
+    return {"unread": total}
 
 
 # -----------------------------------
 #  PUT: Marcar TODAS como leídas
 # -----------------------------------
 @router.put("/{user_id}/mark_all_read")
-def mark_all_read(
+async def mark_all_read(
     user_id: int,
     current_user=Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="No autorizado")
 
-    db.query(Notificaciones).filter(
+    await db.execute(update(Notificaciones).where(
         Notificaciones.usuario_id == user_id,
         Notificaciones.status == EstadoNotificacion.PENDIENTE
-    ).update({Notificaciones.status: EstadoNotificacion.LEIDO})
+    ).values(status=EstadoNotificacion.LEIDO))
 
-    db.commit()
+    await db.commit()
 
     return {"message": "Todas las notificaciones fueron marcadas como leídas"}
 
@@ -62,12 +144,12 @@ def mark_all_read(
 #  PUT: Marcar UNA notificación como leída
 # -----------------------------------
 @router.put("/{notif_id}/read")
-def mark_one_as_read(
+async def mark_one_as_read(
     notif_id: int,
     current_user=Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    notif = db.query(Notificaciones).filter(Notificaciones.id == notif_id).first()
+    notif = await db.get(Notificaciones, notif_id)
 
     if not notif:
         raise HTTPException(status_code=404, detail="Notificación no encontrada")
@@ -76,6 +158,6 @@ def mark_one_as_read(
         raise HTTPException(status_code=403, detail="No autorizado")
 
     notif.status = EstadoNotificacion.LEIDO
-    db.commit()
+    await db.commit()
 
     return {"message": "Notificación marcada como leída"}
@@ -1,44 +1,48 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.email import send_email
+from services.jwt import verify_token, verify_token_ws
+from services.notification_hub import hub
 from model.models import Usuarios, Notificaciones, TipoNotificacion, EstadoNotificacion
-from typing import Dict
-from config import SessionLocal
+from config import get_db
+import jwt
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
-active_connections: Dict[int, WebSocket] = {}
 
-def get_db():
-    db = SessionLocal()
+@router.websocket("/ws/notifications/{user_id}")
+async def websocket_notifications(websocket: WebSocket, user_id: int, token: str = Query(None)):
+    """Conecta un socket del usuario a su canal de notificaciones (?token=<JWT>)."""
     try:
-        yield db
-    finally:
-        db.close()
+        user = verify_token_ws(token)
+    except jwt.PyJWTError:
+        await websocket.close(code=1008)
+        return
 
-@router.websocket("/ws/notifications/{user_id}")
-async def websocket_notifications(websocket: WebSocket, user_id: int):
-    """Conecta a un usuario a su canal de notificaciones."""
-    await websocket.accept()
-    active_connections[user_id] = websocket
+    if str(user.id) != str(user_id):
+        await websocket.close(code=1008)
+        return
+
+    conn = await hub.connect(user_id, websocket)
     try:
         while True:
             await websocket.receive_text()  # mantener la conexión viva
     except WebSocketDisconnect:
-        del active_connections[user_id]
         print(f"🔌 Usuario {user_id} desconectado")
+    finally:
+        await hub.disconnect(conn)
         
-def notify_user_ws(user_id: int, title: str, message: str):
-    """Envía un mensaje en tiempo real al usuario si está conectado."""
-    import json, asyncio
-    if user_id in active_connections:
-        data = json.dumps({"title": title, "message": message})
-        asyncio.create_task(active_connections[user_id].send_text(data))
+async def notify_user_ws(user_id: int, title: str, message: str):
+    """Publica un mensaje en tiempo real para todos los sockets del usuario."""
+    await hub.publish(user_id, {"title": title, "message": message})
         
 # Ejemplo de uso para el endpoint
 @router.post("/{user_id}")
-def create_notification(user_id: int, titulo: str, mensaje: str, db: Session = Depends(get_db)):
+async def create_notification(user_id: int, titulo: str, mensaje: str, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     """Crea una notificación, la guarda, la envía por WS y por email."""
-    user = db.query(Usuarios).filter(Usuarios.id == user_id).first()
+    if current.role_name != "Administrador":
+        raise HTTPException(status_code=403, detail="Acceso denegado")
+
+    user = await db.get(Usuarios, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
@@ -50,20 +54,20 @@ def create_notification(user_id: int, titulo: str, mensaje: str, db: Session = D
         status=EstadoNotificacion.PENDIENTE
     )
     db.add(notif)
-    db.commit()
-    db.refresh(notif)
+    await db.commit()
+    await db.refresh(notif)
 
     # --- Enviar correo ---
     try:
-        send_email(user.email, titulo, mensaje)
+        await send_email(user.email, titulo, mensaje)
         notif.tipo = TipoNotificacion.EMAIL
         notif.status = EstadoNotificacion.ENVIADO
-        db.commit()
+        await db.commit()
     except Exception as e:
         print("⚠️ Error enviando correo:", e)
 
     # --- Enviar en tiempo real (WebSocket) ---
-    notify_user_ws(user_id, titulo, mensaje)
+    await notify_user_ws(user_id, titulo, mensaje)
 
     return {"message": "Notificación enviada", "data": {
         "titulo": titulo,
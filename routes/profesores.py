@@ -1,62 +1,68 @@
 from datetime import datetime, timedelta, timezone
-from config import SessionLocal
+from config import get_db
 from model.models import Cursos, RoleLlamada, Usuarios, Sesiones_Virtuales, Participantes_Sesion_V
 from schemas.s_cursos import CursoCreate 
 from services.jwt import verify_token
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from utils.time import remove_tz, now_naive
+from services.calendario import fetch_calendar, current_week, session_state, participant_counts
+from services.versiones import CATALOGO, bump, clave_usuario, conditional
 
 router = APIRouter(tags=["Profesor"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Obtener los cursos de un profesor (activos e inactivos)
 @router.get("/courses/active/")
-async def get_active_courses(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_active_courses(request: Request, response: Response, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    return db.query(Cursos).filter(Cursos.profesor_id == current.id).all()
+    # 304 sin consultar los cursos si el cliente ya tiene esta versión
+    sin_cambios = await conditional(request, response, db, "profesor:cursos", clave_usuario(current.id))
+    if sin_cambios:
+        return sin_cambios
+
+    return (await db.scalars(select(Cursos).where(Cursos.profesor_id == current.id))).all()
 
 @router.get("/courses/active/only")
-async def get_only_active_courses(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_only_active_courses(request: Request, response: Response, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    return db.query(Cursos).filter(
+    sin_cambios = await conditional(request, response, db, "profesor:cursos:activos", clave_usuario(current.id))
+    if sin_cambios:
+        return sin_cambios
+
+    return (await db.scalars(select(Cursos).where(
         (Cursos.profesor_id == current.id) &
         (Cursos.estado_curso == "Activo")
-    ).all()
+    ))).all()
 
 # Obtener la cantidad de cursos activos de 1 profesor
 @router.get("/courses/active/number")
-async def get_active_courses_number(current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_active_courses_number(current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    courses_count = db.query(Cursos).filter(Cursos.profesor_id == current.id).all()
+    courses_count = await db.scalar(select(func.count()).select_from(Cursos).where(Cursos.profesor_id == current.id))
 
-    return len(courses_count)
+    return courses_count
 
 # Crear curso
 @router.post("/create/course")
-async def create_course(course: CursoCreate, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def create_course(course: CursoCreate, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="No tienes los permisos requeridos")
 
-    existing_course = db.query(Cursos).filter(
+    existing_course = await db.scalar(select(Cursos).where(
         (Cursos.profesor_id == current_user.id) & (Cursos.titulo == course.titulo)
-    ).first()
+    ))
     if existing_course:
         raise HTTPException(status_code=400, detail="No se puede repetir nombre de curso")
 
-    cursos_count = db.query(Cursos).filter(Cursos.profesor_id == current_user.id).count()
+    cursos_count = await db.scalar(select(func.count()).select_from(Cursos).where(Cursos.profesor_id == current_user.id))
     
     if cursos_count >= current_user.max_cursos:
         raise HTTPException(
@@ -70,8 +76,10 @@ async def create_course(course: CursoCreate, current_user: Usuarios = Depends(ve
         profesor_id=current_user.id,
     )
     db.add(new_course)
-    db.commit()
-    db.refresh(new_course)  # 👈 Esto actualiza el objeto con los datos reales en DB
+    # Invalida los ETag de las listas del profesor y del catálogo
+    await bump(db, clave_usuario(current_user.id), CATALOGO)
+    await db.commit()
+    await db.refresh(new_course)  # 👈 Esto actualiza el objeto con los datos reales en DB
 
     return {
         "message": "Curso creado exitosamente",
@@ -87,67 +95,75 @@ async def create_course(course: CursoCreate, current_user: Usuarios = Depends(ve
 
 # Desactivar curso
 @router.put("/deactivate/course/{course_id}")
-async def deactivate_course(course_id: int, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def deactivate_course(course_id: int, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
-    course = db.query(Cursos).filter(Cursos.id == course_id).first()
+    course = await db.get(Cursos, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Curso no encontrado")
     
     course.estado_curso = "Inactivo"
-    db.commit()
+    await bump(db, clave_usuario(course.profesor_id), CATALOGO)
+    await db.commit()
     
     return {"message": "Curso desactivado exitosamente"}
 
 # Activar curso
 @router.put("/activate/course/{course_id}")
-async def activate_course(course_id: int, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def activate_course(course_id: int, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
-    course = db.query(Cursos).filter(Cursos.id == course_id).first()
+    course = await db.get(Cursos, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Curso no encontrado")
     
     course.estado_curso = "Activo"
-    db.commit()
+    await bump(db, clave_usuario(course.profesor_id), CATALOGO)
+    await db.commit()
     
     return {"message": "Curso Activado exitosamente"}
 
 # Participantes de la llamada
 @router.get("/participants/call/{sesion_id}")
-async def participant_call(sesion_id: int, current_user: Usuarios = Depends(verify_token), db: Session = Depends(get_db)):
+async def participant_call(sesion_id: int, current_user: Usuarios = Depends(verify_token), db: AsyncSession = Depends(get_db)):
     if current_user.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
     
-    participantes = (
-        db.query(Participantes_Sesion_V)
-        .filter(
+    participantes = (await db.execute(
+        select(Usuarios.id, Usuarios.nombre, Usuarios.apellido, Usuarios.email)
+        .join(Participantes_Sesion_V, Participantes_Sesion_V.id_usuario == Usuarios.id)
+        .where(
             Participantes_Sesion_V.id_sesion == sesion_id,
             Participantes_Sesion_V.role_llamada != RoleLlamada.HOST
         )
-        .all()
-    )
+        .order_by(Participantes_Sesion_V.id)
+    )).all()
 
     if not participantes:
         return {"message": "No hay participantes registrados (excepto el HOST) en esta sesión"}
 
-    resultado = []
-    for p in participantes:
-        usuario = db.query(Usuarios).filter(Usuarios.id == p.id_usuario).first()
-        if usuario:
-            resultado.append({
-                "id_usuario": usuario.id,
-                "nombre": f"{usuario.nombre} {usuario.apellido}",
-                "email": usuario.email
-            })
+    resultado = [
+        {
+            "id_usuario": p.id,
+            "nombre": f"{p.nombre} {p.apellido}",
+            "email": p.email
+        }
+        for p in participantes
+    ]
     
     return {"participantes": resultado}
 
-# Calendario de conferencias
+# Calendario de conferencias (por defecto la semana actual)
 @router.get("/calendar/{professor_id}")
-async def get_calendar(professor_id: int, current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_calendar(
+    professor_id: int,
+    desde: datetime | None = None,
+    hasta: datetime | None = None,
+    current=Depends(verify_token),
+    db: AsyncSession = Depends(get_db)
+):
     if current.role_name != "Profesor":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
@@ -156,75 +172,51 @@ async def get_calendar(professor_id: int, current=Depends(verify_token), db: Ses
         raise HTTPException(status_code=403, detail="No puedes ver el calendario de otro profesor")
 
     # Obtener los cursos dictados por el profesor
-    cursos = db.query(Cursos).filter(Cursos.profesor_id == professor_id).all()
-    if not cursos:
+    cursos_ids = (await db.scalars(select(Cursos.id).where(Cursos.profesor_id == professor_id))).all()
+    if not cursos_ids:
         raise HTTPException(status_code=404, detail="No tienes cursos asignados")
 
-    cursos_ids = [c.id for c in cursos]
-
-    # 🗓 Calcular el rango de la semana actual (lunes a domingo)
-    today = datetime.now().replace(tzinfo=None)
-    start_of_week = today - timedelta(days=today.weekday())  # lunes
-    end_of_week = start_of_week + timedelta(days=6)          # domingo
+    # 🗓 Rango de fechas sin timezone (por defecto lunes a domingo de esta semana)
+    today = now_naive()
+    start_of_week, end_of_week = current_week(today)
+    start_of_week = remove_tz(desde) if desde else start_of_week
+    end_of_week = remove_tz(hasta) if hasta else end_of_week
 
-    # Buscar sesiones usando fechas sin timezone
-    sesiones = db.query(Sesiones_Virtuales).filter(
-        Sesiones_Virtuales.id_curso.in_(cursos_ids),
-        Sesiones_Virtuales.hora_inicio <= end_of_week,    # ← Usar fechas sin timezone
-        Sesiones_Virtuales.hora_fin >= start_of_week      # ← Usar fechas sin timezone
-    ).order_by(Sesiones_Virtuales.hora_inicio.asc()).all()
+    calendario = await fetch_calendar(
+        db, cursos_ids, start_of_week, end_of_week,
+        now=today, with_participants=True
+    )
 
-    if not sesiones:
+    if not calendario:
         return {"message": "No hay sesiones programadas"}
 
-    calendario = []
-    
-    now = now_naive()
-
-    for sesion in sesiones:
-        # Contar participantes (si existen)
-        participantes_count = db.query(Participantes_Sesion_V).filter(
-            (Participantes_Sesion_V.id_sesion == sesion.id_sesion) &
-            (Participantes_Sesion_V.role_llamada == RoleLlamada.PARTICIPANTE)
-        ).count()
-
-        # Buscar título del curso
-        curso = db.query(Cursos).filter(Cursos.id == sesion.id_curso).first()
-
-        # 🕒 Determinar estado de la sesión
-        if sesion.hora_fin < now:
-            estado = "concluida"
-        elif sesion.hora_inicio <= now <= sesion.hora_fin:
-            estado = "en_curso"
-        else:
-            estado = "futura"
-            
-        calendario.append({
-            "curso": curso.titulo,
-            "sesion": sesion.titulo,
-            "descripcion": sesion.descripcion,
-            "hora_inicio": remove_tz(sesion.hora_inicio),
-            "hora_fin": remove_tz(sesion.hora_fin),
-            "enlace_llamada": sesion.enlace_llamada,
-            "calidad_video": sesion.calidad_video.value if sesion.calidad_video else None,
-            "participantes": participantes_count,
-            "sesion_id": sesion.id_sesion,
-            "estado": estado
-        })
-
     return {
         "profesor": current.nombre, 
         "total_sesiones": len(calendario), 
-        "calendario": calendario, 
+        "calendario": [
+            {
+                "curso": s["curso"],
+                "sesion": s["sesion"],
+                "descripcion": s["descripcion"],
+                "hora_inicio": s["hora_inicio"],
+                "hora_fin": s["hora_fin"],
+                "enlace_llamada": s["enlace_llamada"],
+                "calidad_video": s["calidad_video"],
+                "participantes": s["participantes"],
+                "sesion_id": s["sesion_id"],
+                "estado": s["estado"]
+            }
+            for s in calendario
+        ], 
         "start_week": start_of_week, 
         "end_of_week": end_of_week,
         "now": today  # ← Ya sin UTC
     }
 
 @router.get("/courses/{course_id}/sessions")
-async def get_course_sessions(course_id: int, current=Depends(verify_token), db: Session = Depends(get_db)):
+async def get_course_sessions(course_id: int, current=Depends(verify_token), db: AsyncSession = Depends(get_db)):
     # Validar si el curso existe
-    curso = db.query(Cursos).filter(Cursos.id == course_id).first()
+    curso = await db.scalar(select(Cursos).where(Cursos.id == course_id).options(selectinload(Cursos.profesor)))
     if not curso:
         raise HTTPException(status_code=404, detail="Curso no encontrado")
 
@@ -234,17 +226,17 @@ async def get_course_sessions(course_id: int, current=Depends(verify_token), db:
 
     # Si es estudiante, verificar que esté inscrito
     if current.role_name == "Estudiante":
-        inscripcion = db.query(Cursos).join(Cursos.inscritos).filter(
+        inscripcion = await db.scalar(select(Cursos).join(Cursos.inscritos).where(
             Cursos.id == course_id,
             Cursos.inscritos.any(id_estudiante=current.id)
-        ).first()
+        ))
         if not inscripcion:
             raise HTTPException(status_code=403, detail="No estás inscrito en este curso")
 
     # Obtener todas las sesiones del curso
-    sesiones = db.query(Sesiones_Virtuales).filter(
+    sesiones = (await db.scalars(select(Sesiones_Virtuales).where(
         Sesiones_Virtuales.id_curso == course_id
-    ).order_by(Sesiones_Virtuales.hora_inicio.asc()).all()
+    ).order_by(Sesiones_Virtuales.hora_inicio.asc()))).all()
 
     if not sesiones:
         return {"message": "No hay sesiones programadas para este curso"}
@@ -252,20 +244,12 @@ async def get_course_sessions(course_id: int, current=Depends(verify_token), db:
     now = now_naive()
     sesiones_data = []
 
+    # Contar participantes (solo PARTICIPANTES, no HOST) de todas las sesiones en una consulta
+    conteos = await participant_counts(db, [s.id_sesion for s in sesiones])
+
     for sesion in sesiones:
         # Calcular estado actual
-        if sesion.hora_fin and sesion.hora_fin < now:
-            estado = "concluida"
-        elif sesion.hora_inicio <= now <= sesion.hora_fin:
-            estado = "en_curso"
-        else:
-            estado = "futura"
-
-        # Contar participantes (solo PARTICIPANTES, no HOST)
-        participantes_count = db.query(Participantes_Sesion_V).filter(
-            (Participantes_Sesion_V.id_sesion == sesion.id_sesion) &
-            (Participantes_Sesion_V.role_llamada == RoleLlamada.PARTICIPANTE)
-        ).count()
+        estado = session_state(sesion.hora_inicio, sesion.hora_fin, now)
 
         sesiones_data.append({
             "sesion_id": sesion.id_sesion,
@@ -276,7 +260,7 @@ async def get_course_sessions(course_id: int, current=Depends(verify_token), db:
             "enlace_llamada": sesion.enlace_llamada,
             "calidad_video": sesion.calidad_video.value if sesion.calidad_video else None,
             "estado": estado,
-            "participantes": participantes_count
+            "participantes": conteos.get(sesion.id_sesion, 0)
         })
 
     return {
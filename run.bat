@@ -4,5 +4,7 @@ env/scripts/activate
 
 # instalar dependencias
 pip install -r requirements.txt
+# crear tablas, índices y seeds (idempotente)
+python bootstrap.py
 # ejecutar la aplicación
 uvicorn main:app --reload
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from model.models import Cursos, Usuarios, Sesiones_Virtuales, Participantes_Sesion_V, RoleLlamada
+from utils.time import remove_tz
+
+# Zona horaria de El Salvador (UTC-6), usada por el calendario del estudiante
+TZ_EL_SALVADOR = timezone(timedelta(hours=-6))
+
+def current_week(now: datetime) -> tuple[datetime, datetime]:
+    """Rango [lunes 00:00, lunes siguiente 00:00) de la semana de `now`."""
+    start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=7)
+
+def session_state(inicio: datetime | None, fin: datetime | None, now: datetime) -> str:
+    if fin and fin < now:
+        return "concluida"
+    if inicio and fin and inicio <= now <= fin:
+        return "en_curso"
+    return "futura"
+
+def _to_tz(dt: datetime | None, tz) -> datetime | None:
+    """Convierte un datetime UTC naive de la BD a la zona `tz` (naive)."""
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+async def participant_counts(db: AsyncSession, sesion_ids: list[int]) -> dict[int, int]:
+    """Participantes (sin HOST) por sesión en una sola consulta agrupada."""
+    if not sesion_ids:
+        return {}
+    rows = await db.execute(
+        select(Participantes_Sesion_V.id_sesion, func.count())
+        .where(
+            Participantes_Sesion_V.id_sesion.in_(sesion_ids),
+            Participantes_Sesion_V.role_llamada == RoleLlamada.PARTICIPANTE
+        )
+        .group_by(Participantes_Sesion_V.id_sesion)
+    )
+    return {id_sesion: total for id_sesion, total in rows.all()}
+
+async def fetch_calendar(
+    db: AsyncSession,
+    cursos_ids: list[int],
+    start: datetime,
+    end: datetime,
+    now: datetime,
+    tz=None,
+    with_participants: bool = False,
+) -> list[dict]:
+    """Sesiones de `cursos_ids` que se cruzan con [start, end).
+
+    Trae sesión, título del curso y nombre del profesor en una consulta y,
+    si se pide, los conteos de participantes en otra. Si se pasa `tz`, las
+    horas (UTC en BD) se devuelven en esa zona y `now` debe estar en ella.
+    """
+    if not cursos_ids:
+        return []
+
+    rows = (await db.execute(
+        select(
+            Sesiones_Virtuales,
+            Cursos.titulo.label("curso_titulo"),
+            Usuarios.nombre.label("profesor_nombre"),
+            Usuarios.apellido.label("profesor_apellido"),
+        )
+        .join(Cursos, Sesiones_Virtuales.id_curso == Cursos.id)
+        .join(Usuarios, Cursos.profesor_id == Usuarios.id)
+        .where(
+            Sesiones_Virtuales.id_curso.in_(cursos_ids),
+            Sesiones_Virtuales.hora_inicio < end,
+            Sesiones_Virtuales.hora_fin >= start
+        )
+        .order_by(Sesiones_Virtuales.hora_inicio.asc())
+    )).all()
+
+    conteos = await participant_counts(db, [r.Sesiones_Virtuales.id_sesion for r in rows]) if with_participants else {}
+
+    calendario = []
+    for r in rows:
+        sesion = r.Sesiones_Virtuales
+        if tz is not None:
+            inicio, fin = _to_tz(sesion.hora_inicio, tz), _to_tz(sesion.hora_fin, tz)
+        else:
+            inicio, fin = remove_tz(sesion.hora_inicio), remove_tz(sesion.hora_fin)
+
+        calendario.append({
+            "sesion_id": sesion.id_sesion,
+            "curso": r.curso_titulo,
+            "sesion": sesion.titulo,
+            "descripcion": sesion.descripcion,
+            "hora_inicio": inicio,
+            "hora_fin": fin,
+            "enlace_llamada": sesion.enlace_llamada,
+            "calidad_video": sesion.calidad_video.value if sesion.calidad_video else None,
+            "profesor": f"{r.profesor_nombre} {r.profesor_apellido}",
+            "participantes": conteos.get(sesion.id_sesion, 0),
+            "estado": session_state(inicio, fin, now),
+        })
+
+    return calendario
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from config import AsyncSessionLocal, CALL_REGISTRY_BACKEND, CALL_REGISTRY_TTL
+from model.models import GetStreamCall, GetStreamCallParticipant
+from utils.bulk import dialect_insert
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+class MemoryCallBackend:
+    """Registro en memoria del proceso (un solo worker de uvicorn).
+
+    El OrderedDict se mantiene ordenado por expiración: con TTL fijo, cada
+    unión mueve la llamada al final, así que las vencidas siempre quedan al
+    inicio y se desalojan en O(1) amortizado. Los contadores se actualizan
+    en cada cambio para que stats() no recorra el registro.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = timedelta(seconds=ttl)
+        self.calls: OrderedDict[str, dict] = OrderedDict()
+        self.total_participants = 0
+
+    def _evict(self, now: datetime):
+        while self.calls:
+            call_id, entry = next(iter(self.calls.items()))
+            if entry["expires_at"] > now:
+                break
+            self.calls.popitem(last=False)
+            self.total_participants -= len(entry["participants"])
+
+    async def join(self, call_id: str, user_id: str, created_by: str | None = None):
+        now = _now()
+        self._evict(now)
+        entry = self.calls.get(call_id)
+        if entry is None:
+            entry = self.calls[call_id] = {
+                "created_by": created_by or "unknown",
+                "created_at": now,
+                "participants": set(),
+            }
+        else:
+            self.calls.move_to_end(call_id)
+        entry["expires_at"] = now + self.ttl
+        if user_id not in entry["participants"]:
+            entry["participants"].add(user_id)
+            self.total_participants += 1
+
+    async def list_active(self) -> dict:
+        self._evict(_now())
+        return {
+            call_id: {
+                "created_by": e["created_by"],
+                "created_at": e["created_at"].isoformat(),
+                "participants": sorted(e["participants"]),
+            }
+            for call_id, e in self.calls.items()
+        }
+
+    async def stats(self) -> dict:
+        self._evict(_now())
+        return {"active_calls": len(self.calls), "participants": self.total_participants}
+
+
+class DBCallBackend:
+    """Registro en la BD: compartido entre workers y persistente a reinicios.
+
+    Las llamadas vencidas se borran en cada escritura (índice en expires_at);
+    los participantes se van con ellas por ON DELETE CASCADE.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = timedelta(seconds=ttl)
+
+    async def _evict(self, db, now: datetime):
+        vencidas = select(GetStreamCall.call_id).where(GetStreamCall.expires_at <= now)
+        # Borrado explícito de participantes por si la BD no aplica CASCADE (SQLite)
+        await db.execute(delete(GetStreamCallParticipant).where(GetStreamCallParticipant.call_id.in_(vencidas)))
+        await db.execute(delete(GetStreamCall).where(GetStreamCall.expires_at <= now))
+
+    async def join(self, call_id: str, user_id: str, created_by: str | None = None):
+        now = _now()
+        async with AsyncSessionLocal() as db:
+            await self._evict(db, now)
+            insert = dialect_insert(db)
+            # Crea la llamada o renueva su TTL en una sola sentencia: si otro
+            # worker la registró al mismo tiempo no hay IntegrityError que
+            # descarte al participante ni la renovación
+            llamada = insert(GetStreamCall).values(
+                call_id=call_id,
+                created_by=created_by or "unknown",
+                created_at=now,
+                expires_at=now + self.ttl,
+            )
+            await db.execute(llamada.on_conflict_do_update(
+                index_elements=[GetStreamCall.call_id],
+                set_={"expires_at": llamada.excluded.expires_at},
+            ))
+            await db.execute(
+                insert(GetStreamCallParticipant)
+                .values(call_id=call_id, user_id=user_id)
+                .on_conflict_do_nothing()
+            )
+            await db.commit()
+
+    async def list_active(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(GetStreamCall, GetStreamCallParticipant.user_id)
+                .outerjoin(GetStreamCallParticipant, GetStreamCallParticipant.call_id == GetStreamCall.call_id)
+                .where(GetStreamCall.expires_at > _now())
+                .order_by(GetStreamCall.expires_at, GetStreamCallParticipant.user_id)
+            )).all()
+
+        calls = {}
+        for call, user_id in rows:
+            entry = calls.setdefault(call.call_id, {
+                "created_by": call.created_by,
+                "created_at": call.created_at.isoformat(),
+                "participants": [],
+            })
+            if user_id is not None:
+                entry["participants"].append(user_id)
+        return calls
+
+    async def stats(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            now = _now()
+            llamadas = await db.scalar(
+                select(func.count()).select_from(GetStreamCall).where(GetStreamCall.expires_at > now)
+            )
+            participantes = await db.scalar(
+                select(func.count())
+                .select_from(GetStreamCallParticipant)
+                .join(GetStreamCall, GetStreamCall.call_id == GetStreamCallParticipant.call_id)
+                .where(GetStreamCall.expires_at > now)
+            )
+        return {"active_calls": llamadas, "participants": participantes}
+
+
+def build_registry(backend: str = CALL_REGISTRY_BACKEND, ttl: int = CALL_REGISTRY_TTL):
+    if backend == "db":
+        return DBCallBackend(ttl)
+    return MemoryCallBackend(ttl)
+
+
+call_registry = build_registry()
@@ -1,10 +1,13 @@
 import bcrypt
 import os
 import base64
+from functools import lru_cache
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from dotenv import load_dotenv
+from config import BCRYPT_ROUNDS
 
 load_dotenv()
 CYPHER_SECURE_KEY = os.environ.get("CYPHER_SECURE_KEY", None)
@@ -12,15 +15,22 @@ CYPHER_SECURE_KEY = os.environ.get("CYPHER_SECURE_KEY", None)
 # ==========================
 # 🔐 Funciones para contraseñas con bcrypt
 # ==========================
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
     """Genera un hash seguro de la contraseña usando bcrypt."""
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds)
     return bcrypt.hashpw(password.encode(), salt).decode()
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """Verifica si la contraseña ingresada coincide con el hash almacenado."""
     return bcrypt.checkpw(password.encode(), hashed_password.encode())
 
+def bcrypt_cost(hashed_password: str) -> int:
+    """Extrae el costo (rounds) de un hash bcrypt: $2b$<costo>$..."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError, AttributeError):
+        return 0
+
 # ==========================
 # 🔒 Funciones para cifrado de datos sensibles con AES (Opcional)
 # ==========================
@@ -34,22 +44,46 @@ def derive_key(secret: str, salt: bytes) -> bytes:
     )
     return kdf.derive(secret.encode())
 
+# Formato v2: "v2:" + base64(salt + nonce + texto cifrado). La clave maestra se
+# deriva con PBKDF2 una sola vez por proceso y cada mensaje usa una subclave
+# HKDF barata con su salt aleatorio. Los blobs sin prefijo son del formato v1.
+AES_V2_PREFIX = "v2:"
+AES_V2_INFO = b"smartweb-aes-gcm-v2"
+AES_MASTER_SALT = os.environ.get("CYPHER_MASTER_SALT", "smartweb-aes-master").encode()
+
+@lru_cache(maxsize=1)
+def _master_key() -> bytes:
+    """Clave maestra derivada una vez por proceso (PBKDF2, 100k iteraciones)."""
+    return derive_key(CYPHER_SECURE_KEY, AES_MASTER_SALT)
+
+def _subkey(salt: bytes) -> bytes:
+    """Subclave por mensaje derivada de la clave maestra con HKDF-SHA256."""
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=AES_V2_INFO)
+    return hkdf.derive(_master_key())
+
 def encrypt_method_AES(message: str) -> str:
-    """Cifra un mensaje con AES-GCM y devuelve una cadena base64 con salt, nonce y texto cifrado."""
+    """Cifra un mensaje con AES-GCM y devuelve el blob en formato v2."""
     salt = os.urandom(16)  # Generar un salt aleatorio
-    key = derive_key(CYPHER_SECURE_KEY, salt)
-    
-    aesgcm = AESGCM(key)
     nonce = os.urandom(12)  # Generar un nonce aleatorio
-    
-    encrypted_message = aesgcm.encrypt(nonce, message.encode(), None)
-    
+
+    aesgcm = AESGCM(_subkey(salt))
+    encrypted_message = aesgcm.encrypt(nonce, message.encode(), AES_V2_PREFIX.encode())
+
     # Concatenar salt, nonce y mensaje cifrado
-    encrypted_data = base64.b64encode(salt + nonce + encrypted_message).decode()
-    return encrypted_data 
+    return AES_V2_PREFIX + base64.b64encode(salt + nonce + encrypted_message).decode()
 
 def decrypt_method_AES(encrypted_data: str) -> str:
-    """Descifra un mensaje cifrado con AES-GCM en base64."""
+    """Descifra un blob AES-GCM en formato v2 o en el formato original (v1)."""
+    if encrypted_data.startswith(AES_V2_PREFIX):
+        data = base64.b64decode(encrypted_data[len(AES_V2_PREFIX):])
+        salt, nonce, ciphertext = data[:16], data[16:28], data[28:]
+        aesgcm = AESGCM(_subkey(salt))
+        return aesgcm.decrypt(nonce, ciphertext, AES_V2_PREFIX.encode()).decode()
+
+    return _decrypt_v1(encrypted_data)
+
+def _decrypt_v1(encrypted_data: str) -> str:
+    """Formato original: PBKDF2 completo por mensaje, sin prefijo de versión."""
     data = base64.b64decode(encrypted_data)
     
     salt = data[:16]  # Extraer el salt
@@ -61,3 +95,11 @@ def decrypt_method_AES(encrypted_data: str) -> str:
     
     decrypted_message = aesgcm.decrypt(nonce, ciphertext, None)
     return decrypted_message.decode()
+
+def encrypt_many(messages: list[str]) -> list[str]:
+    """Cifra varios mensajes reutilizando la clave maestra del proceso."""
+    return [encrypt_method_AES(m) for m in messages]
+
+def decrypt_many(encrypted: list[str]) -> list[str]:
+    """Descifra varios blobs (v1 o v2) conservando el orden de entrada."""
+    return [decrypt_method_AES(e) for e in encrypted]
@@ -0,0 +1,128 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Límites (ms) de los buckets del histograma de espera por conexión
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class PoolMetrics:
+    """Contadores del pool de conexiones alimentados por eventos de SQLAlchemy."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)  # último bucket = +Inf
+        self.wait_count = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.connect_count = 0
+        self.connect_total_ms = 0.0
+        self.connect_max_ms = 0.0
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def observe_wait(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.buckets[bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+            self.wait_count += 1
+            self.wait_total_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+
+    def observe_connect(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.connect_count += 1
+            self.connect_total_ms += ms
+            self.connect_max_ms = max(self.connect_max_ms, ms)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            histograma = {f"le_{limite}ms": n for limite, n in zip(WAIT_BUCKETS_MS, self.buckets)}
+            histograma["le_inf"] = self.buckets[-1]
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait": {
+                    "count": self.wait_count,
+                    "avg_ms": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                    "max_ms": round(self.wait_max_ms, 3),
+                    "histogram": histograma,
+                },
+                # Apertura de conexiones nuevas dentro del checkout (no cuenta como espera)
+                "connect_time": {
+                    "count": self.connect_count,
+                    "avg_ms": round(self.connect_total_ms / self.connect_count, 3) if self.connect_count else 0.0,
+                    "max_ms": round(self.connect_max_ms, 3),
+                },
+            }
+
+        data["pool"] = {"class": type(pool).__name__, "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            data["pool"].update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+    def attach(self, pool):
+        """Registra los listeners de eventos del pool."""
+        from sqlalchemy import event
+
+        @event.listens_for(pool, "connect")
+        def _on_connect(dbapi_conn, record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(pool, "checkout")
+        def _on_checkout(dbapi_conn, record, proxy):
+            with self._lock:
+                self.checkouts += 1
+
+        @event.listens_for(pool, "checkin")
+        def _on_checkin(dbapi_conn, record):
+            with self._lock:
+                self.checkins += 1
+
+        @event.listens_for(pool, "invalidate")
+        def _on_invalidate(dbapi_conn, record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Pool async que mide cuánto espera cada checkout por una conexión libre.
+
+    SQLAlchemy no emite un evento antes del checkout, así que el tiempo de
+    espera se toma alrededor de _do_get. Si el checkout abre una conexión
+    nueva, ese tiempo se reporta aparte (connect_time) y se descuenta de la
+    espera: un pool frío no es un pool saturado.
+    """
+
+    def _create_connection(self):
+        inicio = time.perf_counter()
+        record = super()._create_connection()
+        record._connect_s = time.perf_counter() - inicio
+        pool_metrics.observe_connect(record._connect_s)
+        return record
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        record = None
+        try:
+            record = super()._do_get()
+            return record
+        finally:
+            # Solo el checkout que abrió la conexión descuenta su apertura
+            connect = record.__dict__.pop("_connect_s", 0.0) if record is not None else 0.0
+            pool_metrics.observe_wait(max(time.perf_counter() - inicio - connect, 0.0))
@@ -1,12 +1,38 @@
+import asyncio
 import httpx
-from config import BREVO_API_KEY, BREVO_SENDER_EMAIL, BREVO_SENDER_NAME
+from config import (
+    BREVO_API_KEY,
+    BREVO_SENDER_EMAIL,
+    BREVO_SENDER_NAME,
+    BREVO_API_URL,
+    EMAIL_HTTP_TIMEOUT,
+    BREVO_BATCH_SIZE,
+    BREVO_BATCH_CONCURRENCY,
+)
+from model.models import EmailOutbox, EstadoCorreo
+
+# Cliente HTTP compartido (keep-alive) para todas las llamadas a Brevo
+_client: httpx.AsyncClient | None = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=EMAIL_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 async def send_email(to: str, subject: str, html_body: str):
     if not BREVO_API_KEY or not BREVO_SENDER_EMAIL:
         raise Exception("Faltan variables de entorno para Brevo")
 
-    url = "https://api.brevo.com/v3/smtp/email"
-
     payload = {
         "sender": {
             "email": BREVO_SENDER_EMAIL,
@@ -22,8 +48,91 @@ async def send_email(to: str, subject: str, html_body: str):
         "Content-Type": "application/json"
     }
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(url, json=payload, headers=headers)
+    res = await get_client().post(BREVO_API_URL, json=payload, headers=headers)
 
     if res.status_code >= 400:
         raise Exception(f"Brevo error: {res.text}")
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+async def send_bulk_email(recipients: list[dict], subject: str, html_body: str,
+                          chunk_size: int = BREVO_BATCH_SIZE,
+                          concurrency: int = BREVO_BATCH_CONCURRENCY) -> dict[str, str | None]:
+    """Envía un mismo correo a muchos destinatarios con messageVersions de Brevo.
+
+    Cada destinatario es {"email", "name"?, "params"?}; el HTML puede usar
+    {{ params.<clave> }} para personalizar. Los destinatarios se agrupan en
+    lotes de chunk_size y se envían con a lo sumo `concurrency` requests en
+    paralelo. Devuelve {email en minúsculas: None si salió, o el error}.
+    """
+    if not BREVO_API_KEY or not BREVO_SENDER_EMAIL:
+        raise Exception("Faltan variables de entorno para Brevo")
+
+    headers = {
+        "api-key": BREVO_API_KEY,
+        "Content-Type": "application/json"
+    }
+    slots = asyncio.Semaphore(concurrency)
+
+    async def enviar_lote(lote: list[dict]) -> dict[str, str | None]:
+        versions = []
+        for r in lote:
+            to = {"email": r["email"]}
+            if r.get("name"):
+                to["name"] = r["name"]
+            version = {"to": [to]}
+            if r.get("params"):
+                version["params"] = r["params"]
+            versions.append(version)
+
+        payload = {
+            "sender": {
+                "email": BREVO_SENDER_EMAIL,
+                "name": BREVO_SENDER_NAME
+            },
+            "subject": subject,
+            "htmlContent": html_body,
+            "messageVersions": versions
+        }
+
+        async with slots:
+            try:
+                res = await get_client().post(BREVO_API_URL, json=payload, headers=headers)
+            except Exception as e:
+                # Cualquier fallo se queda en este lote; los demás siguen
+                return {r["email"].lower(): f"HTTP error: {e}" for r in lote}
+
+        if res.status_code < 400:
+            return {r["email"].lower(): None for r in lote}
+        if 400 <= res.status_code < 500 and res.status_code != 429 and len(lote) > 1:
+            # Brevo rechaza el lote entero por una dirección inválida: se parte
+            # en mitades para aislarla y entregar al resto
+            mitad = len(lote) // 2
+            izquierda, derecha = await asyncio.gather(enviar_lote(lote[:mitad]), enviar_lote(lote[mitad:]))
+            return {**izquierda, **derecha}
+        return {r["email"].lower(): f"Brevo error: {res.text}" for r in lote}
+
+    # Un destinatario repetido recibiría el correo dos veces
+    unicos = list({r["email"].lower(): r for r in recipients}.values())
+    resultados = {}
+    for parcial in await asyncio.gather(*(enviar_lote(l) for l in _chunks(unicos, chunk_size))):
+        resultados.update(parcial)
+    return resultados
+
+def queue_email(db, to: str, subject: str, html_body: str) -> EmailOutbox:
+    """Encola un correo en email_outbox dentro de la transacción actual.
+
+    No hace commit: el correo se guarda junto con el cambio de negocio y el
+    worker del outbox lo entrega después.
+    """
+    correo = EmailOutbox(
+        destinatario=to,
+        asunto=subject,
+        html=html_body,
+        estado=EstadoCorreo.PENDIENTE,
+        intentos=0,
+    )
+    db.add(correo)
+    return correo
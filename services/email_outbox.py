@@ -0,0 +1,154 @@
+import asyncio
+from datetime import timedelta
+from sqlalchemy import select, update, or_, and_
+from config import (
+    AsyncSessionLocal,
+    EMAIL_OUTBOX_BATCH,
+    EMAIL_OUTBOX_INTERVAL,
+    EMAIL_OUTBOX_MAX_INTENTOS,
+    EMAIL_OUTBOX_BACKOFF,
+    EMAIL_OUTBOX_BACKOFF_MAX,
+    EMAIL_OUTBOX_LEASE,
+)
+from model.models import EmailOutbox, EstadoCorreo
+from services.email import send_email, send_bulk_email, close_client
+from utils.time import remove_tz, utcnow
+
+_task: asyncio.Task | None = None
+_wakeup = asyncio.Event()
+
+def notify_outbox():
+    """Despierta al worker sin esperar al siguiente intervalo de sondeo."""
+    _wakeup.set()
+
+def backoff_delay(intentos: int) -> float:
+    """Backoff exponencial: BACKOFF * 2^(intentos-1), con tope."""
+    return min(EMAIL_OUTBOX_BACKOFF * (2 ** max(intentos - 1, 0)), EMAIL_OUTBOX_BACKOFF_MAX)
+
+async def _claim(now) -> list[EmailOutbox]:
+    """Reclama un lote: lo marca ENVIANDO con un lease y hace commit enseguida.
+
+    Así los envíos HTTP no retienen locks de fila ni una conexión del pool.
+    """
+    async with AsyncSessionLocal() as db:
+        # skip_locked permite varios workers (uno por proceso uvicorn) sin duplicar envíos
+        pendientes = (await db.scalars(
+            select(EmailOutbox)
+            .where(or_(
+                and_(EmailOutbox.estado == EstadoCorreo.PENDIENTE, EmailOutbox.proximo_intento <= now),
+                # Lease vencido: el worker que lo reclamó murió a mitad del envío
+                and_(EmailOutbox.estado == EstadoCorreo.ENVIANDO, EmailOutbox.reclamado_hasta <= now),
+            ))
+            .order_by(EmailOutbox.proximo_intento, EmailOutbox.id)
+            .limit(EMAIL_OUTBOX_BATCH)
+            .with_for_update(skip_locked=True)
+        )).all()
+
+        lease = now + timedelta(seconds=EMAIL_OUTBOX_LEASE)
+        for correo in pendientes:
+            correo.estado = EstadoCorreo.ENVIANDO
+            correo.reclamado_hasta = lease
+        await db.commit()
+        return pendientes
+
+async def _deliver(correo: EmailOutbox) -> str | None:
+    """Envía un correo reclamado; devuelve el error o None si salió."""
+    try:
+        await send_email(correo.destinatario, correo.asunto, correo.html)
+    except Exception as e:
+        return str(e)
+    return None
+
+async def _deliver_group(correos: list[EmailOutbox]) -> list[str | None]:
+    """Envía correos con el mismo asunto y HTML en un solo request de Brevo."""
+    if len(correos) == 1:
+        return [await _deliver(correos[0])]
+    try:
+        resultados = await send_bulk_email(
+            [{"email": c.destinatario} for c in correos], correos[0].asunto, correos[0].html
+        )
+    except Exception as e:
+        return [str(e)] * len(correos)
+    return [resultados[c.destinatario.lower()] for c in correos]
+
+def _resultado(correo: EmailOutbox, error: str | None, now) -> dict:
+    """Valores que deja el intento de envío en la fila del outbox."""
+    if error is None:
+        return {"estado": EstadoCorreo.ENVIADO, "enviado_en": now, "ultimo_error": None, "reclamado_hasta": None}
+
+    intentos = correo.intentos + 1
+    valores = {"intentos": intentos, "ultimo_error": error[:500], "reclamado_hasta": None}
+    if intentos >= EMAIL_OUTBOX_MAX_INTENTOS:
+        valores["estado"] = EstadoCorreo.FALLIDO
+    else:
+        valores["estado"] = EstadoCorreo.PENDIENTE
+        valores["proximo_intento"] = now + timedelta(seconds=backoff_delay(intentos))
+    return valores
+
+async def _record(reclamados: list[EmailOutbox], errores: list[str | None]):
+    """Guarda los resultados en una transacción corta, solo si el lease sigue siendo nuestro."""
+    now = remove_tz(utcnow())
+    async with AsyncSessionLocal() as db:
+        for correo, error in zip(reclamados, errores):
+            await db.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.id == correo.id,
+                    EmailOutbox.estado == EstadoCorreo.ENVIANDO,
+                    EmailOutbox.reclamado_hasta == correo.reclamado_hasta,
+                )
+                .values(**_resultado(correo, error, now))
+            )
+        await db.commit()
+
+async def process_batch() -> int:
+    """Entrega un lote de correos pendientes; devuelve cuántos se procesaron."""
+    reclamados = await _claim(remove_tz(utcnow()))
+    if not reclamados:
+        return 0
+
+    # Un aviso masivo (mismo asunto y HTML) sale como un solo request con messageVersions
+    grupos: dict[tuple[str, str], list[EmailOutbox]] = {}
+    for correo in reclamados:
+        grupos.setdefault((correo.asunto, correo.html), []).append(correo)
+    por_grupo = await asyncio.gather(*(_deliver_group(g) for g in grupos.values()))
+
+    errores = {c.id: e for grupo, res in zip(grupos.values(), por_grupo) for c, e in zip(grupo, res)}
+    await _record(reclamados, [errores[c.id] for c in reclamados])
+    return len(reclamados)
+
+async def run_worker():
+    while True:
+        try:
+            procesados = await process_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("⚠️ Error en el outbox de correos:", e)
+            procesados = 0
+
+        # Lote lleno: seguir drenando sin esperar
+        if procesados >= EMAIL_OUTBOX_BATCH:
+            continue
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=EMAIL_OUTBOX_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def start_worker():
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_worker())
+
+async def stop_worker():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await close_client()
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import threading
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from config import AsyncSessionLocal, GETSTREAM_SYNC_INTERVAL, GETSTREAM_TIMEOUT, STREAM_API_KEY, STREAM_API_SECRET, STREAM_BASE_URL
+from model.models import GetStreamUserSync
+from utils.bulk import dialect_insert
+
+# GetStream acepta hasta 100 usuarios por llamada a upsert_users
+UPSERT_CHUNK = 100
+
+# Registro local de sincronización: user_id -> hash del nombre ya enviado
+_synced: dict[str, str] = {}
+# Usuarios pendientes para el job de reconciliación: user_id -> nombre
+_pending: dict[str, str] = {}
+_task: asyncio.Task | None = None
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_stream_client():
+    """Cliente GetStream compartido, creado en el primer uso.
+
+    El SDK se importa aquí y no al cargar los módulos de rutas, así que el
+    arranque no paga su import ni exige credenciales. Usar como dependencia
+    (`client=Depends(get_stream_client)`) para poder sustituirlo con
+    app.dependency_overrides. El cliente mantiene su pool HTTP (keep-alive).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from getstream import Stream
+                opciones = {"timeout": GETSTREAM_TIMEOUT}
+                if STREAM_BASE_URL:
+                    opciones["base_url"] = STREAM_BASE_URL
+                _client = Stream(api_key=STREAM_API_KEY, api_secret=STREAM_API_SECRET, **opciones)
+    return _client
+
+async def upsert_users_batched(client, users: list[tuple[int, str]]) -> int:
+    """Registra (id, nombre) en GetStream en lotes; devuelve cuántas llamadas HTTP hizo.
+
+    El SDK es síncrono, así que cada lote corre en el threadpool para no
+    bloquear el event loop.
+    """
+    from getstream.models import UserRequest
+    requests = [UserRequest(id=str(user_id), name=nombre) for user_id, nombre in users]
+    llamadas = 0
+    for i in range(0, len(requests), UPSERT_CHUNK):
+        await run_in_threadpool(client.upsert_users, *requests[i:i + UPSERT_CHUNK])
+        llamadas += 1
+    return llamadas
+
+def name_hash(nombre: str) -> str:
+    return hashlib.sha256(nombre.encode()).hexdigest()
+
+async def _changed_users(db, users: dict[str, str]) -> dict[str, str]:
+    """Filtra los usuarios nuevos o con nombre distinto al registrado."""
+    hashes = {uid: name_hash(nombre) for uid, nombre in users.items()}
+    candidatos = [uid for uid, h in hashes.items() if _synced.get(uid) != h]
+    if not candidatos:
+        return {}
+
+    rows = (await db.execute(
+        select(GetStreamUserSync.user_id, GetStreamUserSync.name_hash)
+        .where(GetStreamUserSync.user_id.in_(candidatos))
+    )).all()
+    for uid, h in rows:
+        _synced[uid] = h
+
+    return {uid: users[uid] for uid in candidatos if _synced.get(uid) != hashes[uid]}
+
+async def sync_users(client, users: dict, db) -> int:
+    """Hace upsert en GetStream solo de usuarios nuevos o renombrados.
+
+    `users` es {user_id: nombre}. Usa la sesión del llamador (no abre otra
+    conexión del pool) y no hace commit: el registro se guarda con la
+    transacción de la petición. Devuelve cuántos usuarios se enviaron.
+    """
+    users = {str(uid): nombre for uid, nombre in users.items()}
+    cambiados = await _changed_users(db, users)
+    if not cambiados:
+        return 0
+
+    await upsert_users_batched(client, list(cambiados.items()))
+
+    # Un solo upsert: nuevos y renombrados, sin carrera con otros workers
+    insert = dialect_insert(db)
+    stmt = insert(GetStreamUserSync).values([
+        {"user_id": uid, "name_hash": name_hash(n)} for uid, n in cambiados.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[GetStreamUserSync.user_id],
+        set_={"name_hash": stmt.excluded.name_hash, "synced_at": func.now()}
+    ))
+
+    for uid, nombre in cambiados.items():
+        _synced[uid] = name_hash(nombre)
+    return len(cambiados)
+
+async def ensure_user_synced(client, user_id, nombre: str, db) -> bool:
+    """Garantiza que el usuario exista en GetStream antes de entregarle un token.
+
+    Si nunca se registró (ni en memoria ni en la tabla) el upsert se hace
+    ya, en la sesión del llamador y sin commit; si ya existe, un cambio de
+    nombre solo se encola para la reconciliación. Devuelve True si hubo upsert.
+    """
+    uid = str(user_id)
+    if uid not in _synced:
+        registrado = await db.scalar(
+            select(GetStreamUserSync.name_hash).where(GetStreamUserSync.user_id == uid)
+        )
+        if registrado is None:
+            await sync_users(client, {uid: nombre}, db)
+            return True
+        _synced[uid] = registrado
+    queue_user_sync(uid, nombre)
+    return False
+
+def queue_user_sync(user_id, nombre: str):
+    """Marca al usuario para el job de reconciliación si su nombre cambió.
+
+    No hace IO: el hot path (joinCall) solo consulta el registro en memoria.
+    """
+    uid = str(user_id)
+    if _synced.get(uid) != name_hash(nombre):
+        _pending[uid] = nombre
+
+async def reconcile_pending(client=None) -> int:
+    if not _pending:
+        return 0
+    client = client or get_stream_client()
+    lote = dict(_pending)
+    _pending.clear()
+    try:
+        async with AsyncSessionLocal() as db:
+            enviados = await sync_users(client, lote, db)
+            await db.commit()
+        return enviados
+    except Exception:
+        # Reintentar en la siguiente vuelta sin pisar nombres más recientes
+        for uid, nombre in lote.items():
+            _pending.setdefault(uid, nombre)
+        raise
+
+async def run_sync_worker(client=None):
+    while True:
+        await asyncio.sleep(GETSTREAM_SYNC_INTERVAL)
+        try:
+            await reconcile_pending(client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("⚠️ Error sincronizando usuarios con GetStream:", e)
+
+def start_sync_worker(client=None):
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_sync_worker(client))
+
+async def stop_sync_worker(client=None):
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    # Último intento para no perder pendientes al apagar
+    try:
+        await reconcile_pending(client)
+    except Exception as e:
+        print("⚠️ Error sincronizando usuarios con GetStream:", e)
@@ -0,0 +1,108 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from model.models import Cursos, Sesiones_Virtuales
+
+
+class IntervalIndex:
+    """Índice estático de intervalos [inicio, fin) para consultas de cruce.
+
+    Ordena por inicio y guarda el máximo prefijo de `fin`; un intervalo
+    [s, e) se cruza con alguno del índice si entre los que empiezan antes
+    de `e` hay alguno que termina después de `s`. Cada consulta es
+    O(log n) y devuelve uno de los intervalos en conflicto.
+    """
+
+    def __init__(self, intervals: list[tuple[datetime, datetime, object]]):
+        self.items = sorted(intervals, key=lambda i: i[0])
+        self.starts = [i[0] for i in self.items]
+        self.max_end = []
+        self.max_pos = []  # posición del intervalo que aporta el máximo
+        for pos, (_, fin, _) in enumerate(self.items):
+            if not self.max_end or fin > self.max_end[-1]:
+                self.max_end.append(fin)
+                self.max_pos.append(pos)
+            else:
+                self.max_end.append(self.max_end[-1])
+                self.max_pos.append(self.max_pos[-1])
+
+    def overlap(self, inicio: datetime, fin: datetime):
+        """Devuelve el dato de un intervalo que se cruza con [inicio, fin), o None."""
+        n = bisect_left(self.starts, fin)  # intervalos que empiezan antes de `fin`
+        if n == 0 or self.max_end[n - 1] <= inicio:
+            return None
+        # Primer prefijo cuyo máximo `fin` supera `inicio`
+        j = bisect_right(self.max_end, inicio, 0, n)
+        return self.items[self.max_pos[j]][2]
+
+
+def validate_batch(propuestas: list[tuple[datetime, datetime]], existentes: list[tuple[datetime, datetime, object]]) -> list[dict]:
+    """Valida un lote de sesiones propuestas en una pasada.
+
+    Reporta cruces contra las sesiones existentes y entre las propias
+    propuestas. Devuelve [{"indice", "conflicto"}] (vacío si todo cuadra).
+    """
+    conflictos = []
+    indice = IntervalIndex(existentes)
+    for i, (inicio, fin) in enumerate(propuestas):
+        if fin <= inicio:
+            conflictos.append({"indice": i, "conflicto": "hora_fin debe ser posterior a hora_inicio"})
+            continue
+        choque = indice.overlap(inicio, fin)
+        if choque is not None:
+            conflictos.append({"indice": i, "conflicto": choque})
+
+    # Cruces entre propuestas: ordenadas por inicio basta comparar con el máximo fin visto
+    orden = sorted(range(len(propuestas)), key=lambda i: propuestas[i][0])
+    max_fin, max_idx = None, None
+    for i in orden:
+        inicio, fin = propuestas[i]
+        if max_fin is not None and inicio < max_fin:
+            conflictos.append({"indice": i, "conflicto": f"se cruza con la propuesta {max_idx}"})
+        if max_fin is None or fin > max_fin:
+            max_fin, max_idx = fin, i
+
+    return conflictos
+
+
+async def find_conflict(db: AsyncSession, profesor_id: int, inicio: datetime, fin: datetime):
+    """Primera sesión del profesor que se cruza con [inicio, fin), o None.
+
+    Usa el índice (id_curso, hora_inicio, hora_fin) vía JOIN con Cursos
+    (indexado por profesor_id) en lugar de un IN (subconsulta).
+    """
+    return await db.scalar(
+        select(Sesiones_Virtuales)
+        .join(Cursos, Sesiones_Virtuales.id_curso == Cursos.id)
+        .where(
+            Cursos.profesor_id == profesor_id,
+            Sesiones_Virtuales.hora_inicio < fin,
+            Sesiones_Virtuales.hora_fin > inicio
+        )
+        .limit(1)
+    )
+
+
+async def load_sessions_in_range(db: AsyncSession, profesor_id: int, inicio: datetime, fin: datetime) -> list[tuple[datetime, datetime, object]]:
+    """Sesiones del profesor que tocan [inicio, fin), listas para IntervalIndex."""
+    sesiones = (await db.scalars(
+        select(Sesiones_Virtuales)
+        .join(Cursos, Sesiones_Virtuales.id_curso == Cursos.id)
+        .where(
+            Cursos.profesor_id == profesor_id,
+            Sesiones_Virtuales.hora_inicio < fin,
+            Sesiones_Virtuales.hora_fin > inicio
+        )
+    )).all()
+    return [(s.hora_inicio, s.hora_fin, s) for s in sesiones]
+
+
+async def find_conflicts_batch(db: AsyncSession, profesor_id: int, propuestas: list[tuple[datetime, datetime]]) -> list[dict]:
+    """Valida un lote completo con una sola consulta a la BD."""
+    if not propuestas:
+        return []
+    inicio = min(p[0] for p in propuestas)
+    fin = max(p[1] for p in propuestas)
+    existentes = await load_sessions_in_range(db, profesor_id, inicio, fin)
+    return validate_batch(propuestas, existentes)
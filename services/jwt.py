@@ -1,30 +1,33 @@
 from fastapi import Depends, status, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
-from config import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import get_db
 from datetime import datetime, timedelta, timezone
 from model.models import Usuarios, AuthToken
 from config import SECRET_KEY
 from utils.time import utcnow 
+from services.token_cache import token_cache, UserSnapshot
+from services.roles import role_registry
 import jwt
+import hashlib
+import uuid
 
 security = HTTPBearer()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
+def hash_token(token: str) -> str:
+    """Digest SHA-256 del JWT, usado como llave indexada en auth_token."""
+    return hashlib.sha256(token.encode()).hexdigest()
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=30)):
     to_encode = data.copy()
     expire = utcnow() + expires_delta
     to_encode["exp"] = int(expire.timestamp())
+    to_encode.setdefault("jti", uuid.uuid4().hex)  # garantiza digests únicos
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)):
     token_str = credentials.credentials
 
     try:
@@ -36,22 +39,36 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security),
         if user_id is None or user_role is None:
             raise HTTPException(status_code=401, detail="Token inválido")
 
+        # ⚡ Revisar primero la cache de tokens validados
+        cached = token_cache.get(token_str)
+        if cached is not None:
+            revocado, snapshot = cached
+            if revocado:
+                raise HTTPException(status_code=401, detail="Token revocado o no válido")
+            return snapshot
+
         # ✅ Verificar si el token existe y no está revocado
-        token_db = db.query(AuthToken).filter(
-            AuthToken.jwt_token == token_str,
+        token_db = await db.scalar(select(AuthToken).where(
+            AuthToken.token_hash == hash_token(token_str),
             AuthToken.revocado == False
-        ).first()
+        ))
+
+        # La cache nunca debe sobrevivir a la expiración del JWT
+        max_age = payload["exp"] - utcnow().timestamp() if "exp" in payload else None
 
         if not token_db:
+            token_cache.set(token_str, True, max_age=max_age)
             raise HTTPException(status_code=401, detail="Token revocado o no válido")
 
         # Buscar usuario
-        user = db.query(Usuarios).filter(Usuarios.id == int(user_id)).first()
+        user = await db.scalar(select(Usuarios).where(Usuarios.id == int(user_id)))
         if not user:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
 
-        user.role_name = user_role
-        return user
+        # El rol vigente sale del registro; el claim del JWT solo como respaldo
+        snapshot = UserSnapshot.from_user(user, role_name=role_registry.name_of(user.role) or user_role)
+        token_cache.set(token_str, False, snapshot, max_age=max_age)
+        return snapshot
 
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expirado")
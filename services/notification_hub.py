@@ -0,0 +1,239 @@
+import asyncio
+import json
+from fastapi import WebSocket
+from config import DATABASE_URL, NOTIFICATIONS_BROKER, WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER
+
+
+class Connection:
+    """Un socket con su propia cola de envío acotada."""
+
+    def __init__(self, user_id: int, websocket: WebSocket, queue_size: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: asyncio.Task | None = None
+        self.dropped = 0
+
+    async def run_sender(self):
+        try:
+            while True:
+                data = await self.queue.get()
+                await self.websocket.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket cerrado: el handler del websocket limpia la conexión
+            pass
+
+
+class NotificationHub:
+    """Registro local de sockets por usuario (varias pestañas por usuario).
+
+    La entrega entre procesos la hace el broker: cada worker publica en el
+    broker y cada worker entrega a sus propios sockets con deliver_local.
+    """
+
+    def __init__(self, queue_size: int = 100, slow_consumer: str = "disconnect"):
+        self.queue_size = queue_size
+        self.slow_consumer = slow_consumer  # "drop" o "disconnect"
+        self.connections: dict[int, set[Connection]] = {}
+        self.broker = None
+        # Referencias fuertes a las desconexiones en curso (el loop solo guarda
+        # referencias débiles a las tareas)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> Connection:
+        await websocket.accept()
+        conn = Connection(user_id, websocket, self.queue_size)
+        conn.sender = asyncio.create_task(conn.run_sender())
+        self.connections.setdefault(user_id, set()).add(conn)
+        return conn
+
+    async def disconnect(self, conn: Connection, code: int = None):
+        sockets = self.connections.get(conn.user_id)
+        if sockets is not None:
+            sockets.discard(conn)
+            if not sockets:
+                del self.connections[conn.user_id]
+        if conn.sender is not None:
+            conn.sender.cancel()
+        if code is not None:
+            try:
+                await conn.websocket.close(code=code)
+            except Exception:
+                pass
+
+    def deliver_local(self, user_id: int, data: str):
+        """Encola el mensaje en cada socket local del usuario sin bloquear."""
+        for conn in list(self.connections.get(user_id, ())):
+            try:
+                conn.queue.put_nowait(data)
+            except asyncio.QueueFull:
+                conn.dropped += 1
+                if self.slow_consumer == "disconnect":
+                    # 1013: Try Again Later; el cliente debe reconectar
+                    task = asyncio.create_task(self.disconnect(conn, code=1013))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+    async def publish(self, user_id: int, payload: dict):
+        data = json.dumps(payload)
+        if self.broker is None:
+            self.deliver_local(user_id, data)
+        else:
+            await self.broker.publish(user_id, data)
+
+    async def start(self):
+        self.broker = make_broker(self)
+        await self.broker.start()
+
+    async def stop(self):
+        for sockets in list(self.connections.values()):
+            for conn in list(sockets):
+                await self.disconnect(conn, code=1001)
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+
+    def stats(self) -> dict:
+        return {
+            "usuarios": len(self.connections),
+            "sockets": sum(len(s) for s in self.connections.values()),
+            "broker": type(self.broker).__name__ if self.broker else None,
+        }
+
+
+class InMemoryBroker:
+    """Broker de un solo proceso: entrega directo al hub local."""
+
+    def __init__(self, hub: NotificationHub):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: int, data: str):
+        self.hub.deliver_local(user_id, data)
+
+
+class PostgresBroker:
+    """Fan-out entre workers de uvicorn con LISTEN/NOTIFY de Postgres.
+
+    Si alguna de las dos conexiones se cae, un supervisor las reabre con
+    backoff exponencial. Publicar nunca lanza: la notificación ya está
+    guardada, así que si NOTIFY falla el cliente la recupera por polling.
+    """
+
+    CHANNEL = "notificaciones_ws"
+    MAX_PAYLOAD = 8000  # NOTIFY rechaza payloads de 8000 bytes o más
+    TRUNCADO = json.dumps({"truncado": True})
+    RECONNECT_MIN = 1
+    RECONNECT_MAX = 30
+
+    def __init__(self, hub: NotificationHub, dsn: str):
+        self.hub = hub
+        self.dsn = dsn
+        self.listener = None
+        self.publisher = None
+        self._lock = asyncio.Lock()
+        self._lost = asyncio.Event()
+        self._supervisor: asyncio.Task | None = None
+
+    async def start(self):
+        try:
+            await self._connect()
+        except Exception as e:
+            print("⚠️ Broker de notificaciones sin conexión al iniciar:", e)
+            self._lost.set()
+        self._supervisor = asyncio.create_task(self._reconnect_loop())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        await self._close()
+
+    async def _connect(self):
+        import asyncpg
+
+        self._lost.clear()
+        await self._close()
+        self.listener = await asyncpg.connect(self.dsn)
+        self.listener.add_termination_listener(self._on_terminate)
+        self.publisher = await asyncpg.connect(self.dsn)
+        self.publisher.add_termination_listener(self._on_terminate)
+        await self.listener.add_listener(self.CHANNEL, self._on_notify)
+
+    async def _close(self):
+        listener, publisher = self.listener, self.publisher
+        self.listener = self.publisher = None
+        for conn in (listener, publisher):
+            if conn is None:
+                continue
+            # Cierre voluntario: que no dispare otra reconexión
+            conn.remove_termination_listener(self._on_terminate)
+            if conn.is_closed():
+                continue
+            try:
+                if conn is listener:
+                    await conn.remove_listener(self.CHANNEL, self._on_notify)
+                await conn.close()
+            except Exception:
+                conn.terminate()
+
+    async def _reconnect_loop(self):
+        while True:
+            await self._lost.wait()
+            espera = self.RECONNECT_MIN
+            while True:
+                try:
+                    await self._connect()
+                    print("🔁 Broker de notificaciones reconectado")
+                    break
+                except Exception as e:
+                    print(f"⚠️ Broker de notificaciones sin conexión, reintento en {espera}s:", e)
+                    await asyncio.sleep(espera)
+                    espera = min(espera * 2, self.RECONNECT_MAX)
+
+    def _on_terminate(self, connection):
+        self._lost.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        user_id, _, data = payload.partition(":")
+        self.hub.deliver_local(int(user_id), data)
+
+    async def publish(self, user_id: int, data: str):
+        payload = f"{user_id}:{data}"
+        if len(payload.encode()) >= self.MAX_PAYLOAD:
+            # Demasiado grande para NOTIFY: se avisa al cliente para que la
+            # traiga por polling en vez de perderla
+            payload = f"{user_id}:{self.TRUNCADO}"
+
+        publisher = self.publisher
+        if publisher is None or publisher.is_closed():
+            print(f"⚠️ Broker de notificaciones sin conexión; usuario {user_id} la verá por polling")
+            return
+        try:
+            async with self._lock:
+                await publisher.execute("SELECT pg_notify($1, $2)", self.CHANNEL, payload)
+        except Exception as e:
+            print(f"⚠️ Error publicando notificación para el usuario {user_id}:", e)
+
+
+def make_broker(hub: NotificationHub):
+    if NOTIFICATIONS_BROKER == "postgres":
+        from sqlalchemy.engine import make_url
+
+        url = make_url(DATABASE_URL).set(drivername="postgresql")
+        return PostgresBroker(hub, url.render_as_string(hide_password=False))
+    return InMemoryBroker(hub)
+
+
+hub = NotificationHub(queue_size=WS_SEND_QUEUE_SIZE, slow_consumer=WS_SLOW_CONSUMER)
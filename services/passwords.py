@@ -0,0 +1,36 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from config import BCRYPT_ROUNDS, PASSWORD_POOL_SIZE, PASSWORD_QUEUE_TIMEOUT
+from services import cifrar
+
+# bcrypt libera el GIL, así que un pool de hilos basta para sacar el
+# trabajo del event loop sin el costo de un pool de procesos.
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_POOL_SIZE, thread_name_prefix="bcrypt")
+_slots = asyncio.Semaphore(PASSWORD_POOL_SIZE)
+
+async def _run(fn, *args):
+    """Ejecuta fn en el pool; si no hay cupo antes del timeout responde 503."""
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=PASSWORD_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Servidor ocupado, intenta de nuevo")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, fn, *args)
+    finally:
+        _slots.release()
+
+async def hash_password(password: str) -> str:
+    return await _run(cifrar.hash_password, password, BCRYPT_ROUNDS)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(cifrar.verify_password, password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True si el hash se generó con un costo distinto al configurado."""
+    return cifrar.bcrypt_cost(hashed_password) != BCRYPT_ROUNDS
+
+def hash_password_sync(password: str) -> str:
+    """Versión bloqueante para código fuera del event loop (seeds, scripts)."""
+    return _executor.submit(cifrar.hash_password, password, BCRYPT_ROUNDS).result()
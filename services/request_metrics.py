@@ -0,0 +1,178 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites (segundos) de los buckets del histograma de latencia por ruta
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+class RequestStats:
+    """Consultas y tiempo de BD acumulados durante una petición."""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Estadísticas de la petición en curso; SQLAlchemy propaga el contexto al
+# greenlet del driver async, así que los eventos del cursor la ven.
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class RouteMetrics:
+    """Histogramas de latencia, códigos de estado y BD por ruta (plantilla)."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.in_flight = 0
+        self.latency: dict[tuple[str, str], list] = {}  # (método, ruta) -> [buckets, suma, cuenta]
+        self.status: dict[tuple[str, str, int], int] = {}
+        self.db: dict[tuple[str, str], list] = {}  # (método, ruta) -> [consultas, segundos]
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            hist[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            hist[1] += seconds
+            hist[2] += 1
+            self.status[(method, route, status)] = self.status.get((method, route, status), 0) + 1
+            db = self.db.setdefault(key, [0, 0.0])
+            db[0] += stats.queries
+            db[1] += stats.db_seconds
+
+    def render(self) -> str:
+        """Formato de texto de Prometheus (exposition format 0.0.4)."""
+        lines = [
+            "# HELP http_requests_in_flight Peticiones HTTP en curso.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_duration_seconds Latencia de las peticiones HTTP por ruta.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, route), (buckets, suma, cuenta) in sorted(self.latency.items()):
+                labels = f'method="{_escape(method)}",route="{_escape(route)}"'
+                acumulado = 0
+                for limite, n in zip(LATENCY_BUCKETS, buckets):
+                    acumulado += n
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{limite}"}} {acumulado}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cuenta}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {suma:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {cuenta}")
+
+            lines += [
+                "# HELP http_requests_total Peticiones HTTP por ruta y código de estado.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), n in sorted(self.status.items()):
+                lines.append(f'http_requests_total{{method="{_escape(method)}",route="{_escape(route)}",status="{status}"}} {n}')
+
+            lines += [
+                "# HELP db_queries_total Consultas SQL ejecutadas por ruta.",
+                "# TYPE db_queries_total counter",
+            ]
+            for (method, route), (consultas, _) in sorted(self.db.items()):
+                lines.append(f'db_queries_total{{method="{_escape(method)}",route="{_escape(route)}"}} {consultas}')
+
+            lines += [
+                "# HELP db_query_duration_seconds_total Tiempo total en la BD por ruta.",
+                "# TYPE db_query_duration_seconds_total counter",
+            ]
+            for (method, route), (_, segundos) in sorted(self.db.items()):
+                lines.append(f'db_query_duration_seconds_total{{method="{_escape(method)}",route="{_escape(route)}"}} {segundos:.6f}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+route_metrics = RouteMetrics()
+
+
+def attach_query_events():
+    """Cuenta consultas y tiempo de BD de todas las engines (sync y async).
+
+    Una conexión ejecuta una sentencia a la vez, así que basta un solo
+    inicio por conexión. Las sentencias que fallan no disparan
+    after_cursor_execute: handle_error las cuenta y limpia el inicio.
+    """
+
+    def _registrar(conn):
+        inicio = conn.info.pop("query_start", None)
+        stats = _current.get()
+        if inicio is not None and stats is not None:
+            stats.queries += 1
+            stats.db_seconds += time.perf_counter() - inicio
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _registrar(conn)
+
+    @event.listens_for(Engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            _registrar(exception_context.connection)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, estado y BD por ruta + cabecera Server-Timing.
+
+    La ruta se etiqueta con su plantilla (p. ej. /courses/{course_id}/sessions)
+    para que los ids no disparen la cardinalidad; lo que no coincide con
+    ninguna ruta cae en "unmatched".
+    """
+
+    def __init__(self, app, metrics: RouteMetrics = route_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        inicio = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - inicio) * 1000
+                timing = (
+                    f"db;dur={stats.db_seconds * 1000:.1f};desc=\"{stats.queries} queries\", "
+                    f"app;dur={total_ms:.1f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            self.metrics.in_flight -= 1
+            _current.reset(token)
+            route = scope.get("route")
+            self.metrics.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - inicio,
+                stats,
+            )
@@ -0,0 +1,33 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from model.models import Roles
+
+
+class RoleRegistry:
+    """Mapa id <-> nombre de los roles, cargado una vez al arrancar.
+
+    Los roles son datos de referencia (los crea bootstrap.py y no cambian
+    desde la API), así que las rutas resuelven nombre e id aquí en vez de
+    consultar o hacer JOIN con la tabla Roles. Si se editan a mano en la
+    BD hay que llamar a refresh() (ver /administrador/roles/refresh).
+    """
+
+    def __init__(self):
+        self.by_id: dict[int, str] = {}
+        self.by_name: dict[str, int] = {}
+
+    async def refresh(self, db: AsyncSession) -> dict[int, str]:
+        rows = (await db.execute(select(Roles.id, Roles.nombre_rol))).all()
+        # Se reemplazan los dos mapas de una vez para no exponer un estado a medias
+        self.by_id = {rol_id: nombre for rol_id, nombre in rows}
+        self.by_name = {nombre: rol_id for rol_id, nombre in rows}
+        return dict(self.by_id)
+
+    def id_of(self, nombre: str) -> int | None:
+        return self.by_name.get(nombre)
+
+    def name_of(self, rol_id: int) -> str | None:
+        return self.by_id.get(rol_id)
+
+
+role_registry = RoleRegistry()
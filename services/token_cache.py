@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from config import TOKEN_CACHE_TTL, TOKEN_CACHE_MAX
+
+
+class UserSnapshot:
+    """Copia compacta del usuario autenticado que se guarda en cache."""
+
+    __slots__ = ("id", "nombre", "apellido", "role", "max_cursos", "status", "role_name")
+
+    def __init__(self, id, nombre, apellido, role, max_cursos, status, role_name=None):
+        self.id = id
+        self.nombre = nombre
+        self.apellido = apellido
+        self.role = role
+        self.max_cursos = max_cursos
+        self.status = status
+        self.role_name = role_name
+
+    @classmethod
+    def from_user(cls, user, role_name=None):
+        return cls(
+            id=user.id,
+            nombre=user.nombre,
+            apellido=user.apellido,
+            role=user.role,
+            max_cursos=user.max_cursos,
+            status=user.status,
+            role_name=role_name,
+        )
+
+
+class TokenCache:
+    """Cache LRU con TTL de tokens validados, indexada por el JWT.
+
+    Es local al proceso: evict_token/evict_user no llegan a los otros
+    workers, que pueden servir la entrada vieja hasta que venza su TTL.
+    """
+
+    def __init__(self, ttl: float = 5, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # token -> (expira_en, revocado, snapshot)
+        self._by_user = {}              # user_id -> set(tokens)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        """Devuelve (revocado, snapshot) o None si no está en cache o expiró."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, revoked, snapshot = entry
+            if expires_at <= now:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return revoked, snapshot
+
+    def set(self, token: str, revoked: bool, snapshot=None, max_age: float = None):
+        ttl = self.ttl if max_age is None else max(0, min(self.ttl, max_age))
+        if ttl <= 0:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (time.monotonic() + ttl, revoked, snapshot)
+            if snapshot is not None:
+                self._by_user.setdefault(snapshot.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def evict_token(self, token: str):
+        with self._lock:
+            self._remove(token)
+
+    def evict_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._remove(token)
+            self._by_user.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None or entry[2] is None:
+            return
+        tokens = self._by_user.get(entry[2].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[entry[2].id]
+
+
+token_cache = TokenCache(ttl=TOKEN_CACHE_TTL, max_entries=TOKEN_CACHE_MAX)
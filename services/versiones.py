@@ -0,0 +1,50 @@
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from model.models import VersionRecurso
+from utils.bulk import dialect_insert
+
+# Claves de versión: cada ruta que modifica datos incrementa las que afecta
+CATALOGO = "cursos"  # cualquier alta o cambio de estado de un curso
+
+def clave_usuario(user_id: int) -> str:
+    return f"usuario:{user_id}"
+
+async def bump(db: AsyncSession, *claves: str):
+    """Incrementa las versiones dentro de la transacción del llamador (sin commit)."""
+    insert = dialect_insert(db)
+    stmt = insert(VersionRecurso).values([{"clave": c, "version": 1} for c in claves])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[VersionRecurso.clave],
+        set_={"version": VersionRecurso.version + 1}
+    ))
+
+async def compute_etag(db: AsyncSession, scope: str, *claves: str) -> str:
+    """ETag débil a partir de las versiones actuales (una consulta por PK)."""
+    rows = (await db.execute(
+        select(VersionRecurso.clave, VersionRecurso.version).where(VersionRecurso.clave.in_(claves))
+    )).all()
+    versiones = dict(rows)
+    firma = "|".join([scope] + [f"{c}={versiones.get(c, 0)}" for c in claves])
+    return f'W/"{hashlib.sha1(firma.encode()).hexdigest()[:20]}"'
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True si el cliente ya tiene esta versión (If-None-Match)."""
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    return cabecera.strip() == "*" or etag in [e.strip() for e in cabecera.split(",")]
+
+async def conditional(request: Request, response: Response, db: AsyncSession, scope: str, *claves: str) -> Response | None:
+    """Devuelve un 304 listo si la lista no cambió; si no, fija el ETag en `response`.
+
+    Las respuestas llevan Cache-Control: private, no-cache para que el
+    navegador siempre revalide y nunca las comparta entre usuarios.
+    """
+    etag = await compute_etag(db, scope, *claves)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+# La configuración crea los engines al importarse: fijar la BD de pruebas antes
+_tmp = tempfile.mkdtemp(prefix="smartweb-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+import httpx
+from sqlalchemy import event
+
+from config import Base, engine, async_engine, AsyncSessionLocal
+from model.models import Roles, Usuarios, EstadoUsuario
+from services.roles import role_registry
+from services.token_cache import UserSnapshot, token_cache
+from services.jwt import verify_token
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_schema():
+    """Esquema limpio y roles sembrados para cada prueba."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        db.add_all([
+            Roles(id=1, nombre_rol="Estudiante"),
+            Roles(id=2, nombre_rol="Profesor"),
+            Roles(id=3, nombre_rol="Administrador"),
+        ])
+        await db.commit()
+        await role_registry.refresh(db)
+    token_cache.clear()
+    yield
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def db(db_schema):
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+async def crear_usuario(db, nombre: str, rol: str, email: str | None = None) -> Usuarios:
+    user = Usuarios(
+        nombre=nombre,
+        apellido="Prueba",
+        email=email or f"{nombre.lower()}@test.com",
+        password_hash="x",
+        role=role_registry.id_of(rol),
+        confirmado=True,
+        status=EstadoUsuario.Activo,
+        max_cursos=3,
+    )
+    db.add(user)
+    await db.commit()
+    return user
+
+
+@pytest.fixture
+def app():
+    from main import app
+    yield app
+    app.dependency_overrides.clear()
+
+
+def login_as(app, user: Usuarios, rol: str):
+    """Sustituye verify_token por el usuario dado (sin JWT)."""
+    snapshot = UserSnapshot.from_user(user, role_name=rol)
+    app.dependency_overrides[verify_token] = lambda: snapshot
+    return snapshot
+
+
+@pytest.fixture
+async def client(app, db_schema):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+class QueryCounter:
+    """Cuenta las sentencias SQL ejecutadas en el engine async."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def query_counter():
+    counter = QueryCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
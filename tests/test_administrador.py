@@ -0,0 +1,205 @@
+import csv
+import io
+import pytest
+from sqlalchemy import event
+from config import async_engine
+from model.models import Cursos, EstadoCurso, EstadoInvitacion, EstadoUsuario, Inscritos_Curso
+from routes import administrador
+from tests.conftest import crear_usuario, login_as
+from utils.bulk import bulk_insert
+
+pytestmark = pytest.mark.anyio
+
+
+async def _admin(app, db):
+    admin = await crear_usuario(db, "Admin", "Administrador")
+    return login_as(app, admin, "Administrador")
+
+
+async def _paginar(client, url, **params):
+    """Recorre todas las páginas siguiendo X-Next-After-Id."""
+    paginas = []
+    while True:
+        r = await client.get(url, params=params)
+        assert r.status_code == 200, r.text
+        paginas.append([u["id"] for u in r.json()])
+        if "X-Next-After-Id" not in r.headers:
+            return paginas
+        params["after_id"] = r.headers["X-Next-After-Id"]
+
+
+async def test_users_sin_limit_devuelve_todo(app, client, db):
+    await _admin(app, db)
+    for i in range(60):
+        await crear_usuario(db, f"E{i}", "Estudiante")
+
+    r = await client.get("/administrador/users")
+
+    assert len(r.json()) == 60
+    assert "X-Next-After-Id" not in r.headers
+
+
+async def test_users_cursor_por_id(app, client, db):
+    await _admin(app, db)
+    ids = [(await crear_usuario(db, f"E{i}", "Estudiante")).id for i in range(7)]
+
+    paginas = await _paginar(client, "/administrador/users", limit=3)
+
+    assert paginas == [ids[0:3], ids[3:6], ids[6:7]]
+
+
+async def test_users_filtros(app, client, db):
+    await _admin(app, db)
+    ana = await crear_usuario(db, "Ana", "Estudiante", email="ana@uni.edu")
+    await crear_usuario(db, "Beto", "Estudiante")
+    inactivo = await crear_usuario(db, "Carla", "Profesor")
+    inactivo.status = EstadoUsuario.Inactivo
+    await db.commit()
+
+    async def ids(**params):
+        return [u["id"] for u in (await client.get("/administrador/users", params=params)).json()]
+
+    assert await ids(q="ANA") == [ana.id]
+    assert await ids(q="uni.edu") == [ana.id]
+    assert await ids(q="%") == []  # comodines escapados
+    assert await ids(status="Inactivo") == [inactivo.id]
+    assert await ids(rol="Profesor") == [inactivo.id]
+    assert len(await ids(status="Activo", limit=1)) == 1
+
+
+async def test_profesores_pendientes_paginados(app, client, db):
+    await _admin(app, db)
+    pendientes = [(await crear_usuario(db, f"P{i}", "Profesor")).id for i in range(5)]
+    aprobado = await crear_usuario(db, "Aprobado", "Profesor")
+    for p in pendientes:
+        (await db.get(type(aprobado), p)).confirmado = False
+    await db.commit()
+
+    assert await _paginar(client, "/administrador/profesores", limit=2) == [pendientes[0:2], pendientes[2:4], pendientes[4:5]]
+    assert [p["id"] for p in (await client.get("/administrador/profesores")).json()] == pendientes
+    r = await client.get("/administrador/profesores", params={"confirmado": True, "q": "aprob"})
+    assert [p["id"] for p in r.json()] == [aprobado.id]
+
+
+async def test_limit_fuera_de_rango(app, client, db):
+    await _admin(app, db)
+    assert (await client.get("/administrador/users", params={"limit": 0})).status_code == 422
+    assert (await client.get("/administrador/users", params={"limit": 201})).status_code == 422
+
+
+async def test_cors_expone_cursor(app, client, db):
+    await _admin(app, db)
+    for i in range(2):
+        await crear_usuario(db, f"E{i}", "Estudiante")
+
+    r = await client.get("/administrador/users", params={"limit": 1}, headers={"Origin": "http://localhost:5173"})
+
+    expuestas = [h.strip().lower() for h in r.headers["Access-Control-Expose-Headers"].split(",")]
+    assert "x-next-after-id" in expuestas
+    assert r.headers["X-Next-After-Id"]
+
+
+async def _cursos(db, profesor, n: int):
+    await bulk_insert(db, Cursos, [
+        {"titulo": f"Curso {i:04d}", "descripcion": "d", "profesor_id": profesor.id, "estado_curso": EstadoCurso.Activo}
+        for i in range(n)
+    ])
+    await db.commit()
+
+
+async def test_cursos_paginas_y_total(app, client, db):
+    await _admin(app, db)
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    await _cursos(db, profesor, 7)
+
+    vistos = []
+    for page in (1, 2, 3):
+        r = await client.get("/administrador/all/cursos", params={"page": page, "page_size": 3})
+        assert r.status_code == 200
+        assert (r.headers["X-Total-Count"], r.headers["X-Page"], r.headers["X-Page-Size"]) == ("7", str(page), "3")
+        vistos.append([c["titulo"] for c in r.json()])
+    assert [len(p) for p in vistos] == [3, 3, 1]
+    assert sum(vistos, []) == [f"Curso {i:04d}" for i in range(7)]
+
+    # Más allá de la última página: vacío pero con el total
+    r = await client.get("/administrador/all/cursos", params={"page": 4, "page_size": 3})
+    assert r.json() == [] and r.headers["X-Total-Count"] == "7"
+    assert (await client.get("/administrador/all/cursos", params={"page": 0})).status_code == 422
+
+
+async def test_cursos_total_respeta_filtros(app, client, db):
+    await _admin(app, db)
+    uno = await crear_usuario(db, "Uno", "Profesor")
+    dos = await crear_usuario(db, "Dos", "Profesor")
+    await _cursos(db, uno, 4)
+    await _cursos(db, dos, 2)
+
+    r = await client.get("/administrador/all/cursos", params={"profesor_id": dos.id})
+    assert r.headers["X-Total-Count"] == "2"
+    assert {c["profesor"] for c in r.json()} == {"Dos Prueba"}
+    r = await client.get("/administrador/all/cursos", params={"estado_curso": "Inactivo"})
+    assert r.headers["X-Total-Count"] == "0" and r.json() == []
+
+
+async def test_cursos_orden_solo_columnas_permitidas(app, client, db):
+    await _admin(app, db)
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    await _cursos(db, profesor, 3)
+    alumno = await crear_usuario(db, "Alumno", "Estudiante")
+    db.add(Inscritos_Curso(id_curso=2, id_estudiante=alumno.id, estado_invitacion=EstadoInvitacion.Aceptada, enlace_unico="x"))
+    await db.commit()
+
+    r = await client.get("/administrador/all/cursos", params={"sort": "titulo", "order": "desc"})
+    assert [c["titulo"] for c in r.json()] == ["Curso 0002", "Curso 0001", "Curso 0000"]
+    r = await client.get("/administrador/all/cursos", params={"sort": "estudiantes", "order": "desc"})
+    assert [(c["id"], c["estudiantes"]) for c in r.json()] == [(2, 1), (1, 0), (3, 0)]
+
+    for sort in ("profesor_id", "descripcion", "id;DROP TABLE Cursos", "__class__"):
+        assert (await client.get("/administrador/all/cursos", params={"sort": sort})).status_code == 422
+    assert (await client.get("/administrador/all/cursos", params={"order": "sideways"})).status_code == 422
+
+
+async def test_export_csv_en_streaming(app, client, db):
+    admin = await _admin(app, db)
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    await _cursos(db, profesor, 1201)
+
+    r = await client.get("/administrador/all/cursos/export")
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("text/csv")
+    assert r.headers["Content-Disposition"] == 'attachment; filename="cursos.csv"'
+
+    # ASGITransport junta el cuerpo: los trozos se ven recorriendo el generador
+    opciones = []
+
+    def espiar(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM "Cursos"' in statement:
+            opciones.append(context.execution_options.get("yield_per"))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", espiar)
+    try:
+        respuesta = await administrador.export_courses(current=admin)
+        trozos = [t async for t in respuesta.body_iterator]
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", espiar)
+
+    # Cabecera y luego un trozo por partición de yield_per=500, desde una sola
+    # consulta en streaming abierta por el propio generador (sin sesión de la ruta)
+    assert len(trozos) == 1 + 3
+    assert opciones == [500]
+    assert "".join(trozos) == r.text
+
+    filas = list(csv.reader(io.StringIO(r.text)))
+    assert filas[0] == ["id", "titulo", "descripcion", "creacion_curso", "estado_curso", "profesor", "estudiantes"]
+    assert len(filas) == 1 + 1201
+    assert [int(f[0]) for f in filas[1:]] == list(range(1, 1202))
+    assert filas[1][1:] == ["Curso 0000", "d", filas[1][3], "Activo", "Profe Prueba", "0"]
+
+
+async def test_cors_expone_paginacion_de_cursos(app, client, db):
+    await _admin(app, db)
+
+    r = await client.get("/administrador/all/cursos", headers={"Origin": "http://localhost:5173"})
+
+    expuestas = [h.strip().lower() for h in r.headers["Access-Control-Expose-Headers"].split(",")]
+    assert {"x-total-count", "x-page", "x-page-size", "content-disposition"} <= set(expuestas)
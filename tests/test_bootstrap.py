@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import pytest
+from sqlalchemy import inspect, text
+from config import engine
+import bootstrap
+
+pytestmark = pytest.mark.anyio
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _columnas(tabla):
+    return {c["name"] for c in inspect(engine).get_columns(tabla)}
+
+
+async def test_esquema_sin_version_no_esta_listo(db_schema):
+    # Tablas y rol Administrador presentes, pero migrate() nunca corrió
+    assert not bootstrap.check_ready()
+
+    bootstrap.migrate()
+
+    assert bootstrap.check_ready()
+
+
+async def test_bd_anterior_a_la_serie_se_migra(db_schema):
+    # BD creada antes de token_hash: sin la columna, su índice ni version_esquema
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_auth_token_token_hash"))
+        conn.execute(text("ALTER TABLE auth_token DROP COLUMN token_hash"))
+        conn.execute(text("DROP TABLE version_esquema"))
+        conn.execute(text("INSERT INTO auth_token (user_id, jwt_token, revocado) VALUES (1, 'a.b.c', 0)"))
+    assert not bootstrap.check_ready()
+
+    bootstrap.migrate()
+
+    assert "token_hash" in _columnas("auth_token")
+    assert "ix_auth_token_token_hash" in {i["name"] for i in inspect(engine).get_indexes("auth_token")}
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT token_hash FROM auth_token")) == bootstrap.hash_token("a.b.c")
+    assert bootstrap.check_ready()
+
+
+async def test_jwt_duplicados_se_resuelven_en_sql(db_schema, monkeypatch):
+    monkeypatch.setattr(bootstrap, "MIGRATE_BATCH", 2)  # varios lotes
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_auth_token_token_hash"))
+        conn.execute(text("UPDATE auth_token SET token_hash = NULL"))
+        filas = [
+            (1, "a", None),
+            (2, "b", None),
+            (3, "a", None),  # duplicado de 1
+            (4, "c", bootstrap.hash_token("c")),  # ya migrado en una corrida anterior
+            (5, "c", None),  # duplicado del ya migrado
+            (6, "d", None),
+            (7, "a", None),
+        ]
+        for token_id, jwt, digest in filas:
+            conn.execute(
+                text("INSERT INTO auth_token (token_id, user_id, jwt_token, token_hash, revocado) VALUES (:i, 1, :j, :h, 0)"),
+                {"i": token_id, "j": jwt, "h": digest},
+            )
+
+    bootstrap.migrate_auth_token_hash()
+
+    with engine.connect() as conn:
+        estado = {r.token_id: (r.token_hash, bool(r.revocado)) for r in conn.execute(
+            text("SELECT token_id, token_hash, revocado FROM auth_token"))}
+    h = bootstrap.hash_token
+    assert estado == {
+        1: (h("a"), False), 2: (h("b"), False), 3: (None, True), 4: (h("c"), False),
+        5: (None, True), 6: (h("d"), False), 7: (None, True),
+    }
+    # Idempotente: una segunda corrida no cambia nada
+    bootstrap.migrate_auth_token_hash()
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT count(*) FROM auth_token WHERE token_hash IS NOT NULL")) == 4
+
+
+async def test_version_menor_no_esta_lista(db_schema, monkeypatch):
+    bootstrap.migrate()
+    monkeypatch.setattr(bootstrap, "SCHEMA_VERSION", bootstrap.SCHEMA_VERSION + 1)
+    assert not bootstrap.check_ready()
+
+    bootstrap.migrate()
+    assert bootstrap.check_ready()
+
+
+async def test_fallback_del_arranque_no_crea_admin(db_schema, monkeypatch):
+    def sin_bcrypt(*args, **kwargs):
+        raise AssertionError("el arranque no debe hashear la contraseña del admin")
+    monkeypatch.setattr(bootstrap, "hash_password_sync", sin_bcrypt)
+
+    bootstrap.ensure_schema()
+
+    assert bootstrap.check_ready()
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT count(*) FROM \"Usuarios\"")) == 0
+
+
+def _cli(database_url, *args):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    return subprocess.run([sys.executable, "bootstrap.py", *args], cwd=RAIZ, env=env, capture_output=True, text=True)
+
+
+def test_cli_omite_si_la_bd_no_responde(tmp_path):
+    url = f"sqlite:///{tmp_path}/no-existe/bd.db"
+    assert _cli(url, "--skip-if-unreachable").returncode == 0
+    assert _cli(url).returncode != 0
+
+
+def test_cli_falla_si_la_migracion_falla_con_bd_disponible(tmp_path):
+    # BD alcanzable pero con auth_token como vista: el ALTER TABLE falla
+    ruta = tmp_path / "bd.db"
+    with sqlite3.connect(ruta) as conn:
+        conn.execute("CREATE VIEW auth_token AS SELECT 1 AS token_id, 1 AS user_id, 'x' AS jwt_token")
+    r = _cli(f"sqlite:///{ruta}", "migrate", "--skip-if-unreachable")
+    assert r.returncode != 0
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from sqlalchemy import select
+from config import AsyncSessionLocal
+from model.models import GetStreamCall
+from services import call_registry as registry_mod
+from services.call_registry import DBCallBackend
+
+pytestmark = pytest.mark.anyio
+
+
+async def _expira(call_id):
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(GetStreamCall.expires_at).where(GetStreamCall.call_id == call_id))
+
+
+async def test_union_a_llamada_existente_renueva_y_agrega(db_schema, monkeypatch):
+    backend = DBCallBackend(ttl=60)
+    inicio = registry_mod._now()
+    monkeypatch.setattr(registry_mod, "_now", lambda: inicio)
+    await backend.join("c1", "ana", created_by="ana")
+
+    # Otro worker (o el mismo, más tarde) se une: la llamada ya existe
+    monkeypatch.setattr(registry_mod, "_now", lambda: inicio + timedelta(seconds=30))
+    await backend.join("c1", "beto")
+    await backend.join("c1", "beto")  # repetida: no duplica ni falla
+
+    activas = await backend.list_active()
+    assert activas["c1"]["participants"] == ["ana", "beto"]
+    assert activas["c1"]["created_by"] == "ana"
+    assert await _expira("c1") == inicio + timedelta(seconds=90)
+
+
+async def test_uniones_concurrentes_no_pierden_participantes(db_schema):
+    backend = DBCallBackend(ttl=60)
+
+    await asyncio.gather(*(backend.join("c2", f"u{i}", created_by="u0") for i in range(8)))
+
+    activas = await backend.list_active()
+    assert activas["c2"]["participants"] == sorted(f"u{i}" for i in range(8))
+    assert await backend.stats() == {"active_calls": 1, "participants": 8}
+
+
+async def test_llamadas_vencidas_se_desalojan(db_schema, monkeypatch):
+    backend = DBCallBackend(ttl=60)
+    inicio = registry_mod._now()
+    monkeypatch.setattr(registry_mod, "_now", lambda: inicio)
+    await backend.join("vieja", "ana")
+
+    monkeypatch.setattr(registry_mod, "_now", lambda: inicio + timedelta(seconds=61))
+    await backend.join("nueva", "beto")
+
+    assert list(await backend.list_active()) == ["nueva"]
+    assert await backend.stats() == {"active_calls": 1, "participants": 1}
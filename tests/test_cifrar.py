@@ -0,0 +1,69 @@
+import base64
+import os
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from services import cifrar
+
+
+@pytest.fixture(autouse=True)
+def clave(monkeypatch):
+    monkeypatch.setattr(cifrar, "CYPHER_SECURE_KEY", "clave-de-prueba")
+    cifrar._master_key.cache_clear()
+    yield
+    cifrar._master_key.cache_clear()
+
+
+def _cifrar_v1(mensaje: str) -> str:
+    """Formato original: PBKDF2 por mensaje, sin prefijo ni datos asociados."""
+    salt, nonce = os.urandom(16), os.urandom(12)
+    key = cifrar.derive_key(cifrar.CYPHER_SECURE_KEY, salt)
+    return base64.b64encode(salt + nonce + AESGCM(key).encrypt(nonce, mensaje.encode(), None)).decode()
+
+
+def test_v1_existente_se_sigue_descifrando():
+    blob = _cifrar_v1("cédula 12345")
+    assert not blob.startswith(cifrar.AES_V2_PREFIX)
+    assert cifrar.decrypt_method_AES(blob) == "cédula 12345"
+
+
+def test_v2_ida_y_vuelta():
+    blob = cifrar.encrypt_method_AES("cédula 12345")
+
+    assert blob.startswith(cifrar.AES_V2_PREFIX)
+    assert cifrar.decrypt_method_AES(blob) == "cédula 12345"
+    # Salt y nonce aleatorios: el mismo texto no repite blob
+    assert cifrar.encrypt_method_AES("cédula 12345") != blob
+
+
+def test_lotes_mezclados_conservan_el_orden():
+    blobs = [_cifrar_v1("a"), *cifrar.encrypt_many(["b", "c"]), _cifrar_v1("d")]
+    assert cifrar.decrypt_many(blobs) == ["a", "b", "c", "d"]
+
+
+def test_clave_maestra_se_deriva_una_vez(monkeypatch):
+    llamadas = []
+    original = cifrar.derive_key
+    monkeypatch.setattr(cifrar, "derive_key", lambda *a: llamadas.append(a) or original(*a))
+
+    for m in ("uno", "dos", "tres"):
+        assert cifrar.decrypt_method_AES(cifrar.encrypt_method_AES(m)) == m
+
+    assert len(llamadas) == 1
+
+
+def test_v2_alterado_o_con_otra_clave_falla(monkeypatch):
+    blob = cifrar.encrypt_method_AES("secreto")
+    datos = bytearray(base64.b64decode(blob[len(cifrar.AES_V2_PREFIX):]))
+    datos[-1] ^= 1
+    with pytest.raises(InvalidTag):
+        cifrar.decrypt_method_AES(cifrar.AES_V2_PREFIX + base64.b64encode(bytes(datos)).decode())
+
+    # Quitar el prefijo no lo hace pasar por v1: el prefijo va como dato asociado
+    with pytest.raises(InvalidTag):
+        cifrar.decrypt_method_AES(blob[len(cifrar.AES_V2_PREFIX):])
+
+    monkeypatch.setattr(cifrar, "CYPHER_SECURE_KEY", "otra-clave")
+    cifrar._master_key.cache_clear()
+    with pytest.raises(InvalidTag):
+        cifrar.decrypt_method_AES(blob)
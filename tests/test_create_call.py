@@ -0,0 +1,161 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, func
+from model.models import Cursos, GetStreamUserSync, Inscritos_Curso, EstadoInvitacion, Notificaciones, Participantes_Sesion_V, Sesiones_Virtuales, Usuarios
+from services import getstream
+from services.getstream import get_stream_client
+from tests.conftest import crear_usuario, login_as
+
+pytestmark = pytest.mark.anyio
+
+
+class StubCall:
+    def __init__(self, client, call_id):
+        self.client, self.call_id = client, call_id
+
+    def create(self, data=None):
+        with self.client.lock:
+            if self.client.creates_ok is not None and self.client.creadas >= self.client.creates_ok:
+                raise RuntimeError("GetStream no disponible")
+            self.client.creadas += 1
+            self.client.http_calls.append(("call.create", self.call_id, len(data.members)))
+
+    def delete(self, hard=None):
+        self.client.http_calls.append(("call.delete", self.call_id))
+
+    def get_or_create(self, data=None):
+        self.client.http_calls.append(("call.get_or_create", self.call_id))
+
+    def get(self):
+        self.client.http_calls.append(("call.get", self.call_id))
+
+
+class StubVideo:
+    def __init__(self, client):
+        self.client = client
+
+    def call(self, tipo, call_id):
+        return StubCall(self.client, call_id)
+
+
+class StubStream:
+    """GetStream falso: cuenta las llamadas que serían HTTP."""
+
+    def __init__(self):
+        self.http_calls = []
+        self.video = StubVideo(self)
+        self.lock = threading.Lock()
+        self.creadas = 0
+        self.creates_ok = None  # si se fija, las creaciones siguientes fallan
+
+    def upsert_users(self, *users):
+        self.http_calls.append(("upsert_users", len(users)))
+
+    def create_token(self, user_id):
+        return f"token-{user_id}"  # local, sin HTTP
+
+
+@pytest.fixture
+def stream(app):
+    getstream._synced.clear()
+    stub = StubStream()
+    app.dependency_overrides[get_stream_client] = lambda: stub
+    yield stub
+    getstream._synced.clear()
+
+
+async def _curso(db, profesor, n_alumnos: int) -> Cursos:
+    curso = Cursos(titulo=f"Curso {n_alumnos}", descripcion="d", profesor_id=profesor.id)
+    db.add(curso)
+    await db.flush()
+    for i in range(n_alumnos):
+        alumno = await crear_usuario(db, f"A{curso.id}x{i}", "Estudiante")
+        db.add(Inscritos_Curso(id_curso=curso.id, id_estudiante=alumno.id,
+                               estado_invitacion=EstadoInvitacion.Aceptada, enlace_unico=f"{curso.id}-{i}"))
+    await db.commit()
+    return curso
+
+
+def _payload(curso, dia: int):
+    inicio = datetime(2026, 3, 2, 8, 0) + timedelta(days=dia)
+    return {
+        "curso_id": curso.id, "titulo": "Clase", "descripcion": "d",
+        "hora_inicio": inicio.isoformat(), "hora_fin": (inicio + timedelta(hours=1)).isoformat(),
+        "origen": "https://app.test",
+    }
+
+
+async def _crear(client, query_counter, stream, payload):
+    query_counter.count = 0
+    stream.http_calls.clear()
+    r = await client.post("/hope/createCall", json=payload)
+    assert r.status_code == 200, r.text
+    return query_counter.count, list(stream.http_calls), r.json()
+
+
+async def test_create_call_presupuesto_constante(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    chico = await _curso(db, profesor, 2)
+    grande = await _curso(db, profesor, 150)
+    login_as(app, profesor, "Profesor")
+
+    q_chico, http_chico, _ = await _crear(client, query_counter, stream, _payload(chico, 0))
+    q_grande, http_grande, body = await _crear(client, query_counter, stream, _payload(grande, 1))
+
+    # conflicto, integrantes, registro de sync (lectura + upsert), sesión,
+    # participantes (HOST y alumnos van en dos INSERT por tener columnas
+    # distintas) y notificaciones: sin importar cuántos alumnos haya
+    assert q_chico == q_grande
+    assert q_grande <= 8
+    # GetStream: upsert en lotes de 100 (el profesor ya quedó sincronizado en la
+    # primera llamada) + una creación de llamada con los 151 miembros
+    assert http_grande == [("upsert_users", 100), ("upsert_users", 50), ("call.create", http_grande[-1][1], 151)]
+    assert len(body["miembros"]) == 151
+
+    sesion_id = await db.scalar(select(func.max(Sesiones_Virtuales.id_sesion)))
+    assert await db.scalar(select(func.count()).select_from(Participantes_Sesion_V).where(Participantes_Sesion_V.id_sesion == sesion_id)) == 151
+    assert await db.scalar(select(func.count()).select_from(Notificaciones)) == 152
+
+
+async def test_create_call_repetida_no_reenvia_usuarios(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 30)
+    login_as(app, profesor, "Profesor")
+
+    await _crear(client, query_counter, stream, _payload(curso, 0))
+    q, http, _ = await _crear(client, query_counter, stream, _payload(curso, 1))
+
+    # Registro en memoria al día: ni consulta de sync ni upsert_users
+    assert [c[0] for c in http] == ["call.create"]
+    assert q <= 6
+
+
+async def test_join_call_registra_usuario_nuevo_y_encola_renombres(app, client, db, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 1)
+    alumno = await db.scalar(select(Usuarios).join(Inscritos_Curso, Inscritos_Curso.id_estudiante == Usuarios.id))
+    getstream._pending.clear()
+    login_as(app, alumno, "Estudiante")
+
+    # Nunca registrado: upsert síncrono antes de entregar el token
+    r = await client.post("/hope/joinCall", params={"curso_id": curso.id})
+    assert r.status_code == 200
+    assert r.json()["getStreamToken"] == f"token-{alumno.id}"
+    assert stream.http_calls == [("upsert_users", 1)]
+    assert await db.scalar(select(GetStreamUserSync.user_id)) == str(alumno.id)
+
+    # Ya registrado (en memoria o, en otro proceso, en la tabla): sin HTTP
+    await client.post("/hope/joinCall", params={"curso_id": curso.id})
+    getstream._synced.clear()
+    await client.post("/hope/joinCall", params={"curso_id": curso.id})
+    assert stream.http_calls == [("upsert_users", 1)]
+    assert getstream._pending == {}
+
+    # Renombre: se encola para la reconciliación, no bloquea la unión
+    alumno.nombre = "Renombrado"
+    login_as(app, alumno, "Estudiante")
+    await client.post("/hope/joinCall", params={"curso_id": curso.id})
+    assert stream.http_calls == [("upsert_users", 1)]
+    assert getstream._pending == {str(alumno.id): "Renombrado Prueba"}
+    getstream._pending.clear()
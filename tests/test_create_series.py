@@ -0,0 +1,148 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select, func
+from model.models import Notificaciones, Participantes_Sesion_V, Sesiones_Virtuales
+from routes import NewVideoCall
+from tests.conftest import crear_usuario, login_as
+from tests.test_create_call import _curso, _payload, stream  # noqa: F401 (fixture)
+
+pytestmark = pytest.mark.anyio
+
+
+async def _serie(client, query_counter, stream, payload, rrule: str):
+    query_counter.statements.clear()
+    stream.http_calls.clear()
+    r = await client.post("/hope/createSeries", json={**payload, "rrule": rrule})
+    # SQLite no agrupa INSERT ... RETURNING con orden garantizado (asyncpg sí):
+    # ahí el INSERT de sesiones sale fila por fila y no se cuenta
+    consultas = [s for s in query_counter.statements if not s.startswith('INSERT INTO "Sesiones_Virtuales"')]
+    return r, len(consultas), list(stream.http_calls)
+
+
+async def _contar(db, modelo):
+    return await db.scalar(select(func.count()).select_from(modelo))
+
+
+async def test_expande_rrule_en_una_transaccion(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 3)
+    login_as(app, profesor, "Profesor")
+
+    # 2026-03-02 es lunes
+    r, _, http = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=WEEKLY;BYDAY=MO,WE;COUNT=4")
+
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["total_sesiones"] == 4
+    assert [s["hora_inicio"] for s in body["sesiones"]] == [
+        "2026-03-02T08:00:00", "2026-03-04T08:00:00", "2026-03-09T08:00:00", "2026-03-11T08:00:00",
+    ]
+    assert all(datetime.fromisoformat(s["hora_fin"]) - datetime.fromisoformat(s["hora_inicio"]) == (
+        datetime(2026, 1, 1, 9) - datetime(2026, 1, 1, 8)) for s in body["sesiones"])
+
+    assert await _contar(db, Sesiones_Virtuales) == 4
+    assert await _contar(db, Participantes_Sesion_V) == 4 * (3 + 1)
+    # Una notificación por alumno para toda la serie
+    assert await _contar(db, Notificaciones) == 3
+
+    # Un upsert de usuarios y una llamada de GetStream por sesión
+    assert [c[0] for c in http] == ["upsert_users"] + ["call.create"] * 4
+    assert {str(c[1]) for c in http[1:]} == {s["enlace_llamada"].split("/")[-2] for s in body["sesiones"]}
+
+
+async def test_insercion_masiva_no_depende_del_tamano(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 5)
+    login_as(app, profesor, "Profesor")
+
+    # La primera serie además registra a los usuarios en GetStream
+    r, _, _ = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=DAILY;COUNT=1")
+    assert r.status_code == 200, r.text
+    r, q_corta, _ = await _serie(client, query_counter, stream, _payload(curso, 1), "FREQ=DAILY;COUNT=2")
+    assert r.status_code == 200, r.text
+    r, q_larga, http = await _serie(client, query_counter, stream, _payload(curso, 10), "FREQ=DAILY;COUNT=40")
+    assert r.status_code == 200, r.text
+
+    # curso, conflictos, integrantes, participantes (HOST y alumnos) y notificaciones
+    assert q_larga == q_corta <= 6
+    assert [c[0] for c in http] == ["call.create"] * 40
+    assert await _contar(db, Sesiones_Virtuales) == 43
+    assert await _contar(db, Participantes_Sesion_V) == 43 * 6
+
+
+@pytest.mark.parametrize("rrule", ["FREQ=WEEKLY;BYDAY=MO", "FREQ=DAILY;INTERVAL=2"])
+async def test_exige_count_o_until(app, client, db, query_counter, stream, rrule):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 1)
+    login_as(app, profesor, "Profesor")
+
+    r, _, http = await _serie(client, query_counter, stream, _payload(curso, 0), rrule)
+
+    assert r.status_code == 400
+    assert "COUNT o UNTIL" in r.json()["detail"]
+    assert http == []
+
+
+async def test_until_acota_la_serie(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 1)
+    login_as(app, profesor, "Profesor")
+
+    r, _, _ = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=WEEKLY;BYDAY=MO;UNTIL=20260323T235959")
+
+    assert r.status_code == 200, r.text
+    assert r.json()["total_sesiones"] == 4
+
+
+async def test_tope_de_ocurrencias(app, client, db, query_counter, stream, monkeypatch):
+    monkeypatch.setattr(NewVideoCall, "MAX_OCURRENCIAS", 5)
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 1)
+    login_as(app, profesor, "Profesor")
+
+    r, _, http = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=DAILY;COUNT=6")
+    assert r.status_code == 400
+    assert "Máximo 5" in r.json()["detail"]
+    assert http == []
+
+    r, _, _ = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=DAILY;COUNT=5")
+    assert r.status_code == 200, r.text
+
+
+async def test_conflictos_del_lote(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 2)
+    login_as(app, profesor, "Profesor")
+    # Sesión suelta el lunes 9 a las 8:00, que choca con la segunda ocurrencia
+    r = await client.post("/hope/createCall", json=_payload(curso, 7))
+    assert r.status_code == 200, r.text
+
+    r, q, http = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=WEEKLY;BYDAY=MO;COUNT=3")
+
+    assert r.status_code == 400
+    detalle = r.json()["detail"]
+    assert [c["hora_inicio"] for c in detalle["conflictos"]] == ["2026-03-09T08:00:00"]
+    assert "Clase" in detalle["conflictos"][0]["conflicto"]
+    # Todas las ocurrencias se validan con una sola consulta, antes de tocar GetStream
+    assert http == []
+    assert await _contar(db, Sesiones_Virtuales) == 1
+
+
+async def test_fallo_de_getstream_deshace_la_serie(app, client, db, query_counter, stream):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    curso = await _curso(db, profesor, 2)
+    login_as(app, profesor, "Profesor")
+    stream.creates_ok = 2
+
+    r, _, http = await _serie(client, query_counter, stream, _payload(curso, 0), "FREQ=DAILY;COUNT=5")
+
+    assert r.status_code == 502
+    assert "3 de 5" in r.json()["detail"]
+    # Nada quedó en la BD y las llamadas que sí se crearon se borran
+    assert await _contar(db, Sesiones_Virtuales) == 0
+    assert await _contar(db, Participantes_Sesion_V) == 0
+    assert await _contar(db, Notificaciones) == 0
+    creadas = {c[1] for c in http if c[0] == "call.create"}
+    borradas = {c[1] for c in http if c[0] == "call.delete"}
+    assert len(creadas) == 2
+    assert borradas == creadas
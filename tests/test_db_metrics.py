@@ -0,0 +1,74 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from services import db_metrics
+from services.db_metrics import PoolMetrics, TimedAsyncQueuePool
+
+pytestmark = pytest.mark.anyio
+
+APERTURA = 0.2  # segundos que tarda en abrirse cada conexión
+
+
+@pytest.fixture
+async def motor(monkeypatch, tmp_path):
+    metricas = PoolMetrics()
+    monkeypatch.setattr(db_metrics, "pool_metrics", metricas)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedAsyncQueuePool, pool_size=1, max_overflow=0, pool_timeout=5,
+    )
+    metricas.attach(engine.sync_engine.pool)
+
+    @event.listens_for(engine.sync_engine, "do_connect")
+    def conexion_lenta(dialect, conn_rec, cargs, cparams):
+        time.sleep(APERTURA)  # corre en el greenlet del checkout, como un handshake TLS
+
+    yield engine, metricas
+    await engine.dispose()
+
+
+def _espera(metricas: PoolMetrics, pool) -> dict:
+    return metricas.snapshot(pool)["wait"]
+
+
+async def test_apertura_no_cuenta_como_espera(motor):
+    engine, metricas = motor
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    datos = metricas.snapshot(engine.sync_engine.pool)
+    assert datos["connects"] == 1
+    assert datos["connect_time"]["count"] == 1
+    assert datos["connect_time"]["max_ms"] >= APERTURA * 1000
+    # Pool libre: ni el checkout que abrió la conexión ni el que la reusó esperaron
+    assert datos["wait"]["count"] == 2
+    assert datos["wait"]["max_ms"] < 50
+
+
+async def test_espera_real_por_pool_lleno(motor):
+    engine, metricas = motor
+    retener = 0.3
+    ocupada = asyncio.Event()
+
+    async def ocupar():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            ocupada.set()
+            await asyncio.sleep(retener)
+
+    async def esperar():
+        await ocupada.wait()  # el primero ya tiene la única conexión
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(ocupar(), esperar())
+
+    espera = _espera(metricas, engine.sync_engine.pool)
+    assert espera["count"] == 2
+    assert espera["max_ms"] >= (retener - 0.1) * 1000
+    assert metricas.snapshot(engine.sync_engine.pool)["connect_time"]["count"] == 1
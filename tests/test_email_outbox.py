@@ -0,0 +1,335 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sqlalchemy import select, update
+from config import AsyncSessionLocal, async_engine
+from model.models import EmailOutbox, EstadoCorreo
+from services import email, email_outbox
+from services.email import queue_email
+from utils.time import remove_tz, utcnow
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeBrevo(ThreadingHTTPServer):
+    """Servidor HTTP local que hace de Brevo con respuestas programadas."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.respuestas = []  # [(status, body)], se consumen en orden
+        self.por_defecto = (201, '{"messageId": "ok"}')
+        self.recibidos = []
+        self.conexiones = set()
+        self.demora = 0  # segundos antes de responder
+        self.rechazar = set()  # direcciones que hacen fallar el request con 400
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v3/smtp/email"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.conexiones.add(self.client_address)
+        payload = json.loads(cuerpo)
+        self.server.recibidos.append({"headers": dict(self.headers), "json": payload})
+        time.sleep(self.server.demora)
+        status, body = self.server.respuestas.pop(0) if self.server.respuestas else self.server.por_defecto
+        if self.server.rechazar & set(_destinatarios(payload)):
+            status, body = 400, '{"message": "invalid email"}'
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _destinatarios(payload: dict) -> list[str]:
+    versiones = [v["to"][0] for v in payload.get("messageVersions", [])]
+    return [t["email"] for t in payload.get("to", []) + versiones]
+
+
+@pytest.fixture
+async def brevo(db_schema, monkeypatch):
+    server = FakeBrevo()
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    monkeypatch.setattr(email, "BREVO_API_URL", server.url)
+    monkeypatch.setattr(email, "BREVO_API_KEY", "test-key")
+    monkeypatch.setattr(email, "BREVO_SENDER_EMAIL", "no-reply@test.com")
+    yield server
+    await email.close_client()
+    server.shutdown()
+    server.server_close()
+
+
+async def _encolar(n: int, masivo: bool = False):
+    async with AsyncSessionLocal() as db:
+        for i in range(n):
+            asunto, html = ("Aviso", "<p>aviso</p>") if masivo else (f"Asunto {i}", f"<p>{i}</p>")
+            queue_email(db, f"user{i}@test.com", asunto, html)
+        await db.commit()
+
+
+async def _correos():
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(select(EmailOutbox).order_by(EmailOutbox.id))).all()
+
+
+async def _vencer_reintentos():
+    """Adelanta el reloj: todos los reintentos programados quedan vencidos."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(proximo_intento=remove_tz(utcnow()) - timedelta(seconds=1)))
+        await db.commit()
+
+
+async def test_entrega_lote_y_marca_enviados(brevo):
+    await _encolar(3)
+
+    assert await email_outbox.process_batch() == 3
+
+    correos = await _correos()
+    assert [c.estado for c in correos] == [EstadoCorreo.ENVIADO] * 3
+    assert all(c.enviado_en is not None and c.intentos == 0 for c in correos)
+    assert sorted(r["json"]["to"][0]["email"] for r in brevo.recibidos) == [f"user{i}@test.com" for i in range(3)]
+    assert all(r["headers"]["api-key"] == "test-key" for r in brevo.recibidos)
+
+    # Ya no quedan pendientes
+    assert await email_outbox.process_batch() == 0
+
+
+async def test_reutiliza_la_conexion_keep_alive(brevo):
+    for _ in range(3):
+        await _encolar(1)
+        assert await email_outbox.process_batch() == 1
+
+    assert len(brevo.recibidos) == 3
+    assert len(brevo.conexiones) == 1
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+async def test_error_transitorio_reintenta_con_backoff(brevo, status):
+    brevo.respuestas = [(status, '{"message": "intente luego"}')]
+    await _encolar(1)
+    antes = remove_tz(utcnow())
+
+    assert await email_outbox.process_batch() == 1
+
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.PENDIENTE
+    assert correo.intentos == 1
+    assert "intente luego" in correo.ultimo_error
+    espera = (correo.proximo_intento - antes).total_seconds()
+    assert email_outbox.backoff_delay(1) - 1 <= espera <= email_outbox.backoff_delay(1) + 1
+
+    # Antes del backoff no se vuelve a reclamar
+    assert await email_outbox.process_batch() == 0
+    assert len(brevo.recibidos) == 1
+
+    # Vencido el backoff se reintenta y ahora sale
+    await _vencer_reintentos()
+    assert await email_outbox.process_batch() == 1
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.ENVIADO
+    assert correo.ultimo_error is None
+    assert len(brevo.recibidos) == 2
+
+
+async def test_dead_letter_tras_max_intentos(brevo, monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_MAX_INTENTOS", 3)
+    brevo.por_defecto = (500, '{"message": "caido"}')
+    await _encolar(1)
+
+    for _ in range(3):
+        assert await email_outbox.process_batch() == 1
+        await _vencer_reintentos()
+
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.FALLIDO
+    assert correo.intentos == 3
+
+    # Un FALLIDO no se vuelve a intentar
+    assert await email_outbox.process_batch() == 0
+    assert len(brevo.recibidos) == 3
+
+
+async def test_error_de_red_cuenta_como_intento(brevo, monkeypatch):
+    monkeypatch.setattr(email, "BREVO_API_URL", "http://127.0.0.1:9/v3/smtp/email")
+    await _encolar(1)
+
+    assert await email_outbox.process_batch() == 1
+
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.PENDIENTE
+    assert correo.intentos == 1
+    assert correo.ultimo_error
+
+
+async def test_reclama_por_lotes_en_orden(brevo, monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_BATCH", 2)
+    await _encolar(3)
+
+    assert await email_outbox.process_batch() == 2
+    assert [c.estado for c in await _correos()] == [EstadoCorreo.ENVIADO, EstadoCorreo.ENVIADO, EstadoCorreo.PENDIENTE]
+    assert await email_outbox.process_batch() == 1
+
+
+async def test_envia_fuera_de_la_transaccion(brevo):
+    brevo.demora = 0.5
+    await _encolar(2)
+
+    envio = asyncio.create_task(email_outbox.process_batch())
+    while len(brevo.recibidos) < 2:
+        await asyncio.sleep(0.02)
+
+    # Con el envío en vuelo la reclamación ya está confirmada y nadie retiene
+    # una conexión del pool
+    assert async_engine.pool.checkedout() == 0
+    correos = await _correos()
+    assert [c.estado for c in correos] == [EstadoCorreo.ENVIANDO] * 2
+    assert all(c.reclamado_hasta > remove_tz(utcnow()) for c in correos)
+    # Otro worker no los vuelve a reclamar mientras el lease siga vigente
+    assert await email_outbox.process_batch() == 0
+
+    assert await envio == 2
+    correos = await _correos()
+    assert [c.estado for c in correos] == [EstadoCorreo.ENVIADO] * 2
+    assert all(c.reclamado_hasta is None for c in correos)
+    assert len(brevo.recibidos) == 2
+
+
+async def test_reclama_lease_vencido(brevo):
+    await _encolar(1)
+    # Un worker murió a mitad del envío: la fila quedó ENVIANDO con el lease vencido
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(
+            estado=EstadoCorreo.ENVIANDO,
+            reclamado_hasta=remove_tz(utcnow()) - timedelta(seconds=1),
+        ))
+        await db.commit()
+
+    assert await email_outbox.process_batch() == 1
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.ENVIADO
+    assert len(brevo.recibidos) == 1
+
+
+async def test_resultado_no_pisa_un_lease_ajeno(brevo):
+    brevo.demora = 0.3
+    await _encolar(1)
+
+    envio = asyncio.create_task(email_outbox.process_batch())
+    while not brevo.recibidos:
+        await asyncio.sleep(0.02)
+    # Mientras tanto el lease venció y otro worker lo reclamó de nuevo
+    otro_lease = remove_tz(utcnow()) + timedelta(seconds=60)
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(EmailOutbox).values(reclamado_hasta=otro_lease))
+        await db.commit()
+
+    assert await envio == 1
+    [correo] = await _correos()
+    assert correo.estado == EstadoCorreo.ENVIANDO
+    assert correo.reclamado_hasta == otro_lease
+
+
+async def test_bulk_parte_en_lotes(brevo):
+    destinatarios = [{"email": f"user{i}@test.com"} for i in range(5)]
+
+    resultados = await email.send_bulk_email(destinatarios, "Aviso", "<p>aviso</p>", chunk_size=2)
+
+    assert resultados == {f"user{i}@test.com": None for i in range(5)}
+    assert sorted(len(r["json"]["messageVersions"]) for r in brevo.recibidos) == [1, 2, 2]
+    assert sorted(e for r in brevo.recibidos for e in _destinatarios(r["json"])) == [d["email"] for d in destinatarios]
+
+
+async def test_bulk_sin_duplicados(brevo):
+    destinatarios = [{"email": "Ana@test.com", "name": "Ana"}, {"email": "ana@test.com"}, {"email": "bob@test.com"}]
+
+    resultados = await email.send_bulk_email(destinatarios, "Aviso", "<p>aviso</p>")
+
+    assert resultados == {"ana@test.com": None, "bob@test.com": None}
+    [request] = brevo.recibidos
+    assert len(request["json"]["messageVersions"]) == 2
+
+
+async def test_bulk_aisla_direccion_invalida(brevo):
+    brevo.rechazar = {"user2@test.com"}
+    destinatarios = [{"email": f"user{i}@test.com"} for i in range(8)]
+
+    resultados = await email.send_bulk_email(destinatarios, "Aviso", "<p>aviso</p>", chunk_size=4)
+
+    assert "invalid email" in resultados.pop("user2@test.com")
+    assert resultados == {f"user{i}@test.com": None for i in range(8) if i != 2}
+    # Solo se reparte el lote que tenía la dirección inválida
+    assert len(brevo.recibidos) == 2 + 2 + 2
+
+
+async def test_bulk_fallo_de_un_lote_no_descarta_los_demas(brevo, monkeypatch):
+    cliente = email.get_client()
+    post_original = cliente.post
+
+    async def post(url, json, headers):
+        if "user0@test.com" in _destinatarios(json):
+            raise RuntimeError("se cayó el lote")
+        return await post_original(url, json=json, headers=headers)
+
+    monkeypatch.setattr(cliente, "post", post)
+    brevo.respuestas = [(500, '{"message": "caido"}')]
+    destinatarios = [{"email": f"user{i}@test.com"} for i in range(3)]
+
+    resultados = await email.send_bulk_email(destinatarios, "Aviso", "<p>aviso</p>", chunk_size=1, concurrency=1)
+
+    assert "se cayó el lote" in resultados["user0@test.com"]
+    # Los 5xx no se parten: fallan para reintentarse completos
+    assert [resultados["user1@test.com"] is None, resultados["user2@test.com"] is None].count(True) == 1
+    assert len(brevo.recibidos) == 2
+
+
+async def test_outbox_agrupa_avisos_masivos(brevo):
+    brevo.rechazar = {"user1@test.com"}
+    await _encolar(3, masivo=True)
+
+    assert await email_outbox.process_batch() == 3
+
+    correos = await _correos()
+    assert [c.estado for c in correos] == [EstadoCorreo.ENVIADO, EstadoCorreo.PENDIENTE, EstadoCorreo.ENVIADO]
+    assert correos[1].intentos == 1 and "invalid email" in correos[1].ultimo_error
+    # Un request con los tres y luego las mitades para aislar al rechazado
+    assert len(brevo.recibidos[0]["json"]["messageVersions"]) == 3
+
+
+def test_backoff_exponencial_con_tope(monkeypatch):
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_BACKOFF", 5)
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_BACKOFF_MAX", 30)
+    assert [email_outbox.backoff_delay(i) for i in range(1, 6)] == [5, 10, 20, 30, 30]
+
+
+async def test_worker_despierta_con_notify(brevo, monkeypatch):
+    # Intervalo largo: solo notify_outbox puede explicar una entrega rápida
+    monkeypatch.setattr(email_outbox, "EMAIL_OUTBOX_INTERVAL", 60)
+    email_outbox.start_worker()
+    try:
+        await asyncio.sleep(0.1)  # el worker ya drenó y espera
+        await _encolar(1)
+        email_outbox.notify_outbox()
+        for _ in range(50):
+            if (await _correos())[0].estado == EstadoCorreo.ENVIADO:
+                break
+            await asyncio.sleep(0.05)
+        assert (await _correos())[0].estado == EstadoCorreo.ENVIADO
+    finally:
+        await email_outbox.stop_worker()
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import getstream as sdk
+from services import getstream
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StreamContado:
+    """Sustituto de getstream.Stream que cuenta cuántas veces se construye."""
+
+    creados = 0
+
+    def __init__(self, **opciones):
+        time.sleep(0.05)  # ventana para que varios hilos lleguen a la vez
+        type(self).creados += 1
+        self.opciones = opciones
+
+
+@pytest.fixture
+def sin_cliente(monkeypatch):
+    StreamContado.creados = 0
+    monkeypatch.setattr(sdk, "Stream", StreamContado)
+    monkeypatch.setattr(getstream, "_client", None)
+
+
+def test_importar_la_app_no_carga_el_sdk(tmp_path):
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}"}
+    codigo = "import sys, main; print('getstream' in sys.modules, 'getstream.video' in sys.modules)"
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=env, capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
+    assert r.stdout.split() == ["False", "False"]
+
+
+def test_cliente_se_crea_en_el_primer_uso(sin_cliente):
+    assert getstream._client is None
+
+    cliente = getstream.get_stream_client()
+
+    assert isinstance(cliente, StreamContado)
+    assert StreamContado.creados == 1
+    assert cliente.opciones["timeout"] == getstream.GETSTREAM_TIMEOUT
+    assert getstream.get_stream_client() is cliente
+    assert StreamContado.creados == 1
+
+
+def test_cliente_unico_con_hilos_concurrentes(sin_cliente):
+    clientes = []
+    hilos = [threading.Thread(target=lambda: clientes.append(getstream.get_stream_client())) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert StreamContado.creados == 1
+    assert len({id(c) for c in clientes}) == 1
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import select
+from model.models import GetStreamUserSync
+from services import getstream
+
+pytestmark = pytest.mark.anyio
+
+
+class StubStream:
+    """Cliente GetStream falso: registra cada upsert_users."""
+
+    def __init__(self):
+        self.upserts = []
+
+    def upsert_users(self, *users):
+        self.upserts.append([(u.id, u.name) for u in users])
+
+
+@pytest.fixture(autouse=True)
+def registro_limpio(monkeypatch):
+    getstream._synced.clear()
+    getstream._pending.clear()
+
+    # sync_users debe usar la sesión del llamador, nunca abrir otra conexión
+    def sin_sesion_propia():
+        raise AssertionError("sync_users abrió su propia sesión")
+    monkeypatch.setattr(getstream, "AsyncSessionLocal", sin_sesion_propia)
+    yield
+    getstream._synced.clear()
+    getstream._pending.clear()
+
+
+async def _registro(db):
+    return dict((await db.execute(select(GetStreamUserSync.user_id, GetStreamUserSync.name_hash))).all())
+
+
+async def test_solo_envia_nuevos_o_renombrados(db):
+    client = StubStream()
+
+    assert await getstream.sync_users(client, {1: "Ana", 2: "Beto"}, db) == 2
+    await db.commit()
+    assert await getstream.sync_users(client, {1: "Ana", 2: "Beto"}, db) == 0
+
+    # Otro proceso (registro en memoria vacío) consulta la tabla y no reenvía
+    getstream._synced.clear()
+    assert await getstream.sync_users(client, {1: "Ana", 2: "Beto"}, db) == 0
+    assert client.upserts == [[("1", "Ana"), ("2", "Beto")]]
+
+
+async def test_renombre_y_alta_concurrente_en_el_mismo_lote(db):
+    client = StubStream()
+    await getstream.sync_users(client, {1: "Ana"}, db)
+    await db.commit()
+
+    # Otro worker registró al usuario 3 entre la lectura y la escritura:
+    # antes era un IntegrityError que descartaba también el renombre de 1
+    getstream._synced.clear()
+    original = getstream._changed_users
+
+    async def con_carrera(db, users):
+        cambiados = await original(db, users)
+        db.add(GetStreamUserSync(user_id="3", name_hash=getstream.name_hash("viejo")))
+        await db.flush()
+        return cambiados
+
+    getstream._changed_users = con_carrera
+    try:
+        assert await getstream.sync_users(client, {1: "Ana María", 3: "Carla"}, db) == 2
+    finally:
+        getstream._changed_users = original
+    await db.commit()
+
+    registro = await _registro(db)
+    assert registro["1"] == getstream.name_hash("Ana María")
+    assert registro["3"] == getstream.name_hash("Carla")
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+import pytest
+from model.models import Notificaciones, TipoNotificacion
+from tests.conftest import crear_usuario, login_as
+
+pytestmark = pytest.mark.anyio
+
+
+def _notif(user_id, n, hora=None):
+    return Notificaciones(
+        usuario_id=user_id,
+        titulo=f"n{n}",
+        mensaje="m",
+        tipo=TipoNotificacion.EN_APP,
+        hora_envio=hora or datetime(2026, 1, 1, 12, 0) + timedelta(minutes=n),
+    )
+
+
+async def _poll_all(client, user_id, since, limit):
+    """Sigue latest_cursor hasta vaciar el delta; devuelve los títulos entregados."""
+    entregadas = []
+    while True:
+        r = await client.get(f"/notifications/{user_id}", params={"since": since, "limit": limit})
+        assert r.status_code == 200
+        body = r.json()
+        entregadas += [n["titulo"] for n in body["notificaciones"]]
+        since = body["latest_cursor"]
+        if not body["has_more"]:
+            return entregadas, since
+
+
+async def test_delta_entrega_todas_las_filas_nuevas_en_orden(app, client, db):
+    user = await crear_usuario(db, "Ana", "Estudiante")
+    login_as(app, user, "Estudiante")
+
+    db.add_all([_notif(user.id, n) for n in range(3)])
+    await db.commit()
+
+    r = await client.get(f"/notifications/{user.id}")
+    since = r.json()["latest_cursor"]
+
+    # Más filas nuevas que `limit`; una con hora_envio anterior al cursor, como
+    # las que deja una transacción larga (hora de inicio, no de commit)
+    nuevas = [_notif(user.id, n) for n in range(3, 10)]
+    nuevas.insert(2, _notif(user.id, 99, hora=datetime(2025, 12, 31)))
+    for n in nuevas:
+        db.add(n)
+        await db.flush()
+    await db.commit()
+
+    entregadas, since = await _poll_all(client, user.id, since, limit=3)
+
+    assert entregadas == [n.titulo for n in nuevas]
+
+    # Sin filas nuevas el cursor se conserva y no se repite nada
+    vacias, mismo = await _poll_all(client, user.id, since, limit=3)
+    assert vacias == []
+    assert mismo == since
+
+
+async def test_cursor_y_since_juntos_es_400(app, client, db):
+    user = await crear_usuario(db, "Beto", "Estudiante")
+    login_as(app, user, "Estudiante")
+    r = await client.get(f"/notifications/{user.id}", params={"cursor": "x", "since": "y"})
+    assert r.status_code == 400
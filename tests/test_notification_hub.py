@@ -0,0 +1,161 @@
+import asyncio
+import json
+import asyncpg
+import pytest
+from services.notification_hub import NotificationHub, PostgresBroker
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePg:
+    """Conexión asyncpg falsa: registra los NOTIFY y puede caerse."""
+
+    def __init__(self, fallar_execute=False):
+        self.fallar_execute = fallar_execute
+        self.cerrada = False
+        self.terminacion = []
+        self.notificados = []
+
+    def add_termination_listener(self, cb):
+        self.terminacion.append(cb)
+
+    def remove_termination_listener(self, cb):
+        self.terminacion.remove(cb)
+
+    async def add_listener(self, channel, cb):
+        pass
+
+    async def remove_listener(self, channel, cb):
+        pass
+
+    def is_closed(self):
+        return self.cerrada
+
+    async def close(self):
+        self.cerrada = True
+
+    def terminate(self):
+        self.cerrada = True
+
+    async def execute(self, sql, *args):
+        if self.fallar_execute:
+            raise asyncpg.exceptions.InterfaceError("connection is closed")
+        self.notificados.append(args)
+
+    def caer(self):
+        self.cerrada = True
+        for cb in list(self.terminacion):
+            cb(self)
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    """asyncpg.connect programable: cada intento consume un resultado."""
+    intentos = []
+    abiertas = []
+
+    async def connect(dsn):
+        resultado = intentos.pop(0) if intentos else FakePg()
+        if isinstance(resultado, Exception):
+            raise resultado
+        abiertas.append(resultado)
+        return resultado
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+    monkeypatch.setattr(PostgresBroker, "RECONNECT_MIN", 0.01)
+    return intentos, abiertas
+
+
+async def _esperar(condicion):
+    for _ in range(100):
+        if condicion():
+            return
+        await asyncio.sleep(0.01)
+    assert condicion()
+
+
+async def test_reconecta_con_backoff_tras_caida(pg):
+    intentos, abiertas = pg
+    broker = PostgresBroker(NotificationHub(), "postgresql://x")
+    await broker.start()
+    try:
+        listener = broker.listener
+        # Dos intentos fallidos antes de volver a conectar
+        intentos.extend([OSError("db caída"), OSError("db caída")])
+        listener.caer()
+
+        await _esperar(lambda: broker.listener is not None and broker.listener is not listener)
+        assert not broker.publisher.is_closed()
+        assert len(abiertas) == 4  # dos al iniciar + dos al reconectar
+        assert not intentos
+
+        await broker.publish(7, '{"title": "hola"}')
+        assert broker.publisher.notificados == [(PostgresBroker.CHANNEL, '7:{"title": "hola"}')]
+    finally:
+        await broker.stop()
+    assert all(c.is_closed() for c in abiertas)
+
+
+async def test_arranca_sin_db_y_conecta_despues(pg):
+    intentos, _ = pg
+    intentos.append(OSError("db caída"))
+    broker = PostgresBroker(NotificationHub(), "postgresql://x")
+    await broker.start()
+    try:
+        await broker.publish(1, "{}")  # sin conexión: no lanza
+        await _esperar(lambda: broker.publisher is not None)
+    finally:
+        await broker.stop()
+
+
+async def test_publish_no_lanza_si_notify_falla(pg, capsys):
+    intentos, _ = pg
+    intentos.extend([FakePg(), FakePg(fallar_execute=True)])
+    broker = PostgresBroker(NotificationHub(), "postgresql://x")
+    await broker.start()
+    try:
+        await broker.publish(1, '{"title": "x"}')
+    finally:
+        await broker.stop()
+    assert "Error publicando notificación para el usuario 1" in capsys.readouterr().out
+
+
+async def test_payload_grande_avisa_para_polling(pg):
+    broker = PostgresBroker(NotificationHub(), "postgresql://x")
+    await broker.start()
+    try:
+        await broker.publish(3, json.dumps({"message": "x" * 9000}))
+        [(_, payload)] = broker.publisher.notificados
+        assert payload == f"3:{PostgresBroker.TRUNCADO}"
+        assert len(payload.encode()) < PostgresBroker.MAX_PAYLOAD
+    finally:
+        await broker.stop()
+
+
+class FakeSocket:
+    def __init__(self):
+        self.cerrado_con = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        await asyncio.Event().wait()  # consumidor lento: nunca termina de enviar
+
+    async def close(self, code=None):
+        self.cerrado_con = code
+
+
+async def test_consumidor_lento_se_desconecta_y_libera_la_tarea():
+    hub = NotificationHub(queue_size=1, slow_consumer="disconnect")
+    socket = FakeSocket()
+    await hub.connect(1, socket)
+    await asyncio.sleep(0)  # el sender toma el primer mensaje y se bloquea
+
+    for i in range(3):
+        hub.deliver_local(1, str(i))
+    assert len(hub._tasks) >= 1
+
+    await _esperar(lambda: not hub._tasks)
+    assert socket.cerrado_con == 1013
+    assert 1 not in hub.connections
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from services import cifrar, passwords
+from tests.conftest import crear_usuario
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool de bcrypt de 2 hilos con un semáforo del loop de la prueba."""
+    monkeypatch.setattr(passwords, "_slots", asyncio.Semaphore(2))
+    monkeypatch.setattr(passwords, "PASSWORD_QUEUE_TIMEOUT", 5)
+    return monkeypatch
+
+
+class Lento:
+    """Trabajo bloqueante que registra cuántos corren a la vez."""
+
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+        self.activos = 0
+        self.maximo = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.activos += 1
+            self.maximo = max(self.maximo, self.activos)
+        time.sleep(self.segundos)
+        with self._lock:
+            self.activos -= 1
+        return "ok"
+
+
+async def test_pool_acota_la_concurrencia_sin_bloquear_el_loop(pool):
+    trabajo = Lento(0.2)
+    ticks = 0
+
+    async def reloj():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tarea = asyncio.create_task(reloj())
+    try:
+        resultados = await asyncio.gather(*(passwords._run(trabajo) for _ in range(6)))
+    finally:
+        tarea.cancel()
+
+    assert resultados == ["ok"] * 6
+    assert trabajo.maximo == 2
+    # 6 trabajos de 0.2 s en 2 hilos tardan ~0.6 s; el loop siguió atendiendo
+    assert ticks >= 30
+
+
+async def test_cola_llena_responde_503(pool):
+    pool.setattr(passwords, "PASSWORD_QUEUE_TIMEOUT", 0.1)
+    trabajo = Lento(0.5)
+
+    ocupados = [asyncio.create_task(passwords._run(trabajo)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    with pytest.raises(HTTPException) as error:
+        await passwords._run(trabajo)
+    assert error.value.status_code == 503
+
+    assert await asyncio.gather(*ocupados) == ["ok", "ok"]
+    # Con cupo libre vuelve a aceptar
+    assert await passwords._run(Lento(0)) == "ok"
+
+
+async def test_login_saturado_responde_503(client, db, monkeypatch):
+    usuario = await crear_usuario(db, "Ana", "Estudiante")
+    usuario.password_hash = cifrar.hash_password("secreta", rounds=4)
+    await db.commit()
+    monkeypatch.setattr(passwords, "_slots", asyncio.Semaphore(0))  # sin cupo
+    monkeypatch.setattr(passwords, "PASSWORD_QUEUE_TIMEOUT", 0.05)
+
+    r = await client.post("/auth/login", json={"email": usuario.email, "password": "secreta"})
+
+    assert r.status_code == 503
+    assert r.json()["detail"] == "Servidor ocupado, intenta de nuevo"
+
+
+async def test_login_rehashea_si_cambio_el_costo(client, db, pool):
+    usuario = await crear_usuario(db, "Ana", "Estudiante")
+    usuario.password_hash = cifrar.hash_password("secreta", rounds=4)
+    await db.commit()
+    pool.setattr(passwords, "BCRYPT_ROUNDS", 5)
+    assert passwords.needs_rehash(usuario.password_hash)
+
+    r = await client.post("/auth/login", json={"email": usuario.email, "password": "secreta"})
+    assert r.status_code == 200, r.text
+
+    await db.refresh(usuario)
+    assert cifrar.bcrypt_cost(usuario.password_hash) == 5
+    assert cifrar.verify_password("secreta", usuario.password_hash)
+    assert not passwords.needs_rehash(usuario.password_hash)
+
+
+async def test_login_sin_cambio_de_costo_no_rehashea(client, db, pool):
+    usuario = await crear_usuario(db, "Ana", "Estudiante")
+    original = cifrar.hash_password("secreta", rounds=4)
+    usuario.password_hash = original
+    await db.commit()
+    pool.setattr(passwords, "BCRYPT_ROUNDS", 4)
+
+    r = await client.post("/auth/login", json={"email": usuario.email, "password": "secreta"})
+    assert r.status_code == 200, r.text
+
+    await db.refresh(usuario)
+    assert usuario.password_hash == original
+
+
+def test_costo_ilegible_pide_rehash():
+    assert cifrar.bcrypt_cost("no-es-bcrypt") == 0
+    assert cifrar.bcrypt_cost("$2b$04$" + "x" * 53) == 4
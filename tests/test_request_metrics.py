@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from config import engine
+from services.request_metrics import RequestStats, _current
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sentencia_fallida_no_deja_inicio_colgado(app, db_schema):
+    # `app` importa main, que registra los eventos de consultas
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM tabla_que_no_existe"))
+                assert "query_start" not in conn.info
+            conn.execute(text("SELECT 1"))
+            assert "query_start" not in conn.info
+    finally:
+        _current.reset(token)
+
+    # Las fallidas también cuentan como consultas con su tiempo de BD
+    assert stats.queries == 4
+    assert stats.db_seconds > 0
@@ -0,0 +1,60 @@
+import pytest
+from model.models import Roles
+from services.roles import role_registry
+from tests.conftest import crear_usuario, login_as
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_registro_resuelve_por_id_y_nombre(db):
+    assert role_registry.id_of("Profesor") == 2
+    assert role_registry.name_of(3) == "Administrador"
+    assert role_registry.id_of("Inexistente") is None
+    assert role_registry.name_of(99) is None
+
+
+async def test_refresh_toma_cambios_hechos_a_mano(app, client, db):
+    admin = await crear_usuario(db, "Admin", "Administrador")
+    alumno = await crear_usuario(db, "Alumno", "Estudiante")
+    login_as(app, admin, "Administrador")
+    db.add(Roles(id=4, nombre_rol="Invitado"))
+    await db.commit()
+
+    # Sin refresh el rol nuevo no existe para las rutas
+    r = await client.put(f"/administrador/users/{alumno.id}/role", params={"new_role": "Invitado"})
+    assert r.status_code == 404
+
+    r = await client.post("/administrador/roles/refresh")
+    assert r.status_code == 200
+    assert r.json() == {"roles": {"1": "Estudiante", "2": "Profesor", "3": "Administrador", "4": "Invitado"}}
+    assert role_registry.id_of("Invitado") == 4
+
+    r = await client.put(f"/administrador/users/{alumno.id}/role", params={"new_role": "Invitado"})
+    assert r.status_code == 200
+    await db.refresh(alumno)
+    assert alumno.role == 4
+
+
+async def test_refresh_solo_para_administradores(app, client, db):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    login_as(app, profesor, "Profesor")
+    db.add(Roles(id=4, nombre_rol="Invitado"))
+    await db.commit()
+
+    assert (await client.post("/administrador/roles/refresh")).status_code == 403
+    assert role_registry.id_of("Invitado") is None
+
+
+async def test_listados_no_consultan_la_tabla_roles(app, client, db, query_counter):
+    admin = await crear_usuario(db, "Admin", "Administrador")
+    await crear_usuario(db, "Profe", "Profesor")
+    await crear_usuario(db, "Alumno", "Estudiante")
+    login_as(app, admin, "Administrador")
+    query_counter.statements.clear()
+
+    r = await client.get("/administrador/users", params={"rol": "Profesor"})
+
+    assert [u["rol"] for u in r.json()] == ["Profesor"]
+    assert not any('"Roles"' in s for s in query_counter.statements)
+    r = await client.get("/administrador/users")
+    assert sorted(u["rol"] for u in r.json()) == ["Estudiante", "Profesor"]
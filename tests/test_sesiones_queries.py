@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+import pytest
+from model.models import (
+    Cursos, Inscritos_Curso, Sesiones_Virtuales, Participantes_Sesion_V,
+    RoleLlamada, CalidadVideo, EstadoInvitacion,
+)
+from tests.conftest import crear_usuario, login_as
+
+pytestmark = pytest.mark.anyio
+
+
+async def _curso_con_sesiones(db, profesor, alumnos, n_sesiones: int) -> Cursos:
+    curso = Cursos(titulo=f"Curso {n_sesiones}", descripcion="d", profesor_id=profesor.id)
+    db.add(curso)
+    await db.flush()
+    db.add_all([
+        Inscritos_Curso(id_curso=curso.id, id_estudiante=a.id, estado_invitacion=EstadoInvitacion.Aceptada, enlace_unico=f"{curso.id}-{a.id}")
+        for a in alumnos
+    ])
+    inicio = datetime(2026, 3, 2, 8, 0)
+    for i in range(n_sesiones):
+        sesion = Sesiones_Virtuales(
+            id_curso=curso.id, titulo=f"s{i}", descripcion="d",
+            hora_inicio=inicio + timedelta(days=i), hora_fin=inicio + timedelta(days=i, hours=1),
+            enlace_llamada="x", calidad_video=CalidadVideo.p4K,
+        )
+        db.add(sesion)
+        await db.flush()
+        db.add(Participantes_Sesion_V(id_sesion=sesion.id_sesion, id_usuario=profesor.id, role_llamada=RoleLlamada.HOST))
+        db.add_all([
+            Participantes_Sesion_V(id_sesion=sesion.id_sesion, id_usuario=a.id, role_llamada=RoleLlamada.PARTICIPANTE)
+            for a in alumnos
+        ])
+    await db.commit()
+    return curso
+
+
+async def _consultas(client, query_counter, url) -> tuple[int, dict]:
+    query_counter.count = 0
+    r = await client.get(url)
+    assert r.status_code == 200, r.text
+    return query_counter.count, r.json()
+
+
+async def test_sesiones_del_curso_cuestan_consultas_constantes(app, client, db, query_counter):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    alumnos = [await crear_usuario(db, f"Alumno{i}", "Estudiante") for i in range(4)]
+    chico = await _curso_con_sesiones(db, profesor, alumnos[:1], 2)
+    grande = await _curso_con_sesiones(db, profesor, alumnos, 30)
+    login_as(app, profesor, "Profesor")
+
+    n_chico, body_chico = await _consultas(client, query_counter, f"/courses/{chico.id}/sessions")
+    n_grande, body_grande = await _consultas(client, query_counter, f"/courses/{grande.id}/sessions")
+
+    assert body_chico["total_sesiones"] == 2
+    assert body_grande["total_sesiones"] == 30
+    # Los conteos excluyen al HOST
+    assert {s["participantes"] for s in body_grande["sesiones"]} == {4}
+    # curso (+ profesor por selectinload), sesiones y un conteo agrupado
+    assert n_grande == n_chico
+    assert n_grande <= 4
+
+
+async def test_sesiones_del_curso_como_estudiante_suma_una_consulta(app, client, db, query_counter):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    alumno = await crear_usuario(db, "Alumno", "Estudiante")
+    curso = await _curso_con_sesiones(db, profesor, [alumno], 25)
+    login_as(app, alumno, "Estudiante")
+
+    n, body = await _consultas(client, query_counter, f"/courses/{curso.id}/sessions")
+
+    assert body["total_sesiones"] == 25
+    assert n <= 5  # la verificación de inscripción es la única consulta extra
+
+
+async def test_calendario_del_profesor_cuesta_consultas_constantes(app, client, db, query_counter):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    alumnos = [await crear_usuario(db, f"Alumno{i}", "Estudiante") for i in range(3)]
+    await _curso_con_sesiones(db, profesor, alumnos[:1], 1)
+    login_as(app, profesor, "Profesor")
+    rango = {"desde": "2026-03-01T00:00:00", "hasta": "2026-05-01T00:00:00"}
+
+    query_counter.count = 0
+    r = await client.get(f"/calendar/{profesor.id}", params=rango)
+    n_chico = query_counter.count
+    assert r.json()["total_sesiones"] == 1
+
+    await _curso_con_sesiones(db, profesor, alumnos, 40)
+    query_counter.count = 0
+    r = await client.get(f"/calendar/{profesor.id}", params=rango)
+    assert r.json()["total_sesiones"] == 41
+    assert query_counter.count == n_chico
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+from config import TOKEN_CACHE_TTL
+from services import token_cache as tc
+from services.token_cache import TokenCache, UserSnapshot
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _snapshot(user_id, rol):
+    user = SimpleNamespace(id=user_id, nombre="Ana", apellido="P", role=1, max_cursos=3, status="Activo")
+    return UserSnapshot.from_user(user, role_name=rol)
+
+
+def test_ttl_por_defecto_acota_la_ventana_entre_workers():
+    # La invalidación no cruza procesos: el TTL es la cota de obsolescencia
+    assert TOKEN_CACHE_TTL <= 10
+
+
+def test_otro_worker_ve_el_cambio_al_vencer_el_ttl(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(tc.time, "monotonic", reloj)
+    worker_a, worker_b = TokenCache(ttl=5), TokenCache(ttl=5)
+    for worker in (worker_a, worker_b):
+        worker.set("jwt", False, _snapshot(1, "Profesor"))
+
+    # El admin degrada al usuario: solo el worker que atendió la petición se entera
+    worker_a.evict_user(1)
+    assert worker_a.get("jwt") is None
+    assert worker_b.get("jwt")[1].role_name == "Profesor"
+
+    reloj.t += 5
+    assert worker_b.get("jwt") is None
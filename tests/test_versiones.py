@@ -0,0 +1,136 @@
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+from model.models import VersionRecurso
+from services.versiones import CATALOGO, bump, clave_usuario
+from tests.conftest import crear_usuario, login_as
+
+pytestmark = pytest.mark.anyio
+
+
+async def _get(client, url, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return await client.get(url, headers=headers)
+
+
+async def _revalidar(client, url, etag):
+    """Repite la petición con el ETag anterior: 304 si nada cambió."""
+    r = await _get(client, url, etag)
+    assert r.headers["Cache-Control"] == "private, no-cache"
+    return r
+
+
+async def test_304_con_if_none_match(app, client, db):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    login_as(app, profesor, "Profesor")
+
+    for url in ("/courses/active/", "/courses/active/only"):
+        r = await _get(client, url)
+        assert r.status_code == 200
+        etag = r.headers["ETag"]
+        assert etag.startswith('W/"')
+
+        r = await _revalidar(client, url, etag)
+        assert r.status_code == 304
+        assert r.headers["ETag"] == etag
+        assert r.content == b""
+
+        # Lista de ETags y comodín también valen
+        assert (await _get(client, url, f'W/"otro", {etag}')).status_code == 304
+        assert (await _get(client, url, "*")).status_code == 304
+        assert (await _get(client, url, 'W/"otro"')).status_code == 200
+
+
+async def test_etag_cambia_al_crear_activar_y_desactivar(app, client, db):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    login_as(app, profesor, "Profesor")
+    urls = ("/courses/active/", "/courses/active/only")
+    etags = {url: (await _get(client, url)).headers["ETag"] for url in urls}
+
+    r = await client.post("/create/course", json={"titulo": "Álgebra", "descripcion": "d"})
+    assert r.status_code == 200, r.text
+    curso_id = r.json()["curso"]["id"]
+
+    for accion in (None, f"/deactivate/course/{curso_id}", f"/activate/course/{curso_id}"):
+        if accion:
+            assert (await client.put(accion)).status_code == 200
+        for url in urls:
+            r = await _revalidar(client, url, etags[url])
+            assert r.status_code == 200, accion
+            assert r.headers["ETag"] != etags[url]
+            etags[url] = r.headers["ETag"]
+            assert (await _revalidar(client, url, etags[url])).status_code == 304
+
+
+async def test_etag_del_estudiante_cambia_al_inscribirse(app, client, db):
+    profesor = await crear_usuario(db, "Profe", "Profesor")
+    alumno = await crear_usuario(db, "Alumno", "Estudiante")
+    login_as(app, profesor, "Profesor")
+    curso_id = (await client.post("/create/course", json={"titulo": "Álgebra", "descripcion": "d"})).json()["curso"]["id"]
+
+    login_as(app, alumno, "Estudiante")
+    urls = ("/students/courses/active", "/students/available")
+    etags = {url: (await _get(client, url)).headers["ETag"] for url in urls}
+    for url in urls:
+        assert (await _revalidar(client, url, etags[url])).status_code == 304
+
+    assert (await client.post(f"/students/courses/enroll/{curso_id}")).status_code == 200
+
+    for url in urls:
+        r = await _revalidar(client, url, etags[url])
+        assert r.status_code == 200
+        assert r.headers["ETag"] != etags[url]
+
+    # Un curso nuevo de otro profesor cambia el catálogo del estudiante
+    etag = (await _get(client, "/students/available")).headers["ETag"]
+    login_as(app, profesor, "Profesor")
+    await client.post("/create/course", json={"titulo": "Física", "descripcion": "d"})
+    login_as(app, alumno, "Estudiante")
+    assert (await _revalidar(client, "/students/available", etag)).status_code == 200
+
+
+async def test_etag_distinto_por_usuario(app, client, db):
+    uno = await crear_usuario(db, "Uno", "Profesor")
+    dos = await crear_usuario(db, "Dos", "Profesor")
+    login_as(app, uno, "Profesor")
+    etag = (await _get(client, "/courses/active/")).headers["ETag"]
+    await bump(db, clave_usuario(uno.id))
+    await db.commit()
+
+    # La versión de otro profesor no cambia con la del primero
+    login_as(app, dos, "Profesor")
+    r = await _get(client, "/courses/active/")
+    assert (await _revalidar(client, "/courses/active/", r.headers["ETag"])).status_code == 304
+    login_as(app, uno, "Profesor")
+    assert (await _revalidar(client, "/courses/active/", etag)).status_code == 200
+
+
+async def test_bump_incrementa_en_sqlite(db):
+    await bump(db, "a", CATALOGO)
+    await bump(db, "a")
+    await db.commit()
+
+    assert (await db.get(VersionRecurso, "a")).version == 2
+    assert (await db.get(VersionRecurso, CATALOGO)).version == 1
+
+
+@pytest.mark.parametrize("dialecto", [postgresql.dialect(), sqlite.dialect()], ids=["postgresql", "sqlite"])
+async def test_bump_compila_upsert_por_dialecto(db, monkeypatch, dialecto):
+    capturadas = []
+
+    async def execute(stmt, *args, **kwargs):
+        capturadas.append(stmt)
+
+    class Bind:
+        pass
+
+    bind = Bind()
+    bind.dialect = dialecto
+    monkeypatch.setattr(db, "get_bind", lambda *a, **k: bind)
+    monkeypatch.setattr(db, "execute", execute)
+
+    await bump(db, "usuario:1", CATALOGO)
+
+    [stmt] = capturadas
+    sql = str(stmt.compile(dialect=dialecto))
+    assert "ON CONFLICT (clave) DO UPDATE SET version = (versiones_recurso.version +" in sql
+    assert sql.count("(") >= 3  # VALUES de varias filas en una sentencia
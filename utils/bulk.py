@@ -0,0 +1,30 @@
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+def dialect_insert(db: AsyncSession):
+    """insert() del dialecto de la sesión, con soporte de ON CONFLICT (Postgres o SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert_
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert_
+    return dialect_insert_
+
+async def bulk_insert(db: AsyncSession, model, rows: list[dict], returning=None) -> list:
+    """Inserta `rows` con un solo INSERT executemany (Core, sin objetos ORM).
+
+    SQLAlchemy agrupa las filas en sentencias INSERT ... VALUES de varias
+    filas ("insertmanyvalues"), tanto en PostgreSQL como en SQLite. Si se
+    pasa `returning` (una columna), devuelve sus valores en el mismo orden
+    que `rows`. No hace commit: el llamador decide la transacción.
+    """
+    if not rows:
+        return []
+
+    if returning is None:
+        await db.execute(insert(model), rows)
+        return []
+
+    return (await db.scalars(
+        insert(model).returning(returning, sort_by_parameter_order=True),
+        rows
+    )).all()
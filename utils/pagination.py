@@ -0,0 +1,22 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+
+def encode_cursor(*values) -> str:
+    """Codifica la llave de la última fila (keyset) como un cursor opaco."""
+    raw = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+def decode_cursor(cursor: str, types: tuple) -> tuple:
+    """Decodifica un cursor generado por encode_cursor; 400 si es inválido."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(raw) != len(types):
+            raise ValueError("longitud")
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for v, t in zip(raw, types)
+        )
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")